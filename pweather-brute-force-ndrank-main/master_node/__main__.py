@@ -134,7 +134,11 @@ for request in requests:
         result: SearchResultDto
         start_time: int = time_ns()
 
-        result = client_comm.search_request(request)
+        #the partial results sent by the workers are only logged
+        for result in client_comm.search_request_iterator(request):
+            if result.is_partial:
+                logging.info("Partial results of " + request.request_name + " (" + str(result.scanned_files) + 
+                    "/" + str(result.total_files) + " files, threshold " + str(result.threshold) + ")")
         logging.debug(result)
         end_time: int = time_ns()
 
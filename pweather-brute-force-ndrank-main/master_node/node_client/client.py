@@ -1,11 +1,12 @@
 from datetime import datetime
 import logging, os
+import queue
 import threading
 import exceptiongroup
 import pandas as pd
 from schema import Schema, Or #type: ignore
 from multiprocessing.pool import ThreadPool
-from typing import Any, Dict, Final, Iterator, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Final, Iterator, List, Optional, Tuple, Union
 
 import grpc
 from grpc import Channel
@@ -367,6 +368,10 @@ class SearchResultDto:
         """
         self._analogues: List[Analogue] = []
         self._is_reverse_order: bool = False
+        self._is_partial: bool = False
+        self._scanned_files: int = 0
+        self._total_files: int = 0
+        self._threshold: Optional[float] = None
 
     @property
     def analogues(self) -> List[Analogue]:
@@ -388,6 +393,41 @@ class SearchResultDto:
     def is_reverse_order(self, value: bool) -> None:
         self._is_reverse_order = value
 
+    @property
+    def is_partial(self) -> bool:
+        """True if the search is still being executed (the analogues are the best ones found so far)"""
+        return self._is_partial
+
+    @is_partial.setter
+    def is_partial(self, value: bool) -> None:
+        self._is_partial = value
+
+    @property
+    def scanned_files(self) -> int:
+        return self._scanned_files
+
+    @scanned_files.setter
+    def scanned_files(self, value: int) -> None:
+        self._scanned_files = value
+
+    @property
+    def total_files(self) -> int:
+        """Number of files to be searched (0 if unknown)"""
+        return self._total_files
+
+    @total_files.setter
+    def total_files(self, value: int) -> None:
+        self._total_files = value
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """Similarity value of the N-th best analogue of a partial result (None while there are less than N)"""
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value: Optional[float]) -> None:
+        self._threshold = value
+
     def __str__(self) -> str:
         res: str = ""
 
@@ -424,6 +464,36 @@ class SearchResultDto:
         
         return headers, values
 
+class _SearchCalls:
+    """gRPC calls of a request, allowing all of them to be cancelled"""
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._calls: List[Any] = []
+        self._cancelled: bool = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def add(self, call: Any) -> None:
+        """Registers a call, cancelling it if the request was already cancelled
+
+        Args:
+            call (Any): call returned by the stub
+        """
+        with self._lock:
+            self._calls.append(call)
+            if self._cancelled:
+                call.cancel()
+
+    def cancel(self) -> None:
+        """Cancels every registered call"""
+        with self._lock:
+            self._cancelled = True
+            for call in self._calls:
+                call.cancel()
+
+
 class ClientModule:
     """Class to establish contact will all existing worker nodes
     """
@@ -442,12 +512,39 @@ class ClientModule:
         for node in worker_nodes:
             self._worker_connections.append(_worker_stub_pair(node))
         
-    def _search_request_single_node(self, request: SearchRequestDto, channel_pair: _worker_stub_pair) -> SearchResultDto:
+    def _response_to_result(self, search_response: SearchResponse) -> SearchResultDto:
+        """Builds the result of a node from the received response
+
+        Args:
+            search_response (SearchResponse): partial or final response of the node
+
+        Returns:
+            SearchResultDto: equivalent result
+        """
+        res: SearchResultDto = SearchResultDto()
+        for received_analogue in search_response.analogues:
+            res.add_analogue(Analogue(received_analogue.timestamp, received_analogue.similarity_value,received_analogue.time_instances))
+
+        res.is_reverse_order = search_response.reverse_sort_order_corr_function
+        res.is_partial = search_response.is_partial
+        res.scanned_files = search_response.progress.scanned_files
+        res.total_files = search_response.progress.total_files
+        if search_response.progress.HasField("threshold"):
+            res.threshold = search_response.progress.threshold
+        return res
+
+    def _search_request_single_node(self, request: SearchRequestDto, channel_pair: _worker_stub_pair, 
+        partial_results: Optional[Callable[[SearchResultDto], None]] = None, 
+        calls: Optional[_SearchCalls] = None) -> SearchResultDto:
         """Executes the search for a single worker node
 
         Args:
             request (SearchRequestDto): input provided to the search request
             channel_pair (_worker_stub_pair): node objects required to execute request
+            partial_results (Optional[Callable[[SearchResultDto], None]], optional): receives the partial 
+            results sent by the node while it searches. Defaults to None (they are discarded).
+            calls (Optional[_SearchCalls], optional): registers the call, so it can be cancelled. 
+            Defaults to None.
 
         Returns:
             SearchResultDto: results returned by the worker node
@@ -456,6 +553,8 @@ class ClientModule:
         try:
             search_request: SearchRequest = request.to_SearchRequest()
             search_iterator: Iterator[SearchResponse] = channel_pair.stub.search_analogues(search_request)
+            if not calls is None:
+                calls.add(search_iterator)
 
             logging.info("Mapping ports for node " + str(channel_pair.ip))
             port_mapping: SearchResponse = next(search_iterator)
@@ -486,15 +585,21 @@ class ClientModule:
                     return res
 
             logging.info("Waiting for returned results from " + str(channel_pair.ip))
-            search_response: SearchResponse = next(search_iterator)
-            for received_analogue in search_response.analogues:
-                res.add_analogue(Analogue(received_analogue.timestamp, received_analogue.similarity_value,received_analogue.time_instances))
-
-            res.is_reverse_order = search_response.reverse_sort_order_corr_function
+            #the node may send partial results before the final one
+            for search_response in search_iterator:
+                res = self._response_to_result(search_response)
+                if not res.is_partial:
+                    break
+                logging.debug("Partial results received from " + str(channel_pair.ip) + " (" + 
+                    str(res.scanned_files) + "/" + str(res.total_files) + " files)")
+                if not partial_results is None:
+                    partial_results(res)
             logging.info("Results received from " + str(channel_pair.ip))
         
             return res
         except grpc.RpcError as e:
+            if not calls is None and calls.cancelled and e.code() == grpc.StatusCode.CANCELLED:
+                return SearchResultDto()
             logging.debug("Exception received: ")
             self._lock.acquire()
             self._errors.append(e)
@@ -572,6 +677,77 @@ class ClientModule:
 
         return res
 
+    def _merge_partial_results(self, request: SearchRequestDto, results: List[SearchResultDto]) -> SearchResultDto:
+        """Merges the latest partial results of the nodes into a single partial result
+
+        Args:
+            request (SearchRequestDto): received request
+            results (List[SearchResultDto]): latest partial result of every node that sent one
+
+        Returns:
+            SearchResultDto: a single partial result, with the progress of all nodes
+        """
+        res: SearchResultDto = self._merge_results(request, results)
+        res.is_partial = True
+        res.scanned_files = sum(result.scanned_files for result in results)
+        res.total_files = sum(result.total_files for result in results)
+        if not request.number_of_results is None and len(res.analogues) == request.number_of_results:
+            res.threshold = res.analogues[-1].similarity
+        return res
+
+    def search_request_iterator(self, request: SearchRequestDto) -> Iterator[SearchResultDto]:
+        """Creates a search request for all worker nodes, yielding the merged results every time
+        a node sends partial results (if the workers are configured to send them)
+
+        The last yielded result is the final one. Closing the iterator before it cancels the
+        request on all nodes.
+
+        Args:
+            request (SearchRequestDto): search arguments
+
+        Raises:
+            ExceptionGroup: if any node failed
+
+        Yields:
+            Iterator[SearchResultDto]: partial results (marked with "is_partial", with the total progress
+            of the nodes), followed by the final analogues ordered by similarity
+        """
+        updates: queue.Queue[Optional[Tuple[int, SearchResultDto]]] = queue.Queue()
+        latest: List[Optional[SearchResultDto]] = [None] * len(self._worker_connections)
+        calls: _SearchCalls = _SearchCalls()
+
+        def search_node(index: int, conn: _worker_stub_pair) -> SearchResultDto:
+            return self._search_request_single_node(request, conn, 
+                lambda partial: updates.put((index, partial)), calls)
+
+        thread_pool: ThreadPool = ThreadPool(len(self._worker_connections))
+
+        logging.info("Executing search request on all nodes")
+        pending = thread_pool.starmap_async(search_node, enumerate(self._worker_connections),
+            callback=lambda _: updates.put(None), error_callback=lambda _: updates.put(None))
+        try:
+            while True:
+                update: Optional[Tuple[int, SearchResultDto]] = updates.get()
+                if update is None:
+                    break
+                latest[update[0]] = update[1]
+                yield self._merge_partial_results(request, [result for result in latest if not result is None])
+            res: List[SearchResultDto] = pending.get()
+        finally:
+            if not pending.ready():
+                logging.info("Cancelling search request on all nodes")
+                calls.cancel()
+            thread_pool.close()
+            thread_pool.join()
+
+        if len(self._errors) != 0:
+            raise exceptiongroup.ExceptionGroup(
+                "Exceptions thrown from sockets dealing with file transfer", 
+                self._errors)
+
+        logging.info("Merging final results")
+        yield self._merge_results(request,res)
+
     def search_request(self, request: SearchRequestDto) -> SearchResultDto:
         """Creates a search request for all worker nodes
 
@@ -9,6 +9,13 @@ from protocol import protocol_pb2_grpc
 from controller import brute_force_controller
 import grpc, concurrent, yaml, signal, numpy as np, warnings
 
+from correlation_functions.compute_precision import compute_precision
+from service.early_abandon import early_abandon_settings
+from service.parallel_search import parallel_search_settings
+from repository.auxiliary_structures.read_ahead import read_ahead_settings
+from service.shared_scan import shared_scan_settings
+from controller.auxiliar.progress_stream import progress_settings
+from service.result_cache import result_cache_settings
 from repository.repository_layer import RepositoryLayer
 from service.service_main_structure import ServiceLayer
 from controller import ndrank_controller
@@ -28,6 +35,7 @@ low_res_repositories: List[RepositoryLayer] = []
 low_res_service: ServiceLayer
 
 delete_request_input: bool = True
+compute_field_statistics: bool = False
 node_id: str
 
 #set up for killing the server correctly
@@ -41,7 +49,7 @@ def signal_handler(signum: Any, frame: Any) -> None:
         logging.info("Killing server")
 
 #---------------------PROCESS COMMAND LINE OPTIONS---------------------
-opts, args = getopt.getopt(sys.argv[1:],"p:d:")
+opts, args = getopt.getopt(sys.argv[1:],"p:d:s")
 
 for opt in opts:
     logging.debug(opt)
@@ -49,6 +57,8 @@ for opt in opts:
         properties_path = opt[1]
     elif opt[0] in ("-d"):
         delete_request_input = not opt[1].lower() == "false"
+    elif opt[0] in ("-s"):
+        compute_field_statistics = True
 
 logging.info("Path of properties file: " + properties_path)
 #---------------------TAGS FROM PROPERTIES.YAML---------------------
@@ -79,6 +89,18 @@ TYPE: Final = "type"
 PATHS: Final = "paths"
 
 DEBUG_TS_LOG: Final = "debug-ts-log"
+
+CORRELATION_FUNCTIONS: Final = "correlation-functions"
+COMPUTE_PRECISION: Final = "compute-precision"
+EARLY_ABANDON_BLOCK_SIZE: Final = "early-abandon-block-size"
+
+SEARCH_PROCESSES: Final = "search-processes"
+READ_AHEAD_FILES: Final = "read-ahead-files"
+READ_AHEAD_MEMORY: Final = "read-ahead-memory"
+SHARED_SCAN_WINDOW: Final = "shared-scan-window"
+PROGRESS_INTERVAL: Final = "progress-interval"
+RESULT_CACHE_FOLDER: Final = "result-cache-folder"
+RESULT_CACHE_SIZE: Final = "result-cache-size"
 #---------------------END OF TAGS FROM PROPERTIES.YAML---------------------
 with open(properties_path, 'r') as f:
     properties = yaml.safe_load(f)
@@ -99,6 +121,37 @@ to_port: int = properties[NETWORK_CONFIG][AVAILABLE_PORTS][TO]
 #LOCAL FILE CONFIGURATIONS
 temporary_folder_path: str = properties[TEMPORARY_FOLDER]
 
+#CORRELATION FUNCTIONS CONFIGURATION
+if CORRELATION_FUNCTIONS in properties and COMPUTE_PRECISION in properties[CORRELATION_FUNCTIONS]:
+    compute_precision.mode = properties[CORRELATION_FUNCTIONS][COMPUTE_PRECISION]
+logging.info("Compute precision: " + str(compute_precision))
+if CORRELATION_FUNCTIONS in properties and EARLY_ABANDON_BLOCK_SIZE in properties[CORRELATION_FUNCTIONS]:
+    early_abandon_settings.block_size = int(properties[CORRELATION_FUNCTIONS][EARLY_ABANDON_BLOCK_SIZE])
+logging.info("Early abandon block size: " + str(early_abandon_settings.block_size))
+
+#SEARCH CONFIGURATION
+if SEARCH_PROCESSES in properties:
+    parallel_search_settings.processes = int(properties[SEARCH_PROCESSES])
+logging.info("Search processes: " + str(parallel_search_settings.processes))
+if READ_AHEAD_FILES in properties:
+    read_ahead_settings.files = int(properties[READ_AHEAD_FILES])
+if READ_AHEAD_MEMORY in properties:
+    read_ahead_settings.memory = int(properties[READ_AHEAD_MEMORY]) * 1024**2
+logging.info("Read-ahead files: " + str(read_ahead_settings.files) + ", memory: " + 
+    str(read_ahead_settings.memory // 1024**2) + " MB")
+if SHARED_SCAN_WINDOW in properties:
+    shared_scan_settings.window = float(properties[SHARED_SCAN_WINDOW])
+logging.info("Shared scan window: " + str(shared_scan_settings.window) + " seconds")
+if PROGRESS_INTERVAL in properties:
+    progress_settings.interval = float(properties[PROGRESS_INTERVAL])
+logging.info("Progress interval: " + str(progress_settings.interval) + " seconds")
+if RESULT_CACHE_FOLDER in properties:
+    result_cache_settings.folder = properties[RESULT_CACHE_FOLDER]
+if RESULT_CACHE_SIZE in properties:
+    result_cache_settings.size = int(properties[RESULT_CACHE_SIZE]) * 1024**2
+logging.info("Result cache folder: " + result_cache_settings.folder + ", size: " + 
+    str(result_cache_settings.size // 1024**2) + " MB")
+
 logging.info("Parsed properties: " + str(properties))
 logging.info("Should received input files be deleted? -> " + str(delete_request_input))
 
@@ -112,6 +165,12 @@ if LOW_RES_REPOSITORY in properties:
             component_injector.get_repo_instance(properties[LOW_RES_REPOSITORY][TYPE],
                                                  path,"settings.yaml"))
 
+if compute_field_statistics:
+    for repository in repositories + low_res_repositories:
+        repository.create_field_statistics()
+    logging.info("Field statistics created")
+    sys.exit(0)
+
 service = \
     component_injector.get_service_instance(properties[SERVICE], repositories)
 if LOW_RES_REPOSITORY in properties:
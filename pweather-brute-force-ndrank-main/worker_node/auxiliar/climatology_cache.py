@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import threading
+from typing import Callable, Final, Hashable
+import xarray
+
+DEFAULT_CLIMATOLOGY_CACHE_SIZE: Final = 64
+
+class ClimatologyCache:
+    """Size bounded cache (least recently used) of the decoded climatology arrays
+    (average and standard deviation files). The arrays are fully loaded into memory,
+    so that the respective file is only opened once while the array is in the cache
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CLIMATOLOGY_CACHE_SIZE) -> None:
+        """Creates an empty cache
+
+        Args:
+            max_size (int, optional): maximum number of arrays kept in memory.
+            Defaults to DEFAULT_CLIMATOLOGY_CACHE_SIZE.
+
+        Raises:
+            ValueError: if max_size is not a positive number
+        """
+        if max_size <= 0:
+            raise ValueError("The size of the climatology cache has to be a positive number")
+        self._max_size: int = max_size
+        self._arrays: OrderedDict[Hashable, xarray.DataArray] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self._hits: int = 0
+        self._misses: int = 0
+
+    def get(self, key: Hashable, loader: Callable[[], xarray.DataArray]) -> xarray.DataArray:
+        """Returns the array with the given key, loading it if it is not in the cache
+
+        Args:
+            key (Hashable): key of the array (for example: (path, month, day, hour))
+            loader (Callable[[], xarray.DataArray]): function that loads the array from disk
+
+        Returns:
+            xarray.DataArray: array loaded into memory
+        """
+        with self._lock:
+            if key in self._arrays:
+                self._hits += 1
+                self._arrays.move_to_end(key)
+                return self._arrays[key]
+            self._misses += 1
+
+        array: xarray.DataArray = loader().load()
+
+        with self._lock:
+            self._arrays[key] = array
+            self._arrays.move_to_end(key)
+            while len(self._arrays) > self._max_size:
+                self._arrays.popitem(last=False)
+        return array
+
+    def resize(self, max_size: int) -> None:
+        """Changes the maximum number of arrays kept in memory
+
+        Args:
+            max_size (int): new maximum number of arrays
+
+        Raises:
+            ValueError: if max_size is not a positive number
+        """
+        if max_size <= 0:
+            raise ValueError("The size of the climatology cache has to be a positive number")
+        with self._lock:
+            self._max_size = max_size
+            while len(self._arrays) > self._max_size:
+                self._arrays.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all arrays and resets the counters"""
+        with self._lock:
+            self._arrays.clear()
+            self._hits = 0
+            self._misses = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def hits(self) -> int:
+        """Number of requests served by the cache"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Number of requests that required loading the array from disk"""
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._arrays)
+
+    def __str__(self) -> str:
+        return "ClimatologyCache(size=" + str(len(self._arrays)) + "/" + str(self._max_size) + \
+            ", hits=" + str(self._hits) + ", misses=" + str(self._misses) + ")"
+
+
+#cache shared by all parameter file collections of the process
+climatology_cache: Final = ClimatologyCache()
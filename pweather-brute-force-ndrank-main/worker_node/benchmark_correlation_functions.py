@@ -0,0 +1,245 @@
+import getopt
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import pandas
+import xarray
+import yaml
+
+from auxiliar.component_injector import component_injector
+from correlation_functions.compute_precision import compute_precision
+from correlation_functions.correlation_statistics import CorrelationStatistics
+from correlation_functions.implementations.implementations import AVERAGE_FILE_NAME, AVERAGE_FOLDER, \
+    CORRELATION_FUNCTIONS, STANDARD_DEVIATION_FILE_NAME, STANDARD_DEVIATION_FOLDER
+from correlation_functions.main_structure import CorrelationFunction
+from repository.auxiliary_structures.constants import DATA_VARS, STEP, TIME_INITIAL_DIM, TIME_VARIATION_DIM
+from repository.repository_layer import RepositoryMetadata
+
+"""Measures the cost of the "calculate", "calculate_partial_value" and "setup_stats" methods
+of every correlation function registered in the "component_injector", with synthetic fields
+shaped like the ERA5 fields of the dataset (time, step, isobaricInhPa, latitude, longitude).
+The missing values are placed at the same random positions of every field (like a land-sea
+mask), with the given density. The average and standard deviation files required by the
+enhanced-pcc are generated from the synthetic fields in a temporary folder.
+
+Every method is executed once per synthetic field (a comparison) and the best of the repetitions
+is kept. The results are written to a JSON file, with the throughput in comparisons per second
+and in gigabytes of field values read per second, so that different versions can be compared.
+The methods that a function does not implement are written as null. Must be executed inside
+the worker node folder:
+
+    python3 benchmark_correlation_functions.py -t <steps> -l <levels> -y <latitudes> -x <longitudes>
+        -m <density of missing values> -r <repetitions> -o <output file>
+"""
+
+VARIABLE: Final = "z"
+TIME_DIM: Final = "time"
+STEP_DIM: Final = "step"
+LEVEL_DIM: Final = "isobaricInhPa"
+LATITUDE_DIM: Final = "latitude"
+LONGITUDE_DIM: Final = "longitude"
+STEP_HOURS: Final = 6
+START_DATE: Final = "1980-01-01T00:00:00"
+
+#method executed once per comparison (receives its index) and number of bytes of field values it reads
+Measurement = Tuple[Callable[[int], Any], Callable[[int], int]]
+
+def create_fields(steps: int, levels: int, latitudes: int, longitudes: int,
+    missing_density: float, seed: int = 0) -> Tuple[xarray.DataArray, xarray.DataArray]:
+    """Creates the synthetic dataset block and input field, with a smooth large scale pattern
+    (similar to the geopotential) plus noise
+
+    Args:
+        steps (int): number of time instances of the dataset block
+        levels (int): number of pressure levels
+        latitudes (int): number of latitudes
+        longitudes (int): number of longitudes
+        missing_density (float): fraction of the grid points without values
+        seed (int): seed of the random values. Defaults to 0
+
+    Returns:
+        Tuple[xarray.DataArray, xarray.DataArray]: dataset block and input (a block with a single step)
+    """
+    generator: np.random.Generator = np.random.default_rng(seed)
+    latitude_values: npt.NDArray[np.float64] = np.linspace(90, -90, latitudes)
+    longitude_values: npt.NDArray[np.float64] = np.linspace(0, 360, longitudes, endpoint=False)
+    level_values: npt.NDArray[np.int64] = np.linspace(1000, 100, levels).astype(np.int64)
+    pattern: npt.NDArray[np.float64] = np.cos(np.deg2rad(latitude_values))[:, None] * \
+        np.cos(np.deg2rad(longitude_values))[None, :]
+    missing: npt.NDArray[np.bool_] = generator.random((levels, latitudes, longitudes)) < missing_density
+
+    def create_block(size: int, start: np.datetime64) -> xarray.DataArray:
+        values: npt.NDArray[np.float32] = (5e4 + 1e3 * pattern[None, None, None] *
+            generator.normal(1, 0.1, (1, size, levels, 1, 1)) +
+            generator.normal(0, 50, (1, size, levels, latitudes, longitudes))).astype(np.float32)
+        values[:, :, missing] = np.nan
+        return xarray.DataArray(values, dims=[TIME_DIM, STEP_DIM, LEVEL_DIM, LATITUDE_DIM, LONGITUDE_DIM],
+            coords={TIME_DIM: [start], STEP_DIM: np.arange(size) * np.timedelta64(STEP_HOURS, "h").astype("timedelta64[ns]"),
+                LEVEL_DIM: level_values, LATITUDE_DIM: latitude_values, LONGITUDE_DIM: longitude_values},
+            name=VARIABLE)
+
+    start: np.datetime64 = np.datetime64(START_DATE, "ns")
+    return create_block(steps, start), create_block(1, start + steps * np.timedelta64(STEP_HOURS, "h"))
+
+def write_climatology(folder_path: str, dataset_block: xarray.DataArray) -> str:
+    """Writes the average and standard deviation files (the same for every date) and
+    a properties file that points to them
+
+    Args:
+        folder_path (str): folder where the files are written
+        dataset_block (xarray.DataArray): synthetic dataset block
+
+    Returns:
+        str: path of the properties file
+    """
+    reduced_dims: List[str] = [TIME_DIM, STEP_DIM]
+    dates: List[Tuple[int, int, int]] = [(date.month, date.day, date.hour) for date in
+        pandas.to_datetime(dataset_block[TIME_DIM].values[0] + dataset_block[STEP_DIM].values)]
+    #the input is the step after the last step of the dataset
+    last_date: pandas.Timestamp = pandas.to_datetime(dataset_block[TIME_DIM].values[0] +
+        dataset_block[STEP_DIM].values[-1] + np.timedelta64(STEP_HOURS, "h"))
+    dates.append((last_date.month, last_date.day, last_date.hour))
+
+    #the positions without values are the same in every field, so their parameters are never used
+    filled_block: xarray.DataArray = dataset_block.fillna(0)
+    for name, array in [(AVERAGE_FILE_NAME, filled_block.mean(reduced_dims)),
+        (STANDARD_DEVIATION_FILE_NAME, filled_block.std(reduced_dims))]:
+        file_name: str = os.path.splitext(name)[0] + ".nc"
+        array.expand_dims(variable=[VARIABLE]).to_netcdf(os.path.join(folder_path, file_name))
+        files: Dict[int, Dict[int, Dict[int, str]]] = {}
+        for month, day, hour in dates:
+            files.setdefault(month, {}).setdefault(day, {})[hour] = file_name
+        with open(os.path.join(folder_path, name), "w") as f:
+            yaml.safe_dump(files, f)
+
+    properties_path: str = os.path.join(folder_path, "properties.yaml")
+    with open(properties_path, "w") as f:
+        yaml.safe_dump({CORRELATION_FUNCTIONS: {AVERAGE_FOLDER: folder_path, STANDARD_DEVIATION_FOLDER: folder_path}}, f)
+    return properties_path
+
+def measure(measurement: Measurement, comparisons: int, repetitions: int) -> Optional[Dict[str, float]]:
+    """Executes the method once per comparison, keeping the best of the repetitions
+
+    Args:
+        measurement (Measurement): method and bytes read by each comparison
+        comparisons (int): number of comparisons
+        repetitions (int): number of repetitions
+
+    Returns:
+        Optional[Dict[str, float]]: seconds, comparisons per second and gigabytes per second or None
+        if the method is not implemented
+    """
+    method, read_bytes = measurement
+    total_bytes: int = sum(read_bytes(i) for i in range(comparisons))
+    best: float = float("inf")
+    for _ in range(repetitions):
+        start: float = time.perf_counter()
+        try:
+            for i in range(comparisons):
+                method(i)
+        except NotImplementedError:
+            return None
+        best = min(best, time.perf_counter() - start)
+    return {
+        "seconds": best,
+        "comparisons_per_second": comparisons / best,
+        "gigabytes_per_second": total_bytes / best / 1e9
+    }
+
+def benchmark_function(corr_function: CorrelationFunction, dataset_block: xarray.DataArray,
+    input_block: xarray.DataArray, metadata: RepositoryMetadata, repetitions: int) -> Dict[str, Optional[Dict[str, float]]]:
+    """Measures the methods of a correlation function, comparing every step of the dataset block with the input
+
+    Args:
+        corr_function (CorrelationFunction): correlation function
+        dataset_block (xarray.DataArray): synthetic dataset block
+        input_block (xarray.DataArray): synthetic input
+        metadata (RepositoryMetadata): metadata of the synthetic dataset
+        repetitions (int): number of repetitions
+
+    Returns:
+        Dict[str, Optional[Dict[str, float]]]: results by method
+    """
+    fields: List[xarray.DataArray] = [dataset_block.isel({STEP_DIM: i}) for i in range(dataset_block.sizes[STEP_DIM])]
+    input_field: xarray.DataArray = input_block.isel({STEP_DIM: 0})
+    #the partial values are calculated with the northern half of the fields
+    selection_params: Dict[str, Any] = {LATITUDE_DIM: slice(90, 0)}
+    partial_fields: List[xarray.DataArray] = [field.sel(selection_params) for field in fields]
+    partial_input: xarray.DataArray = input_field.sel(selection_params)
+
+    res: Dict[str, Optional[Dict[str, float]]] = {}
+    res["setup_stats"] = measure((lambda i: corr_function.setup_stats(fields[i], metadata, VARIABLE),
+        lambda i: fields[i].nbytes), len(fields), repetitions)
+    res["calculate"] = measure((lambda i: corr_function.calculate(fields[i], input_field, metadata, VARIABLE),
+        lambda i: fields[i].nbytes + input_field.nbytes), len(fields), repetitions)
+
+    statistics: List[CorrelationStatistics] = []
+    input_statistics: CorrelationStatistics
+    try:
+        statistics = [corr_function.setup_stats(field, metadata, VARIABLE) for field in fields]
+        input_statistics = corr_function.setup_input_stats(input_field, metadata, VARIABLE)
+    except NotImplementedError:
+        res["calculate_partial_value"] = None
+        return res
+    res["calculate_partial_value"] = measure((lambda i: corr_function.calculate_partial_value(partial_input,
+        partial_fields[i], input_statistics, statistics[i], selection_params, metadata, VARIABLE),
+        lambda i: partial_fields[i].nbytes + partial_input.nbytes), len(fields), repetitions)
+    return res
+
+if __name__ == "__main__":
+    steps: int = 8
+    levels: int = 2
+    latitudes: int = 181
+    longitudes: int = 360
+    missing_density: float = 0.0
+    repetitions: int = 3
+    output_path: str = "benchmark_correlation_functions.json"
+
+    opts, args = getopt.getopt(sys.argv[1:], "t:l:y:x:m:r:o:")
+    for opt in opts:
+        if opt[0] in ("-t"):
+            steps = int(opt[1])
+        elif opt[0] in ("-l"):
+            levels = int(opt[1])
+        elif opt[0] in ("-y"):
+            latitudes = int(opt[1])
+        elif opt[0] in ("-x"):
+            longitudes = int(opt[1])
+        elif opt[0] in ("-m"):
+            missing_density = float(opt[1])
+        elif opt[0] in ("-r"):
+            repetitions = int(opt[1])
+        elif opt[0] in ("-o"):
+            output_path = opt[1]
+
+    #xarray.corr warns about the fields with missing values, which would be printed once per comparison
+    warnings.simplefilter("ignore", RuntimeWarning)
+    dataset_block, input_block = create_fields(steps, levels, latitudes, longitudes, missing_density)
+    metadata: RepositoryMetadata = RepositoryMetadata({STEP: STEP_HOURS * 3600 * 10**9, TIME_VARIATION_DIM: STEP_DIM,
+        TIME_INITIAL_DIM: TIME_DIM, DATA_VARS: [VARIABLE]})
+
+    results: Dict[str, Dict[str, Optional[Dict[str, float]]]] = {}
+    with tempfile.TemporaryDirectory() as folder_path:
+        component_injector.properties_path = write_climatology(folder_path, dataset_block)
+        for name, corr_function in component_injector.get_all_correlation_function_instances():
+            results[name] = benchmark_function(corr_function, dataset_block, input_block, metadata, repetitions)
+            print(name + ": " + ", ".join(method + " " + ("not implemented" if results[name][method] is None else
+                "{:.1f} comparisons/s".format(results[name][method]["comparisons_per_second"])) #type: ignore
+                for method in results[name]))
+
+    with open(output_path, "w") as f:
+        json.dump({
+            "configuration": {
+                "steps": steps, "levels": levels, "latitudes": latitudes, "longitudes": longitudes,
+                "missing_density": missing_density, "repetitions": repetitions,
+                "compute_precision": compute_precision.mode
+            },
+            "results": results
+        }, f, indent=4)
@@ -0,0 +1,135 @@
+import getopt
+import sys
+from typing import Callable, Dict, Final, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import xarray
+
+from correlation_functions.implementations.implementations import EnhancedPcc, _cauchy_schwarz_partial_bounds, \
+    _unit_partial_bounds
+from repository.implementations.month_year_repo import MonthYearRepository
+from repository.repository_layer import RepositoryMetadata
+from service.data_types import CandidateContainer, CandidateListManager
+
+"""Compares how many candidates are kept by the list of candidates ("CandidateListManager")
+when the intervals of the standardized PCC ("EnhancedPcc.calculate_partial_value") are
+calculated with only a portion of the grid. Both the bounds that assume every missing value to
+be 1 or -1 and the bounds based on the norms of the full fields (Cauchy–Schwarz) are used,
+together with the number of candidates whose final value is outside of its interval (which
+must always be 0). Every field is standardized with its own mean and standard deviation.
+Must be executed inside the worker node folder:
+
+    python3 benchmark_partial_bounds.py -n <size of the ranking> -d <path of the dataset>
+        -i <input file> -v <data variable> -s <selected dimension> -f <selected fraction>
+"""
+
+#field values (rows), known portion of the field and full field
+Bounds = Callable[[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.bool_]], Tuple[float, float]]
+
+def _standardize(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    return (values - values.mean()) / values.std()
+
+def unit_bounds(input_values: npt.NDArray[np.float64], dataset_values: npt.NDArray[np.float64],
+    known: npt.NDArray[np.bool_]) -> Tuple[float, float]:
+    input_mean: float = float(input_values.mean())
+    dataset_mean: float = float(dataset_values.mean())
+    input_known: npt.NDArray[np.float64] = input_values[known] - input_mean
+    dataset_known: npt.NDArray[np.float64] = dataset_values[known] - dataset_mean
+    return _unit_partial_bounds(float(input_known @ dataset_known), float(input_known @ input_known),
+        float(dataset_known @ dataset_known), input_mean, dataset_mean, int((~known).sum()))
+
+def cauchy_schwarz_bounds(input_values: npt.NDArray[np.float64], dataset_values: npt.NDArray[np.float64],
+    known: npt.NDArray[np.bool_]) -> Tuple[float, float]:
+    input_centred: npt.NDArray[np.float64] = input_values - input_values.mean()
+    dataset_centred: npt.NDArray[np.float64] = dataset_values - dataset_values.mean()
+    input_known: npt.NDArray[np.float64] = input_centred[known]
+    dataset_known: npt.NDArray[np.float64] = dataset_centred[known]
+    res = _cauchy_schwarz_partial_bounds(float(input_known @ dataset_known), float(input_known @ input_known),
+        float(dataset_known @ dataset_known), float(input_centred @ input_centred),
+        float(dataset_centred @ dataset_centred))
+    return (1.0, -1.0) if res is None else res
+
+BOUNDS: Final[Dict[str, Bounds]] = {
+    "unit values": unit_bounds,
+    "cauchy-schwarz": cauchy_schwarz_bounds
+}
+
+def load_fields(dataset_path: str, var: str,
+    selected_dim: str) -> Tuple[List[np.datetime64], List[xarray.DataArray], RepositoryMetadata]:
+    """Loads every field of the data variable in the dataset
+
+    Args:
+        dataset_path (str): path of the dataset
+        var (str): data variable
+        selected_dim (str): dimension used to select the known portion of the fields
+
+    Returns:
+        Tuple[List[np.datetime64], List[xarray.DataArray], RepositoryMetadata]: dates, fields and metadata
+    """
+    repository: MonthYearRepository = MonthYearRepository(dataset_path, "settings.yaml")
+    metadata: RepositoryMetadata = repository.get_metadata()
+    dates: List[np.datetime64] = []
+    fields: List[xarray.DataArray] = []
+    for _, dataset in repository.get_dataset():
+        block: xarray.DataArray = dataset[var]
+        if not metadata.time_variation_dim in block.dims:
+            block = block.expand_dims(metadata.time_variation_dim)
+        block = block.transpose(metadata.time_variation_dim, ..., selected_dim).load()
+        for i in range(block.sizes[metadata.time_variation_dim]):
+            field: xarray.DataArray = block.isel({metadata.time_variation_dim: i})
+            dates.append(field.coords[metadata.time_initial_dim].values +
+                field.coords[metadata.time_variation_dim].values)
+            fields.append(field)
+        dataset.close()
+    return dates, fields, metadata
+
+if __name__ == "__main__":
+    n: int = 20
+    dataset_path: str = "./testing_dataset"
+    input_path: str = "./testing_input_2/1980-01-03T06:00:00.000000000.nc"
+    var: str = "z"
+    selected_dim: str = "latitude"
+    fraction: float = 0.5
+
+    opts, args = getopt.getopt(sys.argv[1:], "n:d:i:v:s:f:")
+    for opt in opts:
+        if opt[0] in ("-n"):
+            n = int(opt[1])
+        elif opt[0] in ("-d"):
+            dataset_path = opt[1]
+        elif opt[0] in ("-i"):
+            input_path = opt[1]
+        elif opt[0] in ("-v"):
+            var = opt[1]
+        elif opt[0] in ("-s"):
+            selected_dim = opt[1]
+        elif opt[0] in ("-f"):
+            fraction = float(opt[1])
+
+    dates, fields, metadata = load_fields(dataset_path, var, selected_dim)
+    input_field: xarray.DataArray = xarray.open_dataset(input_path)[var].squeeze(drop=True)
+    input_field = input_field.transpose(*[dim for dim in fields[0].dims if dim in input_field.dims])
+    input_values: npt.NDArray[np.float64] = _standardize(input_field.values.astype(np.float64).ravel())
+
+    #the known portion is the first fraction of the selected dimension (the last one of every field)
+    known_rows: npt.NDArray[np.bool_] = np.arange(fields[0].sizes[selected_dim]) < fraction * fields[0].sizes[selected_dim]
+    known: npt.NDArray[np.bool_] = np.broadcast_to(known_rows, fields[0].shape).ravel()
+
+    print(str(len(dates)) + " candidates, " + str(int(known.sum())) + " of " + str(len(known)) +
+        " values known, top " + str(n))
+    for name, bounds in BOUNDS.items():
+        manager: CandidateListManager = CandidateListManager(EnhancedPcc("enhanced-pcc"), n)
+        widths: List[float] = []
+        invalid: int = 0
+        for date, field in zip(dates, fields):
+            dataset_values: npt.NDArray[np.float64] = _standardize(field.values.astype(np.float64).ravel())
+            best_value, worst_value = bounds(input_values, dataset_values, known)
+            final_value: float = float(np.corrcoef(input_values, dataset_values)[0, 1])
+            if final_value > best_value + 1e-12 or final_value < worst_value - 1e-12:
+                invalid += 1
+            widths.append(best_value - worst_value)
+            manager.add_value(date, CandidateContainer(best_value, worst_value, [var]))
+
+        print(name + ": " + str(len(list(manager.get_results()))) + " candidates kept, mean interval width " +
+            str(float(np.mean(widths))) + ", " + str(invalid) + " invalid intervals")
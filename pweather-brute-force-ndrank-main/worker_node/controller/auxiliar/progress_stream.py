@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import Callable, Final, Generator, Optional, TypeVar
+from service.service_main_structure import ProgressCallback, SearchProgress
+
+"""The brute force search of a request only returns when every file was searched. With the
+progress stream, the search is executed in a separate thread and the controller periodically
+receives the latest snapshot reported by the service (best complete results found so far and
+number of searched files), which is sent to the master as a partial response.
+
+The snapshots are throttled by the interval of the settings, so only the latest snapshot of
+each interval is sent. When the stream is closed before the search finishes (for example, the
+master cancelled the request), the search is stopped at the next searched file.
+"""
+
+DEFAULT_PROGRESS_INTERVAL: Final = 10.0 #seconds
+
+T = TypeVar("T")
+
+class ProgressSettings:
+    """Minimum time (in seconds) between two partial responses of a search (0 disables the partial responses)
+    """
+    def __init__(self, interval: float = DEFAULT_PROGRESS_INTERVAL) -> None:
+        self._interval: float
+        self.interval = interval
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @interval.setter
+    def interval(self, interval: float) -> None:
+        if interval < 0:
+            raise ValueError("The interval of the partial responses can not be negative")
+        self._interval = interval
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._interval > 0
+
+
+#settings shared by all controllers of the process
+progress_settings: Final = ProgressSettings()
+
+class SearchCancelled(Exception):
+    """Raised in the thread of a search when its progress stream was closed"""
+
+
+def stream_progress(search: Callable[[ProgressCallback], T], interval: float) -> Generator[SearchProgress, None, T]:
+    """Executes the search in a separate thread, yielding the latest snapshot it reported at most
+    once every interval
+
+    Args:
+        search (Callable[[ProgressCallback], T]): executes the search, reporting its snapshots to
+        the given callback
+        interval (float): minimum time (in seconds) between two yielded snapshots
+
+    Raises:
+        ValueError: if the interval is not positive
+
+    Yields:
+        Generator[SearchProgress, None, T]: snapshots of the search, returning the result of the search
+    """
+    if interval <= 0:
+        raise ValueError("The interval of the partial responses must be a positive number")
+
+    condition: threading.Condition = threading.Condition()
+    latest: Optional[SearchProgress] = None
+    finished: bool = False
+    cancelled: bool = False
+    result: Optional[T] = None
+    error: Optional[BaseException] = None
+
+    def report(snapshot: SearchProgress) -> None:
+        nonlocal latest
+        with condition:
+            if cancelled:
+                raise SearchCancelled()
+            latest = snapshot
+
+    def execute() -> None:
+        nonlocal finished, result, error
+        try:
+            result = search(report)
+        except BaseException as e:
+            error = e
+        finally:
+            with condition:
+                finished = True
+                condition.notify_all()
+
+    thread: threading.Thread = threading.Thread(target=execute, daemon=True)
+    thread.start()
+    try:
+        deadline: float = time.monotonic() + interval
+        while True:
+            snapshot: Optional[SearchProgress] = None
+            with condition:
+                condition.wait_for(lambda: finished, max(deadline - time.monotonic(), 0))
+                if finished:
+                    break
+                snapshot, latest = latest, None
+            deadline = time.monotonic() + interval
+            if not snapshot is None:
+                yield snapshot
+    finally:
+        with condition:
+            cancelled = not finished
+
+    if not error is None:
+        raise error
+    return result # type: ignore[return-value]
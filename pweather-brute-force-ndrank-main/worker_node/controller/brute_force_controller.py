@@ -1,15 +1,17 @@
 import logging
 import traceback
-from typing import Dict, Iterator, List, Tuple
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
 import grpc
 from auxiliar.ts_logger import get_ts_debug_handler
+from controller.auxiliar.progress_stream import progress_settings, stream_progress
 from controller.auxiliar.request_parameters_factory import list_of_files_factory, request_parameters_factory, separate_files_by_data_vars
 from controller.file_protocol.dtos.dataset_properties import InputFileProperties, factory_InputFileProperties
 from controller.file_protocol.file_protocol import FileProtocol, FileTransferInstance, factory_FilePortMapping
 from protocol import protocol_pb2_grpc
 from protocol.protocol_pb2 import AnalogueResponse, SearchRequest, SearchResponse
-from service.data_types import ResultContainer
-from service.service_main_structure import RequestParameters, ServiceLayer
+from service.data_types import ResultContainer, results_to_arrays
+from service.result_cache import result_cache
+from service.service_main_structure import ProgressCallback, RequestParameters, SearchProgress, ServiceLayer
 from correlation_functions.main_structure import CorrelationFunction
 from auxiliar.component_injector import component_injector
 
@@ -48,6 +50,41 @@ class BruteForceController(protocol_pb2_grpc.ControllerServiceServicer):
             FileProtocol(ip, from_port, to_port, temp_folder_path)
         self._delete_input_file: bool = delete_input_files
 
+    def _add_analogues(self, response: SearchResponse, results: Mapping[str, ResultContainer]) -> None:
+        """Adds the results of a search to the response
+
+        Args:
+            response (SearchResponse): response sent to the master
+            results (Mapping[str, ResultContainer]): results of the search
+        """
+        timestamps, values, sum_counters = results_to_arrays(results)
+        for ts, value, sum_counter in zip(timestamps, values.tolist(), sum_counters.tolist()):
+            analogue: AnalogueResponse = AnalogueResponse()
+            analogue.timestamp = ts
+            analogue.similarity_value = value
+            analogue.time_instances = sum_counter
+            response.analogues.append(analogue)
+
+    def _partial_response(self, snapshot: SearchProgress, corr_function: CorrelationFunction) -> SearchResponse:
+        """Builds the partial response with the best complete results found so far
+
+        Args:
+            snapshot (SearchProgress): latest snapshot of the search
+            corr_function (CorrelationFunction): used correlation function
+
+        Returns:
+            SearchResponse: partial response
+        """
+        response: SearchResponse = SearchResponse()
+        response.is_partial = True
+        response.progress.scanned_files = snapshot.scanned_files
+        response.progress.total_files = snapshot.total_files
+        if not snapshot.threshold is None:
+            response.progress.threshold = snapshot.threshold
+        self._add_analogues(response, snapshot.results)
+        response.reverse_sort_order_corr_function = corr_function.is_reverse_order()
+        return response
+
     def search_analogues(self, request: SearchRequest, context: grpc.ServicerContext) -> Iterator[SearchResponse]:
         """
         Receives request from master node.
@@ -55,7 +92,9 @@ class BruteForceController(protocol_pb2_grpc.ControllerServiceServicer):
         Worker uses streaming response in order to provide the socket port mapping for each file and
         the final response.
 
-        This happens in two different messages.
+        This happens in two different messages. When the partial responses are enabled (see 
+        "progress_settings"), the best results found so far are periodically sent between both 
+        messages, marked with "is_partial".
 
         Args:
             request (SearchRequest): grpc request
@@ -100,19 +139,42 @@ class BruteForceController(protocol_pb2_grpc.ControllerServiceServicer):
             
             #execute the search with the service
             debug_ts_logger.debug("STARTING SEARCH ON DATASET")
-            results: Dict[str, ResultContainer] = \
-                self._service.execute_search(separate_files_by_data_vars(created_files),request_parameters, corr_function,request.number_of_results)[0]
+            file_paths: Dict[str, List[str]] = separate_files_by_data_vars(created_files)
+            def search(progress: Optional[ProgressCallback]) -> Tuple[Mapping[str, ResultContainer], int]:
+                return self._service.execute_search(file_paths, request_parameters, corr_function,
+                    request.number_of_results, progress)
+
+            results: Mapping[str, ResultContainer]
+            input_size: int
+            #a repeated request returns the stored results without searching the repositories
+            cache_key: Optional[str] = None
+            cached_results: Optional[Tuple[Mapping[str, ResultContainer], int]] = None
+            if result_cache.is_enabled:
+                cache_key = result_cache.request_key(self._service, file_paths, request_parameters,
+                    request.correlation_function, request.number_of_results)
+                cached_results = result_cache.get(cache_key)
+            if not cached_results is None:
+                results, input_size = cached_results
+            elif progress_settings.is_enabled:
+                #the best results found so far are sent while the search is executed
+                snapshots = stream_progress(search, progress_settings.interval)
+                try:
+                    while True:
+                        snapshot: SearchProgress = next(snapshots)
+                        yield self._partial_response(snapshot, corr_function)
+                except StopIteration as finished:
+                    results, input_size = finished.value
+                finally:
+                    snapshots.close()
+            else:
+                results, input_size = search(None)
+            if cached_results is None and not cache_key is None:
+                result_cache.put(cache_key, results, input_size)
             debug_ts_logger.debug("ENDED SEARCH ON DATASET")
             
             logging.info("Search finished, sending results of request id " + request.request_id)
 
-            for ts in results:
-                analogue: AnalogueResponse = AnalogueResponse()
-                analogue.timestamp = ts
-                analogue.similarity_value = results[ts].value
-                analogue.time_instances = results[ts].sum_counter
-                response.analogues.append(analogue)
-
+            self._add_analogues(response, results)
             response.reverse_sort_order_corr_function = corr_function.is_reverse_order()
             yield response
 
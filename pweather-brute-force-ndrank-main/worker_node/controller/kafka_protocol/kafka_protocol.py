@@ -1,6 +1,7 @@
 import json, logging
-from typing import Any, Dict, Final, Iterator, List, Optional
+from typing import Any, Dict, Final, Iterator, List, Mapping, Optional
 import numpy as np
+import numpy.typing as npt
 from schema import Schema #type: ignore
 from protocol.protocol_pb2 import SearchRequest
 
@@ -9,7 +10,7 @@ from kafka.producer.future import FutureRecordMetadata #type: ignore
 from kafka import KafkaConsumer, TopicPartition #type: ignore
 from kafka.consumer.fetcher import ConsumerRecord #type: ignore
 
-from service.data_types import CandidateContainer, ResultContainer
+from service.data_types import CandidateContainer, ResultContainer, results_to_arrays
 from service.service_main_structure import HeuristicResult
 
 """The code in this package encapsulates the communication 
@@ -107,12 +108,13 @@ class KafkaProtocol:
             buffer_memory=SIZE_KAFKA_MESSAGE
         )
 
-    def convert_results_to_kafka_object(self, results: Dict[str, ResultContainer], input_size: int,
+    def convert_results_to_kafka_object(self, results: Mapping[str, ResultContainer], input_size: int,
          num_results: int, is_reverse_order: bool) -> Dict:
-        """Converts the ResultContainer object to the defined structure for the kafka message queue
+        """Converts the results (usually a ResultStore, which is read directly) to the defined structure 
+        for the kafka message queue
 
         Args:
-            results (Dict[str, ResultContainer]): message with the results that should be sent
+            results (Mapping[str, ResultContainer]): message with the results that should be sent
             input_size (int): size of the input provided for the search
             num_results (int): number of the results the request provided as an input
             is_reverse_order (bool): if the sorting order for similarity should be reversed
@@ -124,12 +126,15 @@ class KafkaProtocol:
         final_resuls: List[Dict[str, Any]] = []     # has the timestamp, the final value
         partial_results: List[Dict[str, Any]] = []  # has the timestamp, the current value and sum counter
 
-        for key in results:
-            container: ResultContainer = results[key]
-            if container.sum_counter == input_size:
-                final_resuls.append({TIMESTAMP: key, VALUE:container.value/input_size})
+        timestamps: List[str]
+        values: npt.NDArray[np.float64]
+        sum_counters: npt.NDArray[np.int64]
+        timestamps, values, sum_counters = results_to_arrays(results)
+        for key, value, sum_counter in zip(timestamps, values.tolist(), sum_counters.tolist()):
+            if sum_counter == input_size:
+                final_resuls.append({TIMESTAMP: key, VALUE: value/input_size})
             else:
-                partial_results.append({TIMESTAMP: key, VALUE: container.value, SUM_COUNTER: container.sum_counter})
+                partial_results.append({TIMESTAMP: key, VALUE: value, SUM_COUNTER: sum_counter})
         
         res[FINAL_RESULT_TAG] = final_resuls
         res[PARTIAL_RESULT_TAG] = partial_results
@@ -1,6 +1,6 @@
 import logging, subprocess, traceback, xarray, grpc
 import numpy as np
-from typing import Dict, Iterator, List, Optional, Tuple
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
 from controller.auxiliar.request_parameters_factory import list_of_files_factory, request_parameters_factory, separate_files_by_data_vars
 from controller.file_protocol.dtos.dataset_properties import InputFileProperties, factory_InputFileProperties
 from controller.file_protocol.file_protocol import FileProtocol, FileTransferInstance, factory_FilePortMapping
@@ -8,7 +8,8 @@ from controller.kafka_protocol.kafka_protocol import KafkaProtocol
 from protocol import protocol_pb2_grpc
 from protocol.protocol_pb2 import AnalogueResponse, SearchRequest, SearchResponse
 from repository.repository_layer import RepositoryMetadata
-from service.data_types import ResultContainer
+from service.data_types import ResultContainer, results_to_arrays
+from service.result_cache import result_cache
 from service.service_main_structure import RequestParameters, ServiceLayer
 from auxiliar.xarray_aux import open_dataset_with_file_name
 from correlation_functions.main_structure import CorrelationFunction
@@ -133,7 +134,7 @@ class NdrankController(protocol_pb2_grpc.ControllerServiceServicer):
 
     def _process_candidates(self, service: ServiceLayer, input: Dict[str,List[str]], 
         request: SearchRequest, request_parameters: RequestParameters, 
-        corr_function: CorrelationFunction) -> Tuple[Dict[str, ResultContainer], int]:
+        corr_function: CorrelationFunction) -> Tuple[Mapping[str, ResultContainer], int]:
         """Executes the search for candidates and returns the obtained results
 
         Args:
@@ -144,7 +145,7 @@ class NdrankController(protocol_pb2_grpc.ControllerServiceServicer):
             corr_function (CorrelationFunction): used correlation function
 
         Returns:
-            Tuple[Dict[str, ResultContainer], int]: final results after the list of 
+            Tuple[Mapping[str, ResultContainer], int]: final results after the list of 
             candidates has been used
         """
         logging.debug("Searching for candidates")
@@ -165,6 +166,38 @@ class NdrankController(protocol_pb2_grpc.ControllerServiceServicer):
                 self._kafka_protocol.get_candidates_kafka(request), 
                 input, request_parameters, corr_function, request.number_of_results)
 
+    def _search_low_resolution(self, input: Dict[str,List[str]], low_res_input: Dict[str,List[str]], request: SearchRequest, 
+        request_parameters: RequestParameters, corr_function: CorrelationFunction) -> Tuple[Mapping[str, ResultContainer], int]:
+        """Executes the search in the low resolution dataset, unless the results of the same request
+        are stored in the result cache
+
+        Args:
+            input (Dict[str,List[str]]): received input, which identifies the request in the cache (the 
+            reduction of its resolution only depends on the settings of the repositories)
+            low_res_input (Dict[str,List[str]]): input with reduced resolution
+            request (SearchRequest): received request
+            request_parameters (RequestParameters): parameters of the request
+            corr_function (CorrelationFunction): correlation function to be used
+
+        Returns:
+            Tuple[Mapping[str, ResultContainer], int]: results of the low resolution search and size of the input
+        """
+        if not result_cache.is_enabled:
+            return self._low_resolution_service.execute_search(low_res_input, request_parameters, 
+                corr_function, request.number_of_results)
+
+        cache_key: str = result_cache.request_key(self._low_resolution_service, input, 
+            request_parameters, request.correlation_function, request.number_of_results)
+        cached_results: Optional[Tuple[Mapping[str, ResultContainer], int]] = result_cache.get(cache_key)
+        if not cached_results is None:
+            return cached_results
+        results: Mapping[str, ResultContainer]
+        input_size: int
+        results, input_size = self._low_resolution_service.execute_search(low_res_input, request_parameters, 
+            corr_function, request.number_of_results)
+        result_cache.put(cache_key, results, input_size)
+        return results, input_size
+
     def search_analogues(self, request: SearchRequest, context: grpc.ServicerContext) -> Iterator[SearchResponse]:
         """
         Receives request from master node.
@@ -189,7 +222,7 @@ class NdrankController(protocol_pb2_grpc.ControllerServiceServicer):
             original_input: List[Tuple[str,InputFileProperties]]
             original_input_organized: Dict[str,List[str]]
             low_res_input: Dict[str,List[str]]
-            results: Dict[str, ResultContainer]
+            results: Mapping[str, ResultContainer]
             input_size: int
             logging.info("Received a new request with id: " + request.request_id + ", mapping ports")
             logging.debug(request)
@@ -232,9 +265,7 @@ class NdrankController(protocol_pb2_grpc.ControllerServiceServicer):
                             corr_function, request.numberOfResults)
             else:
                 results, input_size = \
-                    self._low_resolution_service.execute_search(
-                        low_res_input, request_parameters, 
-                        corr_function, request.number_of_results)
+                    self._search_low_resolution(original_input_organized, low_res_input, request, request_parameters, corr_function)
                         
                 logging.info("Search finished in low resolution dataset, sending results of request id " + request.request_id)
 
@@ -263,11 +294,12 @@ class NdrankController(protocol_pb2_grpc.ControllerServiceServicer):
             
                 logging.info("Search finished, sending results of request id " + request.request_id)
             
-            for ts in results:
+            timestamps, values, sum_counters = results_to_arrays(results)
+            for ts, value, sum_counter in zip(timestamps, values.tolist(), sum_counters.tolist()):
                 analogue: AnalogueResponse = AnalogueResponse()
                 analogue.timestamp = ts
-                analogue.similarity_value = results[ts].value
-                analogue.time_instances = results[ts].sum_counter
+                analogue.similarity_value = value
+                analogue.time_instances = sum_counter
                 response.analogues.append(analogue)
 
             response.reverse_sort_order_corr_function = corr_function.is_reverse_order()
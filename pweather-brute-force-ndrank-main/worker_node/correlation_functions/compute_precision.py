@@ -0,0 +1,58 @@
+from typing import Dict, Final, Type
+import numpy as np
+
+"""The batched calculation of the similarity values ("CorrelationFunction.calculate_batch")
+can be done either in double precision (float64) or in single precision (float32). The
+source data is stored as float32, so the single precision avoids doubling the memory that
+is moved during a search. In single precision the sums are still accumulated in float64,
+so that only the values of each field are kept in float32.
+"""
+
+FLOAT64_PRECISION: Final = "float64"
+FLOAT32_PRECISION: Final = "float32"
+COMPUTE_PRECISION_DTYPES: Final[Dict[str, Type[np.floating]]] = {
+    FLOAT64_PRECISION: np.float64,
+    FLOAT32_PRECISION: np.float32
+}
+
+class ComputePrecision:
+    """Precision used by the batched calculation of the similarity values
+    """
+
+    def __init__(self, mode: str = FLOAT64_PRECISION) -> None:
+        """
+        Args:
+            mode (str, optional): name of the precision. Defaults to FLOAT64_PRECISION.
+
+        Raises:
+            ValueError: if the precision does not exist
+        """
+        self._mode: str
+        self.mode = mode
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode: str) -> None:
+        if not mode in COMPUTE_PRECISION_DTYPES:
+            raise ValueError("Invalid compute precision " + str(mode) + ". Available: " +
+                ", ".join(COMPUTE_PRECISION_DTYPES.keys()))
+        self._mode = mode
+
+    @property
+    def dtype(self) -> Type[np.floating]:
+        """Type in which the values of the fields are kept"""
+        return COMPUTE_PRECISION_DTYPES[self._mode]
+
+    @property
+    def is_single_precision(self) -> bool:
+        return self._mode == FLOAT32_PRECISION
+
+    def __str__(self) -> str:
+        return self._mode
+
+
+#precision shared by all correlation functions of the process
+compute_precision: Final = ComputePrecision()
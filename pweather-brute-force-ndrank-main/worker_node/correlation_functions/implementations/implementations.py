@@ -1,17 +1,24 @@
 from datetime import datetime
 import logging
 import math
-from typing import Any, Dict, Final, Optional, Tuple
+from typing import Any, Callable, Dict, Final, FrozenSet, Hashable, List, Optional, Tuple, Union
 import pandas
 import xarray
 import numpy as np
+import numpy.typing as npt
 import yaml
 from auxiliar.aux_methods import fix_path
+from auxiliar.climatology_cache import ClimatologyCache, climatology_cache
 
 from auxiliar.component_injector import component_injector
 from auxiliar.xarray_aux import open_dataarray_with_file_name
+from correlation_functions.compute_precision import compute_precision
 from correlation_functions.correlation_statistics import CorrelationStatistics
 from correlation_functions.main_structure import CorrelationFunction
+from correlation_functions.moments import COUNT, DATASET_COUNT, SUM_DATASET, SUM_INPUT, SUM_PRODUCTS, \
+    SUM_SQUARES_DATASET, SUM_SQUARES_INPUT, Moments
+from correlation_functions.prepared_input import PreparedInput
+from repository.auxiliary_structures.field_statistics import FieldMask, FieldStatistics
 from repository.repository_layer import RepositoryMetadata
 
 CORRELATION_FUNCTIONS: Final = "correlation-functions"
@@ -19,6 +26,16 @@ AVERAGE_FOLDER: Final = "average-path"
 STANDARD_DEVIATION_FOLDER: Final = "standard-deviation-path"
 AVERAGE_FILE_NAME: Final = "average.yaml"
 STANDARD_DEVIATION_FILE_NAME: Final = "standard_deviation.yaml"
+CLIMATOLOGY_CACHE_SIZE: Final = "climatology-cache-size"
+USE_STANDARDIZED_REPOSITORIES: Final = "use-standardized-repositories"
+
+#values stored in the prepared inputs
+CENTRED_VALUES: Final = "centred-values"
+CENTRED_NORM: Final = "centred-norm"
+FLAT_VALUES: Final = "flat-values"
+SQUARED_NORM: Final = "squared-norm"
+#number of grid points multiplied at once in single precision, before being accumulated in float64
+ACCUMULATION_CHUNK_SIZE: Final = 4096
 
 def process_properties(properties_path: str) -> Dict[str, Any]:
     """Processes the properties file to retrieve required properties
@@ -45,21 +62,36 @@ class ParameterFileCollection:
     and facilitates indexing
     """
 
-    def __init__(self, path: str, file_name: str) -> None:
+    def __init__(self, path: str, file_name: str, replace_zeros: bool = False, 
+        cache: ClimatologyCache = climatology_cache) -> None:
         """Basic contructor. Opens the file and stores the required
         structures to index these files
 
         Args:
             path (str): path where all the files can be found
             file_name (str): name of the yaml file that indexes existing files
+            replace_zeros (bool): if zeros (and missing values) should be replaced by 10^(-10)
+            when the array is loaded. Used for the standard deviation to avoid divisions by zero
+            cache (ClimatologyCache): cache where the loaded arrays are kept. Defaults to the 
+            cache shared by the whole process
         """
         self._files: Dict[int,Dict[int,Dict[int,str]]] #the keys go in the following order: month,day,hour
         self._file_path: str = path
+        self._replace_zeros: bool = replace_zeros
+        self._cache: ClimatologyCache = cache
         with open(self._file_path + file_name, 'r') as f:
             self._files = yaml.safe_load(f)
 
+    def _load_array(self, file_path: str) -> xarray.DataArray:
+        with open_dataarray_with_file_name(file_path) as array:
+            array = array.load()
+        if self._replace_zeros:
+            array = array.where(array.values != 0).fillna(10**(-10))
+        return array
+
     def get_array(self, month: int, day: int, hour: int) -> xarray.DataArray:
-        """Indexes file that matches the given day
+        """Indexes file that matches the given day. The array is 
+        kept in the cache, so that the file is only read once
 
         Args:
             month (int): month required
@@ -67,9 +99,404 @@ class ParameterFileCollection:
             hour (int): hour required
 
         Returns:
-            str: path of the file
+            xarray.DataArray: array stored in the file
         """
-        return open_dataarray_with_file_name(self._file_path + self._files[month][day][hour])
+        file_path: str = self._file_path + self._files[month][day][hour]
+        return self._cache.get((file_path, self._replace_zeros), lambda: self._load_array(file_path))
+
+
+def _block_to_matrix(block: xarray.DataArray, dims: Tuple[Hashable, ...]) -> npt.NDArray[np.float64]:
+    """Converts a block of time instances into a matrix with one row per time instance,
+    in the type of the compute precision ("compute_precision")
+
+    Args:
+        block (xarray.DataArray): block with the time instances in the first dimension
+        dims (Tuple[Hashable, ...]): order of the dimensions to be used
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (time instances, grid points)
+    """
+    values: npt.NDArray = block.transpose(*dims).values
+    return np.asarray(values, dtype=compute_precision.dtype).reshape(values.shape[0], -1)
+
+def _cross_products(dataset_values: npt.NDArray[np.float64], 
+    input_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Calculates the sum of the products between every row of both matrices (dataset_values @ input_values.T).
+    Matrices in single precision are multiplied in chunks of grid points, with the results accumulated in float64
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    if dataset_values.dtype == np.float64 and input_values.dtype == np.float64:
+        return dataset_values @ input_values.T
+    res: npt.NDArray[np.float64] = np.zeros((dataset_values.shape[0], input_values.shape[0]))
+    for start in range(0, dataset_values.shape[1], ACCUMULATION_CHUNK_SIZE):
+        end: int = start + ACCUMULATION_CHUNK_SIZE
+        res += dataset_values[:, start:end] @ input_values[:, start:end].T
+    return res
+
+def _pcc_matrix(dataset_values: npt.NDArray[np.float64], 
+    input_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Calculates the Pearson Correlation Coefficient between every row of both matrices.
+    Only the positions where both rows have values are used (same behaviour as xarray.corr)
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    res: npt.NDArray[np.float64] = np.empty((dataset_values.shape[0], input_values.shape[0]))
+    dataset_valid: npt.NDArray[np.bool_] = ~np.isnan(dataset_values)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(input_values.shape[0]):
+            valid: npt.NDArray[np.bool_] = dataset_valid & ~np.isnan(input_values[i])
+            count: npt.NDArray[np.int64] = valid.sum(axis=1)
+            dataset_part: npt.NDArray[np.float64] = np.where(valid, dataset_values, 0.0)
+            input_part: npt.NDArray[np.float64] = np.where(valid, input_values[i], 0.0)
+
+            dataset_mean: npt.NDArray[np.float64] = dataset_part.sum(axis=1, dtype=np.float64) / count
+            input_mean: npt.NDArray[np.float64] = input_part.sum(axis=1, dtype=np.float64) / count
+            dataset_part = np.where(valid, dataset_part - dataset_mean.astype(dataset_values.dtype)[:, None], 0.0)
+            input_part = np.where(valid, input_part - input_mean.astype(input_values.dtype)[:, None], 0.0)
+
+            res[:, i] = (dataset_part * input_part).sum(axis=1, dtype=np.float64) / \
+                np.sqrt((dataset_part**2).sum(axis=1, dtype=np.float64) * (input_part**2).sum(axis=1, dtype=np.float64))
+    return res
+
+def _rmsd_matrix(dataset_values: npt.NDArray[np.float64], 
+    input_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Calculates the Root Mean Square Distance between every row of both matrices.
+    The sum is divided by the number of values in the dataset row (same behaviour as Rmsd.calculate)
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    res: npt.NDArray[np.float64] = np.empty((dataset_values.shape[0], input_values.shape[0]))
+    count: npt.NDArray[np.int64] = (~np.isnan(dataset_values)).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(input_values.shape[0]):
+            res[:, i] = np.sqrt(np.nansum((dataset_values - input_values[i])**2, axis=1, dtype=np.float64) / count)
+    return res
+
+def _squared_distance_matrix(dataset_values: npt.NDArray[np.float64], 
+    input_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Calculates the sum of the squared differences between every row of both matrices.
+    Requires both matrices to not have missing values
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    if dataset_values.dtype == np.float64:
+        distance: npt.NDArray[np.float64] = np.einsum("ij,ij->i", dataset_values, dataset_values)[:, None] + \
+            np.einsum("ij,ij->i", input_values, input_values)[None, :] - 2 * (dataset_values @ input_values.T)
+        return np.maximum(distance, 0.0)
+    #in single precision the expansion of the squared norms loses the distance (see "Rmsd.calculate_batch")
+    return _direct_squared_distance_matrix(dataset_values, input_values)
+
+def _direct_squared_distance_matrix(dataset_values: npt.NDArray[np.float64], 
+    input_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Same as "_squared_distance_matrix", but summing the squared differences themselves instead of
+    expanding the squared norms, so there is no cancellation (one input row at a time, to limit the memory)
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    res: npt.NDArray[np.float64] = np.empty((dataset_values.shape[0], input_values.shape[0]))
+    for i in range(input_values.shape[0]):
+        res[:, i] = ((dataset_values - input_values[i])**2).sum(axis=1, dtype=np.float64)
+    return res
+
+def _rmsd_lower_bound(partial_squared_sum: Any, total_count: Any) -> Any:
+    """Lower bound of the RMSD when only part of the squared differences was summed, since
+    the missing differences can only increase the value (for a complete sum it is the RMSD itself)
+
+    Args:
+        partial_squared_sum (Any): sum of the squared differences already calculated (float or array)
+        total_count (Any): number of values of the full field (int or array)
+
+    Returns:
+        Any: lower bound of the RMSD
+    """
+    return np.sqrt(partial_squared_sum / total_count)
+
+def _unit_partial_bounds(top_sum: float, bottom_sum_input: float, bottom_sum_dataset: float, 
+    input_mean: float, dataset_mean: float, missing_count: int) -> Tuple[float, float]:
+    """Bounds of the PCC of standardized fields when part of the values is missing, assuming that
+    every missing value is either 1 or -1
+
+    Args:
+        top_sum (float): sum of the products of the centred known values
+        bottom_sum_input (float): sum of the squares of the centred known values of the input
+        bottom_sum_dataset (float): sum of the squares of the centred known values of the dataset
+        input_mean (float): mean of the full input field
+        dataset_mean (float): mean of the full dataset field
+        missing_count (int): number of missing values
+
+    Returns:
+        Tuple[float, float]: best and worst possible values
+    """
+    best_value: float = (top_sum + (1 - input_mean) * (1 - dataset_mean) * missing_count) / \
+        ((bottom_sum_input + (1 - input_mean)**2 * missing_count) *
+        (bottom_sum_dataset + (1 - dataset_mean)**2 * missing_count))**(1/2)
+    worst_value: float = (top_sum + (-1 - input_mean) * (-1 - dataset_mean) * missing_count) / \
+        ((bottom_sum_input + (-1 - input_mean)**2 * missing_count) *
+        (bottom_sum_dataset + (-1 - dataset_mean)**2 * missing_count))**(1/2)
+
+    if best_value < worst_value:
+        best_value, worst_value = worst_value, best_value
+    return (best_value, worst_value)
+
+def _cauchy_schwarz_partial_bounds(top_sum: float, bottom_sum_input: float, bottom_sum_dataset: float,
+    input_squared_norm: float, dataset_squared_norm: float) -> Optional[Tuple[float, float]]:
+    """Bounds of the PCC when part of the values is missing, given the squared norms of the full
+    centred fields. The denominator of the PCC is the product of both norms, while the products of the
+    missing values can at most sum (in absolute value) the product of the norms of the missing portions
+    (Cauchy–Schwarz inequality). The bounds are valid for any missing values
+
+    Args:
+        top_sum (float): sum of the products of the centred known values
+        bottom_sum_input (float): sum of the squares of the centred known values of the input
+        bottom_sum_dataset (float): sum of the squares of the centred known values of the dataset
+        input_squared_norm (float): sum of the squares of all centred values of the input
+        dataset_squared_norm (float): sum of the squares of all centred values of the dataset
+
+    Returns:
+        Optional[Tuple[float, float]]: best and worst possible values or None if one of the fields is constant
+    """
+    denominator: float = math.sqrt(input_squared_norm * dataset_squared_norm)
+    if denominator == 0:
+        return None
+    missing_product: float = math.sqrt(max(input_squared_norm - bottom_sum_input, 0.0) * 
+        max(dataset_squared_norm - bottom_sum_dataset, 0.0))
+    return (min((top_sum + missing_product) / denominator, 1.0), max((top_sum - missing_product) / denominator, -1.0))
+
+def _valid_columns(dataset_statistics: FieldStatistics, dataset_values: npt.NDArray[np.float64],
+    input_values: npt.NDArray[np.float64]) -> Optional[Union[slice, npt.NDArray[np.int64]]]:
+    """Verifies if the precomputed statistics can be used, which only happens when every
+    dataset row has values in the same positions and the input rows have values in all of them.
+    The valid positions are known from the statistics (the mask of the data variable or a 
+    complete count), so the dataset rows are never searched for missing values
+
+    Args:
+        dataset_statistics (FieldStatistics): precomputed statistics of the dataset rows
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+
+    Returns:
+        Optional[Union[slice, npt.NDArray[np.int64]]]: valid columns of both matrices (a full slice
+    when there are no missing values) or None if the statistics can not be used
+    """
+    if len(dataset_statistics.count) != dataset_values.shape[0]:
+        return None
+    columns: Union[slice, npt.NDArray[np.int64]] = slice(None)
+    mask: Optional[FieldMask] = dataset_statistics.mask
+    if not mask is None and len(mask) == dataset_values.shape[1] and \
+        bool(np.all(dataset_statistics.count == mask.valid_count)):
+        columns = mask.columns
+    elif not bool(np.all(dataset_statistics.count == dataset_values.shape[1])):
+        return None
+    if bool(np.isnan(input_values[:, columns]).any()):
+        return None
+    return columns
+
+def _pcc_matrix_with_statistics(dataset_values: npt.NDArray[np.float64], input_values: npt.NDArray[np.float64],
+    dataset_statistics: FieldStatistics) -> npt.NDArray[np.float64]:
+    """Calculates the Pearson Correlation Coefficient between every row of both matrices
+    using the precomputed sums of the dataset rows. Only the cross term is calculated,
+    as sum(a * (b - mean(b))) is equal to sum((a - mean(a)) * (b - mean(b))).
+    Requires both matrices to not have missing values
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+        dataset_statistics (FieldStatistics): precomputed statistics of the dataset rows
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    count: npt.NDArray[np.float64] = dataset_statistics.count.astype(np.float64)
+    input_centered: npt.NDArray[np.float64] = \
+        (input_values - input_values.mean(axis=1, dtype=np.float64)[:, None]).astype(input_values.dtype, copy=False)
+    dataset_squares: npt.NDArray[np.float64] = \
+        np.maximum(dataset_statistics.sum_squares - dataset_statistics.sum**2 / count, 0.0)
+    input_squares: npt.NDArray[np.float64] = np.einsum("ij,ij->i", input_centered, input_centered, dtype=np.float64)
+    if dataset_values.dtype != np.float64:
+        #in single precision the products of the values that are not centred lose most of the
+        # significant digits (the mean is usually much larger than the variation)
+        dataset_values = dataset_values - (dataset_statistics.sum / count).astype(dataset_values.dtype)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _cross_products(dataset_values, input_centered) / np.sqrt(dataset_squares[:, None] * input_squares[None, :])
+
+def _rmsd_matrix_with_statistics(dataset_values: npt.NDArray[np.float64], input_values: npt.NDArray[np.float64],
+    dataset_statistics: FieldStatistics, 
+    input_squares: Optional[npt.NDArray[np.float64]] = None) -> npt.NDArray[np.float64]:
+    """Calculates the Root Mean Square Distance between every row of both matrices using
+    the precomputed sums of squares of the dataset rows: sum((a - b)^2) = sum(a^2) - 2 * sum(a * b) + sum(b^2).
+    Requires both matrices to not have missing values
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+        dataset_statistics (FieldStatistics): precomputed statistics of the dataset rows
+        input_squares (Optional[npt.NDArray[np.float64]]): sums of squares of the input rows, 
+        if already known. Defaults to None.
+
+    Returns:
+        npt.NDArray[np.float64]: matrix with shape (S, T)
+    """
+    if input_squares is None:
+        input_squares = np.einsum("ij,ij->i", input_values, input_values)
+    distance: npt.NDArray[np.float64] = dataset_statistics.sum_squares[:, None] + input_squares[None, :] - \
+        2 * (dataset_values @ input_values.T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sqrt(np.maximum(distance, 0.0) / dataset_statistics.count[:, None])
+
+def _values_matching_input(dataarray: xarray.DataArray, input_array: xarray.DataArray) -> Optional[npt.NDArray[np.float64]]:
+    """Flattens the values of an array of the dataset in the same order as the input array
+
+    Args:
+        dataarray (xarray.DataArray): array of the dataset (may have extra dimensions with a single value)
+        input_array (xarray.DataArray): input array
+
+    Returns:
+        Optional[npt.NDArray[np.float64]]: flattened values or None if both arrays do not share the same grid
+    """
+    extra_dims: List[Hashable] = [dim for dim in dataarray.dims if not dim in input_array.dims]
+    if any(dataarray.sizes[dim] != 1 for dim in extra_dims) or \
+        any(not dim in dataarray.dims or dataarray.sizes[dim] != input_array.sizes[dim] for dim in input_array.dims):
+        return None
+    for dim in input_array.dims:
+        if dim in dataarray.indexes and dim in input_array.indexes and \
+            not dataarray.indexes[dim].equals(input_array.indexes[dim]):
+            return None
+    if len(extra_dims) > 0:
+        dataarray = dataarray.squeeze(extra_dims, drop=True)
+    return np.asarray(dataarray.transpose(*input_array.dims).values, dtype=np.float64).ravel()
+
+def _prepare_centred_input(input_array: xarray.DataArray) -> PreparedInput:
+    """Prepares the input for the calculation of the PCC, by storing the input
+    centred on its mean and the respective norm. Inputs with missing values are 
+    not prepared, as the mean depends on the valid positions of the dataset
+
+    Args:
+        input_array (xarray.DataArray): input array (already processed, if necessary)
+
+    Returns:
+        PreparedInput: prepared input
+    """
+    values: npt.NDArray[np.float64] = np.asarray(input_array.values, dtype=np.float64).ravel()
+    if np.isnan(values).any():
+        return PreparedInput(input_array)
+    centred: npt.NDArray[np.float64] = values - values.mean()
+    return PreparedInput(input_array, {
+        CENTRED_VALUES: centred,
+        CENTRED_NORM: math.sqrt(np.dot(centred, centred))
+    })
+
+def _prepared_pcc(dataarray: xarray.DataArray, prepared_input: PreparedInput, is_dense: bool = False) -> Optional[float]:
+    """Calculates the PCC with an input prepared with "_prepare_centred_input"
+
+    Args:
+        dataarray (xarray.DataArray): array of the dataset (already processed, if necessary)
+        prepared_input (PreparedInput): prepared input
+        is_dense (bool, optional): if the array of the dataset is already known to not have missing
+        values (see "field_statistics"). Defaults to False.
+
+    Returns:
+        Optional[float]: PCC or None if the prepared values can not be used
+    """
+    prepared_values: Dict[str, Any] = prepared_input.get_values()
+    if not CENTRED_VALUES in prepared_values:
+        return None
+    dataset_values: Optional[npt.NDArray[np.float64]] = _values_matching_input(dataarray, prepared_input.array)
+    if dataset_values is None or (not is_dense and np.isnan(dataset_values).any()):
+        return None
+    dataset_values = dataset_values - dataset_values.mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.dot(dataset_values, prepared_values[CENTRED_VALUES]) / 
+            (np.sqrt(np.dot(dataset_values, dataset_values)) * prepared_values[CENTRED_NORM]))
+
+def _squared_distance(dataset_values: npt.NDArray[np.float64], input_values: npt.NDArray[np.float64],
+    dataset_squared_norm: Optional[float] = None, input_squared_norm: Optional[float] = None) -> float:
+    """Calculates the sum of the squared differences of two flattened arrays by expanding 
+    it into sum(a^2) - 2 * sum(a * b) + sum(b^2), so that the difference is never created.
+    Requires both arrays to not have missing values
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): flattened values of the dataset
+        input_values (npt.NDArray[np.float64]): flattened values of the input (same order)
+        dataset_squared_norm (Optional[float]): sum(a^2), if already known. Defaults to None.
+        input_squared_norm (Optional[float]): sum(b^2), if already known. Defaults to None.
+
+    Returns:
+        float: sum of the squared differences
+    """
+    if dataset_squared_norm is None:
+        dataset_squared_norm = float(np.dot(dataset_values, dataset_values))
+    if input_squared_norm is None:
+        input_squared_norm = float(np.dot(input_values, input_values))
+    #rounding errors may result in a slightly negative value when both arrays are (almost) equal
+    return max(dataset_squared_norm + input_squared_norm - 2 * float(np.dot(dataset_values, input_values)), 0.0)
+
+def _dense_values(dataarray: xarray.DataArray, 
+    input_array: xarray.DataArray) -> Optional[Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]]:
+    """Flattens the values of an array of the dataset and of an input array in the same order
+
+    Args:
+        dataarray (xarray.DataArray): array of the dataset
+        input_array (xarray.DataArray): input array
+
+    Returns:
+        Optional[Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]]: flattened values of both arrays or
+    None if they do not share the same grid or have missing values
+    """
+    dataset_values: Optional[npt.NDArray[np.float64]] = _values_matching_input(dataarray, input_array)
+    if dataset_values is None or np.isnan(dataset_values).any():
+        return None
+    input_values: npt.NDArray[np.float64] = np.asarray(input_array.values, dtype=np.float64).ravel()
+    if np.isnan(input_values).any():
+        return None
+    return dataset_values, input_values
+
+def _prepared_inputs_to_matrix(prepared_inputs: List[PreparedInput], 
+    dims: Tuple[Hashable, ...]) -> Optional[npt.NDArray[np.float64]]:
+    """Converts the arrays of the prepared inputs into a matrix with one row per input
+
+    Args:
+        prepared_inputs (List[PreparedInput]): prepared inputs
+        dims (Tuple[Hashable, ...]): order of the dimensions to be used
+
+    Returns:
+        Optional[npt.NDArray[np.float64]]: matrix with shape (T, grid points) or None if 
+    the arrays do not have the given dimensions
+    """
+    rows: List[npt.NDArray[np.float64]] = []
+    for prepared_input in prepared_inputs:
+        if set(prepared_input.array.dims) != set(dims):
+            return None
+        rows.append(np.asarray(prepared_input.array.transpose(*dims).values, dtype=compute_precision.dtype).ravel())
+    return np.stack(rows)
 
 
 @component_injector.inject_correlation_function("pcc")
@@ -79,6 +506,48 @@ class Pcc(CorrelationFunction):
     def calculate(self, dataarray1: xarray.DataArray, dataarray2: xarray.DataArray, repository_metadata: RepositoryMetadata, variable: str) -> float:
         return xarray.corr(dataarray1,dataarray2).data.item()
 
+    def prepare_input(self, input_array: xarray.DataArray, repository_metadata: RepositoryMetadata, 
+        variable: str) -> PreparedInput:
+        return _prepare_centred_input(input_array)
+
+    def calculate_prepared(self, dataarray: xarray.DataArray, prepared_input: PreparedInput, 
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None) -> float:
+        #a complete field in the statistics means that there are no missing values
+        res: Optional[float] = _prepared_pcc(dataarray, prepared_input, not dataset_statistics is None and 
+            len(dataset_statistics.count) == 1 and dataset_statistics.count[0] == prepared_input.array.size)
+        if res is None:
+            return self.calculate(dataarray, prepared_input.array, repository_metadata, variable)
+        return res
+
+    @property
+    def supports_batch(self) -> bool:
+        return True
+
+    def calculate_batch(self, dataset_block: xarray.DataArray, input_block: xarray.DataArray,
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None, 
+        prepared_inputs: Optional[List[PreparedInput]] = None) -> npt.NDArray[np.float64]:
+        dataset_values: npt.NDArray[np.float64] = _block_to_matrix(dataset_block, dataset_block.dims)
+        input_values: npt.NDArray[np.float64] = _block_to_matrix(input_block, dataset_block.dims)
+        columns: Optional[Union[slice, npt.NDArray[np.int64]]] = None if dataset_statistics is None else \
+            _valid_columns(dataset_statistics, dataset_values, input_values)
+        if not dataset_statistics is None and not columns is None:
+            return _pcc_matrix_with_statistics(dataset_values[:, columns], input_values[:, columns], dataset_statistics)
+        return _pcc_matrix(dataset_values, input_values)
+
+    @property
+    def required_moments(self) -> Optional[FrozenSet[str]]:
+        return frozenset([COUNT, SUM_DATASET, SUM_INPUT, SUM_SQUARES_DATASET, SUM_SQUARES_INPUT, SUM_PRODUCTS])
+
+    def calculate_from_moments(self, moments: Moments) -> npt.NDArray[np.float64]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            count: npt.NDArray[np.float64] = moments[COUNT]
+            covariance: npt.NDArray[np.float64] = moments[SUM_PRODUCTS] - moments[SUM_DATASET] * moments[SUM_INPUT] / count
+            dataset_squares: npt.NDArray[np.float64] = moments[SUM_SQUARES_DATASET] - moments[SUM_DATASET]**2 / count
+            input_squares: npt.NDArray[np.float64] = moments[SUM_SQUARES_INPUT] - moments[SUM_INPUT]**2 / count
+            return covariance / np.sqrt(np.maximum(dataset_squares, 0.0) * np.maximum(input_squares, 0.0))
+
     def is_reverse_order(self) -> bool:
         return True
 
@@ -102,6 +571,7 @@ class EnhancedPcc(CorrelationFunction):
 
     _MEAN: Final = "mean"
     _COUNT: Final = "count"
+    _SQUARED_NORM: Final = "squared_norm"
 
     @property
     def max_value(self) -> float:
@@ -117,6 +587,7 @@ class EnhancedPcc(CorrelationFunction):
         super().__init__(name, properties_path)
         self._average_files: ParameterFileCollection
         self._standard_deviation_files: ParameterFileCollection
+        self._use_standardized_repositories: bool = True
 
         if not properties_path is None:
             self._setup_properties()
@@ -129,7 +600,30 @@ class EnhancedPcc(CorrelationFunction):
         average_path: str = fix_path(properties[CORRELATION_FUNCTIONS][AVERAGE_FOLDER])
         std_deviation_path: str = fix_path(properties[CORRELATION_FUNCTIONS][STANDARD_DEVIATION_FOLDER])
         self._average_files = ParameterFileCollection(average_path, AVERAGE_FILE_NAME)
-        self._standard_deviation_files = ParameterFileCollection(std_deviation_path, STANDARD_DEVIATION_FILE_NAME)
+        self._standard_deviation_files = ParameterFileCollection(std_deviation_path, STANDARD_DEVIATION_FILE_NAME,
+            replace_zeros=True)
+        if CLIMATOLOGY_CACHE_SIZE in properties[CORRELATION_FUNCTIONS]:
+            climatology_cache.resize(properties[CORRELATION_FUNCTIONS][CLIMATOLOGY_CACHE_SIZE])
+        if USE_STANDARDIZED_REPOSITORIES in properties[CORRELATION_FUNCTIONS]:
+            self._use_standardized_repositories = properties[CORRELATION_FUNCTIONS][USE_STANDARDIZED_REPOSITORIES]
+
+    @property
+    def uses_standardized_repositories(self) -> bool:
+        """If the data of repositories that are already standardized (see "RepositoryMetadata.is_standardized")
+        should be used as it is, skipping the subtraction of the average and the division by the standard deviation.
+        The input is always standardized
+
+        Returns:
+            bool: True if the standardization of these repositories is skipped
+        """
+        return self._use_standardized_repositories
+
+    @uses_standardized_repositories.setter
+    def uses_standardized_repositories(self, value: bool) -> None:
+        self._use_standardized_repositories = value
+
+    def _is_dataset_standardized(self, repository_metadata: RepositoryMetadata) -> bool:
+        return self._use_standardized_repositories and repository_metadata.is_standardized
 
     def _process_arrays_correctly(self,dataarray1: xarray.DataArray, 
         repository_metadata: RepositoryMetadata, variable: str, 
@@ -169,22 +663,92 @@ class EnhancedPcc(CorrelationFunction):
             average1 = self._average_files.get_array(ts1.month, ts1.day, ts1.hour).sel(selection_params).sel(variable=variable)
             std_dev_1 = self._standard_deviation_files.get_array(ts1.month, ts1.day, ts1.hour).sel(selection_params).sel(variable=variable)
 
-        #this operation is necessary to avoid division by zero
-        std_dev_1 = std_dev_1.where(std_dev_1.values != 0).fillna(10**(-10))
+        #the zeros of the standard deviation were already replaced when the file was loaded
         return (dataarray1 - average1)/std_dev_1
 
     def calculate(self, dataarray1: xarray.DataArray, dataarray2: xarray.DataArray, repository_metadata: RepositoryMetadata, variable: str) -> float:
-        dataarray1 = self._process_arrays_correctly(dataarray1,repository_metadata,variable)
+        #the first array is the one from the dataset
+        if not self._is_dataset_standardized(repository_metadata):
+            dataarray1 = self._process_arrays_correctly(dataarray1,repository_metadata,variable)
         dataarray2 = self._process_arrays_correctly(dataarray2,repository_metadata,variable)
 
         return xarray.corr(dataarray1,dataarray2).data.item()
 
+    def prepare_input(self, input_array: xarray.DataArray, repository_metadata: RepositoryMetadata, 
+        variable: str) -> PreparedInput:
+        processed_array: xarray.DataArray = self._process_arrays_correctly(input_array, repository_metadata, variable)
+        #the parameter files may have extra dimensions with a single value (like the step)
+        processed_array = processed_array.squeeze(
+            [dim for dim in processed_array.dims if not dim in input_array.dims], drop=True)
+        return _prepare_centred_input(processed_array)
+
+    def calculate_prepared(self, dataarray: xarray.DataArray, prepared_input: PreparedInput, 
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None) -> float:
+        if not self._is_dataset_standardized(repository_metadata):
+            dataarray = self._process_arrays_correctly(dataarray, repository_metadata, variable)
+        res: Optional[float] = _prepared_pcc(dataarray, prepared_input)
+        if res is None:
+            return xarray.corr(dataarray, prepared_input.array).data.item()
+        return res
+
+    def _process_block_correctly(self, block: xarray.DataArray, 
+        repository_metadata: RepositoryMetadata, variable: str) -> xarray.DataArray:
+        """Treats every time instance of the block with its respective parameters
+
+        Args:
+            block (xarray.DataArray): block with the time instances in the first dimension
+            repository_metadata (RepositoryMetadata): origin repository metadata
+            variable (str): used variable
+
+        Returns:
+            xarray.DataArray: block processed
+        """
+        time_dim: Hashable = block.dims[0]
+        grid_dims: Tuple[Hashable, ...] = block.dims[1:]
+        rows: List[npt.NDArray] = []
+        for i in range(block.sizes[time_dim]):
+            row: xarray.DataArray = \
+                self._process_arrays_correctly(block.isel({time_dim: i}), repository_metadata, variable)
+            #the parameter files may have extra dimensions with a single value (like the step)
+            row = row.squeeze([dim for dim in row.dims if not dim in grid_dims], drop=True)
+            rows.append(row.transpose(*grid_dims).values)
+        return block.copy(data=np.stack(rows))
+
+    @property
+    def supports_batch(self) -> bool:
+        return True
+
+    def calculate_batch(self, dataset_block: xarray.DataArray, input_block: xarray.DataArray,
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None, 
+        prepared_inputs: Optional[List[PreparedInput]] = None) -> npt.NDArray[np.float64]:
+        input_values: Optional[npt.NDArray[np.float64]] = None
+        if not prepared_inputs is None and len(prepared_inputs) == input_block.shape[0]:
+            input_values = _prepared_inputs_to_matrix(prepared_inputs, dataset_block.dims[1:])
+        if input_values is None:
+            input_values = _block_to_matrix(self._process_block_correctly(input_block, repository_metadata, variable),
+                dataset_block.dims)
+
+        if not self._is_dataset_standardized(repository_metadata):
+            #the statistics of the dataset can not be used, since the values are only standardized now
+            dataset_block = self._process_block_correctly(dataset_block, repository_metadata, variable)
+            dataset_statistics = None
+
+        dataset_values: npt.NDArray[np.float64] = _block_to_matrix(dataset_block, dataset_block.dims)
+        columns: Optional[Union[slice, npt.NDArray[np.int64]]] = None if dataset_statistics is None else \
+            _valid_columns(dataset_statistics, dataset_values, input_values)
+        if not dataset_statistics is None and not columns is None:
+            return _pcc_matrix_with_statistics(dataset_values[:, columns], input_values[:, columns], dataset_statistics)
+        return _pcc_matrix(dataset_values, input_values)
+
     def calculate_partial_value(self, input_array: xarray.DataArray, dataset_array: xarray.DataArray, 
         input_stats: CorrelationStatistics, dataset_stats: CorrelationStatistics, 
         selection_params: Dict[str,Any], repo_metadata: RepositoryMetadata, var: str) -> Tuple[float, float]:
         #TODO: put image explaining what is going on here
         input_array = self._process_arrays_correctly(input_array,repo_metadata,var,selection_params)
-        dataset_array = self._process_arrays_correctly(dataset_array,repo_metadata,var,selection_params)
+        if not self._is_dataset_standardized(repo_metadata):
+            dataset_array = self._process_arrays_correctly(dataset_array,repo_metadata,var,selection_params)
         input_values: Dict[str, Any] = input_stats.get_values()
         array_values: Dict[str, Any] = dataset_stats.get_values()
 
@@ -202,53 +766,17 @@ class EnhancedPcc(CorrelationFunction):
         bottom_sum_dataset: float = \
             ((dataset_array - array_values[EnhancedPcc._MEAN])**2).sum().values.item()
 
+        #second step: bound the missing portion with the norms of the full fields
+        if EnhancedPcc._SQUARED_NORM in input_values and EnhancedPcc._SQUARED_NORM in array_values:
+            bounds: Optional[Tuple[float, float]] = _cauchy_schwarz_partial_bounds(top_sum, bottom_sum_input, 
+                bottom_sum_dataset, input_values[EnhancedPcc._SQUARED_NORM], array_values[EnhancedPcc._SQUARED_NORM])
+            if not bounds is None:
+                return bounds
 
-        #second step: calculate partial values
         full_count: int = array_values[EnhancedPcc._COUNT]
         partial_count: int = dataset_array.count().values.item()
-        missing_count: int = full_count - partial_count
-
-        #top component
-        top_sum_missing_best: float = \
-            (((1 - input_values[EnhancedPcc._MEAN]) * 
-            (1 - array_values[EnhancedPcc._MEAN])) * missing_count)
-        top_sum_missing_worst: float = \
-            (((-1 - input_values[EnhancedPcc._MEAN]) * 
-            (-1 - array_values[EnhancedPcc._MEAN])) * missing_count)
-
-
-        #bottom component, input array        
-        bottom_sum_input_best: float = \
-            ((1 - input_values[EnhancedPcc._MEAN])**2) * missing_count  
-        bottom_sum_input_worst: float = \
-            ((-1 - input_values[EnhancedPcc._MEAN])**2) * missing_count
-
-
-        #bottom component, dataset array
-        bottom_sum_dataset_best: float = \
-            ((1 - array_values[EnhancedPcc._MEAN])**2) * missing_count
-        bottom_sum_dataset_worst: float = \
-            ((-1 - array_values[EnhancedPcc._MEAN])**2) * missing_count
-
-
-        #final step: calculate the best and worst values
-        best_value: float = \
-            (top_sum + top_sum_missing_best) /\
-            (
-                ((bottom_sum_input + bottom_sum_input_best)*
-                (bottom_sum_dataset + bottom_sum_dataset_best))**(1/2)
-            )
-        worst_value: float = \
-            (top_sum + top_sum_missing_worst) /\
-            (
-                ((bottom_sum_input + bottom_sum_input_worst)*
-                (bottom_sum_dataset + bottom_sum_dataset_worst))**(1/2)
-            )
-        
-        if best_value < worst_value:
-            best_value, worst_value = worst_value, best_value
-
-        return (best_value,worst_value)
+        return _unit_partial_bounds(top_sum, bottom_sum_input, bottom_sum_dataset, input_values[EnhancedPcc._MEAN],
+            array_values[EnhancedPcc._MEAN], full_count - partial_count)
 
     def is_reverse_order(self) -> bool:
         return True
@@ -258,13 +786,24 @@ class EnhancedPcc(CorrelationFunction):
 
     def setup_stats(self, dataarray: xarray.DataArray,repository_metadata: 
         RepositoryMetadata, variable: str) -> CorrelationStatistics:
-        dataarray = self._process_arrays_correctly(dataarray, repository_metadata, variable)
+        if not self._is_dataset_standardized(repository_metadata):
+            dataarray = self._process_arrays_correctly(dataarray, repository_metadata, variable)
+        return self._standardized_stats(dataarray)
+
+    def setup_input_stats(self, input_array: xarray.DataArray, repository_metadata: RepositoryMetadata,
+        variable: str) -> CorrelationStatistics:
+        #the input is never standardized, even when the repository is
+        return self._standardized_stats(self._process_arrays_correctly(input_array, repository_metadata, variable))
+
+    def _standardized_stats(self, dataarray: xarray.DataArray) -> CorrelationStatistics:
         mean_val: float = dataarray.mean().values.item()
         count: int = dataarray.count().values.item()
+        squared_norm: float = ((dataarray - mean_val)**2).sum().values.item()
 
         dict: Dict[str,Any] = {}
         dict[EnhancedPcc._MEAN] = mean_val
         dict[EnhancedPcc._COUNT] = count
+        dict[EnhancedPcc._SQUARED_NORM] = squared_norm
         
         return CorrelationStatistics(dict)
 
@@ -279,12 +818,123 @@ class Rmsd(CorrelationFunction):
 
     def calculate(self, dataarray1: xarray.DataArray, dataarray2: xarray.DataArray, 
         repository_metadata: RepositoryMetadata, variable: str) -> float:
+        dense_values: Optional[Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]] = \
+            _dense_values(dataarray1, dataarray2)
+        if not dense_values is None:
+            return math.sqrt(_squared_distance(*dense_values) / len(dense_values[0]))
+
         aux_datarray: xarray.DataArray = dataarray1 - dataarray2
         aux_datarray = aux_datarray**2
         sum_value: float = aux_datarray.sum().values.item()
         div_value: float = sum_value / dataarray1.count().values.item()
         return math.sqrt(div_value)
 
+    def prepare_input(self, input_array: xarray.DataArray, repository_metadata: RepositoryMetadata, 
+        variable: str) -> PreparedInput:
+        values: npt.NDArray[np.float64] = np.asarray(input_array.values, dtype=np.float64).ravel()
+        if np.isnan(values).any():
+            return PreparedInput(input_array)
+        return PreparedInput(input_array, {
+            FLAT_VALUES: values,
+            SQUARED_NORM: float(np.dot(values, values))
+        })
+
+    def calculate_prepared(self, dataarray: xarray.DataArray, prepared_input: PreparedInput, 
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None) -> float:
+        prepared_values: Dict[str, Any] = prepared_input.get_values()
+        if SQUARED_NORM in prepared_values:
+            dataset_values: Optional[npt.NDArray[np.float64]] = _values_matching_input(dataarray, prepared_input.array)
+            if not dataset_values is None:
+                dataset_squared_norm: Optional[float] = None
+                #a complete field in the statistics means that there are no missing values
+                mask: Optional[FieldMask] = None if dataset_statistics is None else dataset_statistics.mask
+                if not dataset_statistics is None and len(dataset_statistics.count) == 1 and \
+                    dataset_statistics.count[0] == len(dataset_values):
+                    dataset_squared_norm = float(dataset_statistics.sum_squares[0])
+                elif not dataset_statistics is None and not mask is None and len(dataset_statistics.count) == 1 and \
+                    len(mask) == len(dataset_values) and dataset_statistics.count[0] == mask.valid_count:
+                    #only the valid positions of the mask are compared (the input has values in all of them)
+                    return math.sqrt(_squared_distance(dataset_values[mask.columns], 
+                        prepared_values[FLAT_VALUES][mask.columns], float(dataset_statistics.sum_squares[0])) / 
+                        mask.valid_count)
+                elif np.isnan(dataset_values).any():
+                    return self.calculate(dataarray, prepared_input.array, repository_metadata, variable)
+                return math.sqrt(_squared_distance(dataset_values, prepared_values[FLAT_VALUES], 
+                    dataset_squared_norm, prepared_values[SQUARED_NORM]) / len(dataset_values))
+        return self.calculate(dataarray, prepared_input.array, repository_metadata, variable)
+
+    @property
+    def supports_batch(self) -> bool:
+        return True
+
+    def calculate_batch(self, dataset_block: xarray.DataArray, input_block: xarray.DataArray,
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None, 
+        prepared_inputs: Optional[List[PreparedInput]] = None) -> npt.NDArray[np.float64]:
+        dataset_values: npt.NDArray[np.float64] = _block_to_matrix(dataset_block, dataset_block.dims)
+        input_values: npt.NDArray[np.float64] = _block_to_matrix(input_block, dataset_block.dims)
+        #the expansion of the squared norms requires double precision, since the norms are much
+        # larger than the distance in the fields with a large mean (like the geopotential)
+        columns: Optional[Union[slice, npt.NDArray[np.int64]]] = None
+        if not dataset_statistics is None and not compute_precision.is_single_precision:
+            columns = _valid_columns(dataset_statistics, dataset_values, input_values)
+        if not dataset_statistics is None and not columns is None:
+            input_squares: Optional[npt.NDArray[np.float64]] = None
+            #the prepared norms are of the full grid
+            if isinstance(columns, slice) and not prepared_inputs is None and \
+                len(prepared_inputs) == input_values.shape[0] and \
+                all(SQUARED_NORM in prepared_input.get_values() for prepared_input in prepared_inputs):
+                input_squares = np.array([prepared_input.get_values()[SQUARED_NORM] 
+                    for prepared_input in prepared_inputs])
+            return _rmsd_matrix_with_statistics(dataset_values[:, columns], input_values[:, columns], 
+                dataset_statistics, input_squares)
+        return _rmsd_matrix(dataset_values, input_values)
+
+    @property
+    def required_moments(self) -> Optional[FrozenSet[str]]:
+        return frozenset([DATASET_COUNT, SUM_SQUARES_DATASET, SUM_SQUARES_INPUT, SUM_PRODUCTS])
+
+    def calculate_from_moments(self, moments: Moments) -> npt.NDArray[np.float64]:
+        #the sum is divided by the number of values in the dataset field (same behaviour as "_rmsd_matrix")
+        distance: npt.NDArray[np.float64] = \
+            moments[SUM_SQUARES_DATASET] + moments[SUM_SQUARES_INPUT] - 2 * moments[SUM_PRODUCTS]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(np.maximum(distance, 0.0) / moments[DATASET_COUNT])
+
+    @property
+    def supports_early_abandon(self) -> bool:
+        return True
+
+    def calculate_batch_early_abandon(self, dataset_block: xarray.DataArray, input_block: xarray.DataArray,
+        repository_metadata: RepositoryMetadata, variable: str, 
+        abandoned_cells: Callable[[npt.NDArray[np.float64]], npt.NDArray[np.bool_]],
+        block_size: int) -> Optional[npt.NDArray[np.float64]]:
+        dataset_values: npt.NDArray[np.float64] = _block_to_matrix(dataset_block, dataset_block.dims)
+        input_values: npt.NDArray[np.float64] = _block_to_matrix(input_block, dataset_block.dims)
+        #the bound requires the number of values of the full field to be known in advance
+        if np.isnan(dataset_values).any() or np.isnan(input_values).any():
+            return None
+
+        total_count: int = dataset_values.shape[1]
+        partial_sums: npt.NDArray[np.float64] = np.zeros((dataset_values.shape[0], input_values.shape[0]))
+        abandoned: npt.NDArray[np.bool_] = abandoned_cells(np.zeros_like(partial_sums))
+
+        for start in range(0, total_count, block_size):
+            active_rows: npt.NDArray[np.int64] = np.flatnonzero(~abandoned.all(axis=1))
+            if len(active_rows) == 0:
+                break
+            end: int = start + block_size
+            #the expansion of the squared norms cancels out in the partial sums of the fields with a large
+            # mean (a partial sum is much smaller than the norms), so the differences are summed directly
+            partial_sums[active_rows] += _direct_squared_distance_matrix(dataset_values[active_rows, start:end], 
+                input_values[:, start:end])
+            abandoned = abandoned_cells(_rmsd_lower_bound(partial_sums, total_count))
+
+        res: npt.NDArray[np.float64] = _rmsd_lower_bound(partial_sums, total_count)
+        res[abandoned] = np.nan
+        return res
+
     def is_reverse_order(self) -> bool:
         return False
 
@@ -314,13 +964,17 @@ class Rmsd(CorrelationFunction):
         input_stats_dict: Dict[str,Any] = input_stats.get_values()
         total_count: int = stats_dict[Rmsd._COUNT]
 
-        aux_dataarray: xarray.DataArray = input_array-dataset_array
-        aux_dataarray = aux_dataarray**2
-        common_value = aux_dataarray.sum().values.item()
+        dense_values: Optional[Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]] = \
+            _dense_values(dataset_array, input_array)
+        if not dense_values is None:
+            common_value = _squared_distance(*dense_values)
+        else:
+            aux_dataarray: xarray.DataArray = input_array-dataset_array
+            aux_dataarray = aux_dataarray**2
+            common_value = aux_dataarray.sum().values.item()
+        min_value = float(_rmsd_lower_bound(common_value, total_count))
         common_value = common_value/total_count
 
-        min_value = math.sqrt(common_value)
-
         max_combination: float = abs(input_stats_dict[Rmsd._MAX] - stats_dict[Rmsd._MAX])
         max_combination = max(max_combination, abs(input_stats_dict[Rmsd._MAX] - stats_dict[Rmsd._MIN]))
         max_combination = max(max_combination, abs(input_stats_dict[Rmsd._MIN] - stats_dict[Rmsd._MAX]))
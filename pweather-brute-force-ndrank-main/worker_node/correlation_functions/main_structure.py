@@ -1,8 +1,12 @@
-from typing import Any, Dict, Tuple, Optional
+from typing import Any, Callable, Dict, FrozenSet, List, Set, Tuple, Optional
 import numpy as np
+import numpy.typing as npt
 import xarray
 
 from correlation_functions.correlation_statistics import CorrelationStatistics
+from correlation_functions.moments import Moments, calculate_moments
+from correlation_functions.prepared_input import PreparedInput
+from repository.auxiliary_structures.field_statistics import FieldStatistics
 from repository.repository_layer import RepositoryMetadata
 
 """The system allows the usage of different correlation functions.
@@ -12,6 +16,30 @@ Some Correlation functions may require collecting some statistics from the
 available data. That is the reason why the "setup_stats" is available. This 
 was created as some correlation functions may require some data processing 
 before any search to allow the creation of the candidates.
+
+Correlation functions can also support the calculation of the similarity values
+for a full block of time instances at once ("calculate_batch"). The services
+check the "supports_batch" property and, when available, compare every step of
+a dataset file against every input instance with a single call, instead of
+calling "calculate" once per pair. When the repository has the precomputed
+statistics of its fields (see "field_statistics"), these are also provided, so
+that only the cross term between the dataset and the input has to be calculated.
+
+The input is the same for the whole request, therefore any processing that only 
+depends on the input is done once per request with "prepare_input" (called by the
+"InputIterator"). The resulting "PreparedInput" is then used by "calculate_prepared"
+and "calculate_batch".
+
+When only the best results are wanted, functions whose value can be bounded while
+it is being calculated (like the RMSD, that only grows as more points are summed)
+also support "calculate_batch_early_abandon", which stops the calculation of the 
+comparisons that can no longer be part of the best results.
+
+Functions that only depend on the sums of the values, of their squares and of their
+products declare which of them they need ("required_moments"). When several of these
+functions are calculated for the same blocks ("calculate_batch_metrics"), the fields
+are only read once (see "moments"). The moments that only depend on the fields of the
+dataset are also stored, once for all of these functions, by the statistics collection.
 """
 
 class CorrelationFunction:
@@ -60,6 +88,128 @@ class CorrelationFunction:
         """
         raise NotImplementedError("Method must be overriden")
 
+    def prepare_input(self, input_array: xarray.DataArray, repository_metadata: RepositoryMetadata, 
+        variable: str) -> PreparedInput:
+        """Prepares a time instance of the input to be compared with the dataset. Called 
+        once per request
+
+        Args:
+            input_array (xarray.DataArray): time instance of the input
+            repository_metadata (RepositoryMetadata): metadata of repository
+            variable (str): used variable in the data variables
+
+        Returns:
+            PreparedInput: prepared input
+        """
+        return PreparedInput(input_array)
+
+    def calculate_prepared(self, dataarray: xarray.DataArray, prepared_input: PreparedInput,
+        repository_metadata: RepositoryMetadata, variable: str, 
+        dataset_statistics: Optional[FieldStatistics] = None) -> float:
+        """Calculates the similarity value between an array of the dataset and an input
+        previously prepared with "prepare_input"
+
+        Args:
+            dataarray (xarray.DataArray): array from the dataset
+            prepared_input (PreparedInput): input returned by "prepare_input"
+            repository_metadata (RepositoryMetadata): metadata of repository
+            variable (str): used variable in the data variables
+            dataset_statistics (Optional[FieldStatistics]): precomputed statistics of the 
+            array from the dataset (a single time instance), if available. Defaults to None.
+
+        Returns:
+            float: similarity value
+        """
+        return self.calculate(dataarray, prepared_input.array, repository_metadata, variable)
+
+    @property
+    def supports_batch(self) -> bool:
+        """If the correlation function implements the "calculate_batch" method
+
+        Returns:
+            bool: true if "calculate_batch" can be used
+        """
+        return False
+
+    def calculate_batch(self, dataset_block: xarray.DataArray, input_block: xarray.DataArray,
+        repository_metadata: RepositoryMetadata, variable: str,
+        dataset_statistics: Optional[FieldStatistics] = None, 
+        prepared_inputs: Optional[List[PreparedInput]] = None) -> npt.NDArray[np.float64]:
+        """Calculates the similarity value between every time instance of the dataset block
+        and every time instance of the input block.
+
+        Both blocks have the time variation dimension as the first dimension (one row per time 
+        instance) and the same remaining dimensions. The date of each row is given by the sum 
+        of the time initial and time variation coordinates.
+
+        Args:
+            dataset_block (xarray.DataArray): S time instances from the dataset
+            input_block (xarray.DataArray): T time instances from the input
+            repository_metadata (RepositoryMetadata): metadata of repository
+            variable (str): used variable in the data variables
+            dataset_statistics (Optional[FieldStatistics]): precomputed statistics of each row 
+            of the dataset block, if available
+            prepared_inputs (Optional[List[PreparedInput]]): rows of the input block returned 
+            by "prepare_input", in the same order, if available
+
+        Returns:
+            npt.NDArray[np.float64]: matrix with shape (S, T) with the similarity values
+        """
+        raise NotImplementedError("Method must be overriden")
+
+    @property
+    def supports_early_abandon(self) -> bool:
+        """If the correlation function implements the "calculate_batch_early_abandon" method
+
+        Returns:
+            bool: true if "calculate_batch_early_abandon" can be used
+        """
+        return False
+
+    def calculate_batch_early_abandon(self, dataset_block: xarray.DataArray, input_block: xarray.DataArray,
+        repository_metadata: RepositoryMetadata, variable: str, 
+        abandoned_cells: Callable[[npt.NDArray[np.float64]], npt.NDArray[np.bool_]],
+        block_size: int) -> Optional[npt.NDArray[np.float64]]:
+        """Calculates the same matrix as "calculate_batch", but the grid is processed in blocks
+        of points. After each block, "abandoned_cells" receives a bound of every value of the
+        matrix (no value can end up better than its bound) and returns the cells whose calculation 
+        can stop. The rows where every cell was abandoned are no longer calculated.
+
+        Args:
+            dataset_block (xarray.DataArray): S time instances from the dataset
+            input_block (xarray.DataArray): T time instances from the input
+            repository_metadata (RepositoryMetadata): metadata of repository
+            variable (str): used variable in the data variables
+            abandoned_cells (Callable[[npt.NDArray[np.float64]], npt.NDArray[np.bool_]]): receives the
+            bounds (S, T) and returns the cells (S, T) that were abandoned
+            block_size (int): number of grid points of each block
+
+        Returns:
+            Optional[npt.NDArray[np.float64]]: matrix with shape (S, T), with NaN in the abandoned cells,
+        or None if the blocks can not be processed this way (in which case "calculate_batch" should be used)
+        """
+        raise NotImplementedError("Method must be overriden")
+
+    @property
+    def required_moments(self) -> Optional[FrozenSet[str]]:
+        """Moments (see "moments") from which the similarity values can be derived
+
+        Returns:
+            Optional[FrozenSet[str]]: names of the moments or None if "calculate_from_moments" is not available
+        """
+        return None
+
+    def calculate_from_moments(self, moments: Moments) -> npt.NDArray[np.float64]:
+        """Calculates the similarity values from the moments of every pair of time instances
+
+        Args:
+            moments (Moments): moments with shape (S, T), with at least the "required_moments"
+
+        Returns:
+            npt.NDArray[np.float64]: matrix with shape (S, T)
+        """
+        raise NotImplementedError("Method must be overriden")
+
     def is_reverse_order(self) -> bool:
         """If values should be ordered in a non growing order
 
@@ -92,6 +242,19 @@ class CorrelationFunction:
         """
         raise NotImplementedError("Method must be overriden")
 
+    def setup_input_stats(self, input_array: xarray.DataArray, repository_metadata: RepositoryMetadata,
+        variable: str) -> CorrelationStatistics:
+        """Gathers required statistics from a time instance of the input, which is compared 
+        with the arrays of the given repository. By default, the same as "setup_stats"
+
+        Args:
+            input_array (xarray.DataArray): time instance of the input
+            repository_metadata (RepositoryMetadata): metadata of the used repository
+            variable (str): name of the data variable being analysed
+
+        """
+        return self.setup_stats(input_array, repository_metadata, variable)
+
     def calculate_partial_value(self,input_array: xarray.DataArray, dataset_array: xarray.DataArray, 
         input_stats: CorrelationStatistics, dataset_stats: CorrelationStatistics,
         selection_params: Dict[str, Any], repository_metadata: RepositoryMetadata, 
@@ -114,3 +277,35 @@ class CorrelationFunction:
             result and the second as the worst possible result
         """
         raise NotImplementedError("Method must be overriden")
+
+
+def calculate_batch_metrics(corr_functions: List[CorrelationFunction], dataset_block: xarray.DataArray,
+    input_block: xarray.DataArray) -> Dict[str, npt.NDArray[np.float64]]:
+    """Calculates the similarity values of several correlation functions between every time instance
+    of both blocks, reading the blocks only once (the moments needed by all functions are calculated together)
+
+    Args:
+        corr_functions (List[CorrelationFunction]): functions, all with "required_moments"
+        dataset_block (xarray.DataArray): S time instances from the dataset (time in the first dimension)
+        input_block (xarray.DataArray): T time instances from the input (same dimensions as the dataset block)
+
+    Raises:
+        ValueError: if one of the functions can not be derived from moments
+
+    Returns:
+        Dict[str, npt.NDArray[np.float64]]: matrix (S, T) by name of the correlation function
+    """
+    required_moments: Set[str] = set()
+    for corr_function in corr_functions:
+        function_moments: Optional[FrozenSet[str]] = corr_function.required_moments
+        if function_moments is None:
+            raise ValueError("Correlation function " + corr_function.corr_func_name + 
+                " can not be calculated from moments")
+        required_moments |= function_moments
+
+    dataset_values: npt.NDArray = dataset_block.values.reshape(dataset_block.shape[0], -1)
+    input_values: npt.NDArray = input_block.transpose(*dataset_block.dims).values
+    moments: Moments = calculate_moments(dataset_values, input_values.reshape(input_values.shape[0], -1), 
+        required_moments)
+    return {corr_function.corr_func_name: corr_function.calculate_from_moments(moments) 
+        for corr_function in corr_functions}
@@ -0,0 +1,129 @@
+from typing import Dict, Final, FrozenSet, Iterable
+import numpy as np
+import numpy.typing as npt
+
+"""Both the PCC and the RMSD are simple functions of the sums of the values, of their
+squares and of their products, together with the number of values. When more than one
+function has to be calculated for the same block of fields, these moments are calculated
+once for every pair of (dataset time instance, input time instance) and every function
+derives its values from them ("CorrelationFunction.calculate_from_moments").
+
+Only the positions where both fields have values are part of the moments (like xarray.corr).
+The moments are of the values shifted by a common constant (the mean of the input), which
+does not change the functions that only depend on differences, but avoids the cancellation
+between the moments of fields with a large mean (like the geopotential).
+"""
+
+COUNT: Final = "count"                         #positions where both fields have values
+DATASET_COUNT: Final = "dataset_count"         #positions where the dataset field has values
+SUM_DATASET: Final = "sum_dataset"
+SUM_INPUT: Final = "sum_input"
+SUM_SQUARES_DATASET: Final = "sum_squares_dataset"
+SUM_SQUARES_INPUT: Final = "sum_squares_input"
+SUM_PRODUCTS: Final = "sum_products"
+MOMENTS: Final[FrozenSet[str]] = frozenset([COUNT, DATASET_COUNT, SUM_DATASET, SUM_INPUT,
+    SUM_SQUARES_DATASET, SUM_SQUARES_INPUT, SUM_PRODUCTS])
+#moments that only depend on the field of the dataset
+DATASET_MOMENTS: Final[FrozenSet[str]] = frozenset([DATASET_COUNT, SUM_DATASET, SUM_SQUARES_DATASET])
+
+class Moments:
+    """Moments of every pair of fields, each one a matrix with shape (S, T)
+    """
+    def __init__(self, values: Dict[str, npt.NDArray[np.float64]]) -> None:
+        self._values: Dict[str, npt.NDArray[np.float64]] = values
+
+    def __getitem__(self, name: str) -> npt.NDArray[np.float64]:
+        if not name in self._values:
+            raise ValueError("Moment " + name + " was not calculated")
+        return self._values[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._values
+
+
+def calculate_moments(dataset_values: npt.NDArray[np.float64], input_values: npt.NDArray[np.float64],
+    required_moments: Iterable[str]) -> Moments:
+    """Calculates the required moments between every row of both matrices. The sums are
+    always calculated in double precision, since the functions are differences between them
+
+    Args:
+        dataset_values (npt.NDArray[np.float64]): matrix with shape (S, G)
+        input_values (npt.NDArray[np.float64]): matrix with shape (T, G)
+        required_moments (Iterable[str]): names of the moments to be calculated
+
+    Raises:
+        ValueError: if one of the moments does not exist
+
+    Returns:
+        Moments: moments with shape (S, T)
+    """
+    required: FrozenSet[str] = frozenset(required_moments)
+    if not required <= MOMENTS:
+        raise ValueError("Invalid moments " + ", ".join(sorted(required - MOMENTS)) + ". Available: " +
+            ", ".join(sorted(MOMENTS)))
+    shape = (dataset_values.shape[0], input_values.shape[0])
+    dataset_valid: npt.NDArray[np.bool_] = ~np.isnan(dataset_values)
+    input_valid: npt.NDArray[np.bool_] = ~np.isnan(input_values)
+    shift: float = float(input_values[input_valid].mean()) if input_valid.any() else 0.0
+    dataset_part: npt.NDArray[np.float64] = np.where(dataset_valid, dataset_values.astype(np.float64) - shift, 0.0)
+    input_part: npt.NDArray[np.float64] = np.where(input_valid, input_values.astype(np.float64) - shift, 0.0)
+    dense: bool = bool(dataset_valid.all() and input_valid.all())
+
+    def dataset_sum(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        #sum of each dataset row over the positions where the input row has values
+        if dense:
+            return np.broadcast_to(values.sum(axis=1)[:, None], shape)
+        return values @ input_valid.T.astype(np.float64)
+
+    def input_sum(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        if dense:
+            return np.broadcast_to(values.sum(axis=1)[None, :], shape)
+        return dataset_valid.astype(np.float64) @ values.T
+
+    res: Dict[str, npt.NDArray[np.float64]] = {}
+    if COUNT in required:
+        res[COUNT] = np.full(shape, float(dataset_values.shape[1])) if dense else \
+            dataset_valid.astype(np.float64) @ input_valid.T.astype(np.float64)
+    if DATASET_COUNT in required:
+        res[DATASET_COUNT] = np.broadcast_to(dataset_valid.sum(axis=1).astype(np.float64)[:, None], shape)
+    if SUM_DATASET in required:
+        res[SUM_DATASET] = dataset_sum(dataset_part)
+    if SUM_INPUT in required:
+        res[SUM_INPUT] = input_sum(input_part)
+    if SUM_SQUARES_DATASET in required:
+        res[SUM_SQUARES_DATASET] = dataset_sum(dataset_part**2)
+    if SUM_SQUARES_INPUT in required:
+        res[SUM_SQUARES_INPUT] = input_sum(input_part**2)
+    if SUM_PRODUCTS in required:
+        res[SUM_PRODUCTS] = dataset_part @ input_part.T
+    return Moments(res)
+
+
+def calculate_field_moments(values: npt.NDArray[np.float64], required_moments: Iterable[str]) -> Dict[str, float]:
+    """Calculates the required moments of a field of the dataset that do not depend on the input
+    (see "DATASET_MOMENTS"), over the positions where the field has values
+
+    Args:
+        values (npt.NDArray[np.float64]): values of the field
+        required_moments (Iterable[str]): names of the moments to be calculated
+
+    Raises:
+        ValueError: if one of the moments depends on the input or does not exist
+
+    Returns:
+        Dict[str, float]: value of each moment
+    """
+    required: FrozenSet[str] = frozenset(required_moments)
+    if not required <= DATASET_MOMENTS:
+        raise ValueError("Invalid field moments " + ", ".join(sorted(required - DATASET_MOMENTS)) + 
+            ". Available: " + ", ".join(sorted(DATASET_MOMENTS)))
+    valid_values: npt.NDArray[np.float64] = np.asarray(values, dtype=np.float64).ravel()
+    valid_values = valid_values[~np.isnan(valid_values)]
+    res: Dict[str, float] = {}
+    if DATASET_COUNT in required:
+        res[DATASET_COUNT] = float(len(valid_values))
+    if SUM_DATASET in required:
+        res[SUM_DATASET] = float(valid_values.sum())
+    if SUM_SQUARES_DATASET in required:
+        res[SUM_SQUARES_DATASET] = float((valid_values**2).sum())
+    return res
@@ -0,0 +1,27 @@
+from typing import Any, Dict, Optional
+import xarray
+
+class PreparedInput:
+    """Single time instance of the input after being prepared by a correlation
+    function ("CorrelationFunction.prepare_input"). It is created once per request,
+    so that the work that only depends on the input is not repeated for every
+    comparison with the dataset
+    """
+    def __init__(self, array: xarray.DataArray, values: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Args:
+            array (xarray.DataArray): input array as used by the correlation function
+            values (Optional[Dict[str, Any]]): other values derived from the array (like its norm)
+        """
+        self._array: xarray.DataArray = array
+        self._values: Dict[str, Any] = {} if values is None else values
+
+    @property
+    def array(self) -> xarray.DataArray:
+        return self._array
+
+    def get_values(self) -> Dict[str, Any]:
+        return self._values
+
+    def __str__(self) -> str:
+        return str(self._values)
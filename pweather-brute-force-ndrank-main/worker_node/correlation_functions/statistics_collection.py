@@ -1,13 +1,67 @@
 import logging
-from typing import Dict, List, Tuple
+import os
+from typing import Any, Dict, Final, FrozenSet, List, Optional, Tuple
 
 import numpy as np
+import numpy.typing as npt
 import xarray
 from auxiliar.component_injector import component_injector
 from correlation_functions.main_structure import CorrelationFunction
 from correlation_functions.correlation_statistics import CorrelationStatistics
+from correlation_functions.moments import DATASET_MOMENTS, calculate_field_moments
 from repository.repository_layer import RepositoryMetadata
 
+"""The statistics of every time instance of the dataset are stored in columns, with
+one array per (correlation function, data variable, statistic), where the position of
+a timestamp is its offset (in steps) from the first timestamp. The collection can be
+saved to a folder with one ".npy" file per column and loaded again with the files
+memory mapped, so that a worker does not need to calculate the statistics again:
+
+    <folder>/dates.npy
+    <folder>/<correlation function>/<data variable>/<statistic>.npy
+"""
+
+DATES_FILE: Final = "dates.npy"
+PRESENT_FILE: Final = "_present.npy" #marks which timestamps have statistics
+NPY_EXTENSION: Final = ".npy"
+INITIAL_CAPACITY: Final = 1024
+
+class _StatisticsColumns:
+    """Columns of the statistics of a single correlation function and data variable
+    """
+    def __init__(self, capacity: int) -> None:
+        self.present: npt.NDArray[np.bool_] = np.zeros(capacity, dtype=np.bool_)
+        self.columns: Dict[str, npt.NDArray] = {}
+
+    def insert(self, index: int, values: Dict[str, Any]) -> None:
+        #the memory mapped columns are read only
+        if not self.present.flags.writeable:
+            self.present = np.array(self.present)
+            self.columns = {name: np.array(self.columns[name]) for name in self.columns}
+        for name in values:
+            if not name in self.columns:
+                self.columns[name] = np.zeros(len(self.present), dtype=np.asarray(values[name]).dtype)
+            self.columns[name][index] = values[name]
+        self.present[index] = True
+
+    def resize(self, before: int, used: int, capacity: int) -> None:
+        """Adds positions to both ends of every column
+
+        Args:
+            before (int): number of positions added to the start
+            used (int): number of positions currently used
+            capacity (int): final number of positions
+        """
+        def resize_column(column: npt.NDArray) -> npt.NDArray:
+            res: npt.NDArray = np.zeros(capacity, dtype=column.dtype)
+            res[before:before + used] = column[:used]
+            return res
+        self.present = resize_column(self.present)
+        self.columns = {name: resize_column(self.columns[name]) for name in self.columns}
+
+    def get(self, index: int) -> CorrelationStatistics:
+        return CorrelationStatistics({name: self.columns[name][index].item() for name in self.columns})
+
 
 class StatisticsCollection:
     """Class responsible for storing the collected statistics from the correlation
@@ -16,42 +70,118 @@ class StatisticsCollection:
     def __init__(self) -> None:
         """Simple constructor
 
-        The container is internally represented by a group of dictionaries indexed 
-        first by the name of the correlation function, then by the data variable and 
-        only then by the timestamp it reffers to
-        
-        (correlation_function name, data_var, timestamp)
+        The container is indexed first by the name of the correlation function and the
+        data variable, then every statistic is an array indexed by the offset of the
+        timestamp it reffers to
+
+        (correlation_function name, data_var) -> statistic -> offset
         """
-        self._container: Dict[str, Dict[str,Dict[np.datetime64,CorrelationStatistics]]] = {}
+        self._container: Dict[Tuple[str, str], _StatisticsColumns] = {}
+        self._first_date: Optional[np.datetime64] = None
+        self._step: Optional[np.timedelta64] = None
+        self._size: int = 0
+        self._capacity: int = 0
 
+    def _get_index(self, datetime: np.datetime64) -> Optional[int]:
+        """Position of the timestamp in the columns
+
+        Args:
+            datetime (np.datetime64): timestamp
+
+        Returns:
+            Optional[int]: position or None if the timestamp is not in the collection
+        """
+        if self._first_date is None or self._step is None:
+            return None
+        offset: np.timedelta64 = np.datetime64(datetime, "ns") - self._first_date
+        if self._step == np.timedelta64(0, "ns"):
+            return 0 if offset == np.timedelta64(0, "ns") else None
+        index: int = int(offset // self._step)
+        if offset % self._step != np.timedelta64(0, "ns") or index < 0 or index >= self._size:
+            return None
+        return index
+
+    def _reserve_index(self, datetime: np.datetime64, step: int) -> int:
+        """Position of the timestamp in the columns, which are extended when the timestamp is outside of them
+
+        Args:
+            datetime (np.datetime64): timestamp
+            step (int): time difference between two consecutive timestamps (nanoseconds)
+
+        Raises:
+            ValueError: if the timestamp is not aligned with the already existing timestamps
+
+        Returns:
+            int: position of the timestamp
+        """
+        date: np.datetime64 = np.datetime64(datetime, "ns")
+        if self._first_date is None or self._step is None:
+            self._first_date = date
+            self._step = np.timedelta64(int(step), "ns")
+            self._resize(0, 1)
+            return 0
+        if self._step == np.timedelta64(0, "ns"):
+            #loaded from a folder with a single timestamp
+            self._step = np.timedelta64(int(step), "ns")
+        offset: np.timedelta64 = date - self._first_date
+        if offset % self._step != np.timedelta64(0, "ns"):
+            raise ValueError("Timestamp " + str(datetime) + " is not aligned with the step of the statistics")
+        index: int = int(offset // self._step)
+        if index < 0:
+            self._first_date = date
+            self._resize(-index, self._size - index)
+            return 0
+        if index >= self._size:
+            self._resize(0, index + 1)
+        return index
+
+    def _resize(self, before: int, size: int) -> None:
+        """Changes the number of positions of the columns, allocating more capacity than needed
+        so that consecutive insertions do not copy the columns every time
+
+        Args:
+            before (int): number of positions added to the start
+            size (int): final number of used positions
+        """
+        if before > 0 or size > self._capacity:
+            capacity: int = max(size, INITIAL_CAPACITY, 2 * self._capacity if before == 0 else size)
+            for columns in self._container.values():
+                columns.resize(before, self._size, capacity)
+            self._capacity = capacity
+        self._size = size
 
     def insert_statistic(self, datetime: np.datetime64, dataset:xarray.Dataset, repository_metadata: RepositoryMetadata, skip_functions: List[str]) -> None:
-        """Calculates the required statistics for all correlation functions
+        """Calculates the required statistics for all correlation functions. The moments of the field 
+        needed by the functions that are derived from moments (see "CorrelationFunction.required_moments") 
+        are calculated once for all of them and stored together with their statistics
 
         Args:
             datetime (np.datetime64): corresponding datetime
             dataarray (xarray.Dataset): dataset section to be analysed
         """
         correlation_functions: List[Tuple[str, CorrelationFunction]] = \
-            component_injector.get_all_correlation_function_instances()
-        
+            [function for function in component_injector.get_all_correlation_function_instances()
+                if not function[0] in skip_functions]
+        index: int = self._reserve_index(datetime, repository_metadata.step)
+        field_moments: Dict[str, FrozenSet[str]] = {}
         for function in correlation_functions:
-            if function[0] in skip_functions:
-                continue
-            
-            if not function[0] in self._container:
-                self._container[function[0]] = {}
-
-            corr_function_container: Dict[str,Dict[np.datetime64, CorrelationStatistics]] = \
-                self._container[function[0]]
-            for var in dataset.data_vars:
-                if not var in corr_function_container:
-                    corr_function_container[str(var)] = {}
-                
-                datarray: xarray.DataArray = dataset[var]
-                corr_function_container[str(var)][datetime] = \
-                    function[1].setup_stats(datarray,repository_metadata,str(var))
-        
+            if not function[1].required_moments is None:
+                field_moments[function[0]] = function[1].required_moments & DATASET_MOMENTS
+        required_moments: FrozenSet[str] = frozenset().union(*field_moments.values())
+
+        for var in dataset.data_vars:
+            datarray: xarray.DataArray = dataset[var]
+            moments: Dict[str, float] = {} if len(required_moments) == 0 else \
+                calculate_field_moments(datarray.values, required_moments)
+            for function in correlation_functions:
+                if not (function[0], str(var)) in self._container:
+                    self._container[(function[0], str(var))] = _StatisticsColumns(self._capacity)
+
+                values: Dict[str, Any] = function[1].setup_stats(datarray,repository_metadata,str(var)).get_values()
+                for name in field_moments.get(function[0], frozenset()):
+                    values[name] = moments[name]
+                self._container[(function[0], str(var))].insert(index, values)
+
     def get_statistics(self, correlation_function_name:str, var_name:str, datetime:np.datetime64) -> CorrelationStatistics:
         """Returns the required statistics to calculate the similarity interval
 
@@ -66,21 +196,81 @@ class StatisticsCollection:
         Returns:
             StatisticsHolder: corresponding statistics holder
         """
-        if not correlation_function_name in self._container:
+        if not any(key[0] == correlation_function_name for key in self._container):
             raise ValueError("Correlation Function " + correlation_function_name + \
                 " does not exist")
-        if not var_name in self._container[correlation_function_name]:
+        if not (correlation_function_name, var_name) in self._container:
             raise ValueError("Data variable " + var_name + " does not exist for correlation metric " + \
                 correlation_function_name)
-        if not datetime in self._container[correlation_function_name][var_name]:
+        columns: _StatisticsColumns = self._container[(correlation_function_name, var_name)]
+        index: Optional[int] = self._get_index(datetime)
+        if index is None or not columns.present[index]:
             raise ValueError("Timestamp " + str(datetime) + " does not exist for correlation metric " + \
                 correlation_function_name + " for the data variable " + var_name)
-        return self._container[correlation_function_name][var_name][datetime]
+        return columns.get(index)
+
+    def save(self, folder_path: str) -> None:
+        """Writes every column to the given folder (see the module documentation for the layout)
+
+        Args:
+            folder_path (str): folder where the statistics are written
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        dates: npt.NDArray[np.datetime64] = np.empty(0, dtype="datetime64[ns]")
+        if not self._first_date is None and not self._step is None:
+            dates = self._first_date + self._step * np.arange(self._size)
+        np.save(os.path.join(folder_path, DATES_FILE), dates)
+        for (function_name, var), columns in self._container.items():
+            columns_path: str = os.path.join(folder_path, function_name, var)
+            os.makedirs(columns_path, exist_ok=True)
+            np.save(os.path.join(columns_path, PRESENT_FILE), columns.present[:self._size])
+            for name in columns.columns:
+                np.save(os.path.join(columns_path, name + NPY_EXTENSION), columns.columns[name][:self._size])
+
+    @staticmethod
+    def load(folder_path: str) -> "StatisticsCollection":
+        """Loads the statistics written by "save". The columns are memory mapped, so only the
+        accessed positions are read from disk (inserting new timestamps copies them to memory)
+
+        Args:
+            folder_path (str): folder where the statistics were written
+
+        Raises:
+            ValueError: if the folder does not contain saved statistics
+
+        Returns:
+            StatisticsCollection: loaded statistics
+        """
+        dates_path: str = os.path.join(folder_path, DATES_FILE)
+        if not os.path.isfile(dates_path):
+            raise ValueError("Folder " + folder_path + " does not contain saved statistics")
+        res: StatisticsCollection = StatisticsCollection()
+        dates: npt.NDArray[np.datetime64] = np.load(dates_path)
+        res._size = res._capacity = len(dates)
+        if len(dates) > 0:
+            res._first_date = dates[0]
+            res._step = dates[1] - dates[0] if len(dates) > 1 else np.timedelta64(0, "ns")
+
+        for function_name in sorted(os.listdir(folder_path)):
+            function_path: str = os.path.join(folder_path, function_name)
+            if not os.path.isdir(function_path):
+                continue
+            for var in sorted(os.listdir(function_path)):
+                columns_path: str = os.path.join(function_path, var)
+                columns: _StatisticsColumns = _StatisticsColumns(0)
+                columns.present = np.load(os.path.join(columns_path, PRESENT_FILE), mmap_mode="r")
+                for file_name in sorted(os.listdir(columns_path)):
+                    if file_name.endswith(NPY_EXTENSION) and file_name != PRESENT_FILE:
+                        columns.columns[file_name[:-len(NPY_EXTENSION)]] = \
+                            np.load(os.path.join(columns_path, file_name), mmap_mode="r")
+                res._container[(function_name, var)] = columns
+        return res
 
     def print_statistics(self) -> None:
         """Prints collected values"""
-        for corr_func_name in self._container:
-            for data_var in self._container[corr_func_name]:
-                for timestamp in self._container[corr_func_name][data_var]:
-                    logging.debug(str(corr_func_name) + "-" + str(data_var) + "-" + str(timestamp) + ":\t" \
-                        + str(self._container[corr_func_name][data_var][timestamp]))
\ No newline at end of file
+        for (corr_func_name, data_var), columns in self._container.items():
+            for index in np.flatnonzero(columns.present[:self._size]):
+                timestamp: Any = None if self._first_date is None or self._step is None \
+                    else self._first_date + self._step * int(index)
+                logging.debug(str(corr_func_name) + "-" + str(data_var) + "-" + str(timestamp) + ":\t" \
+                    + str(columns.get(int(index))))
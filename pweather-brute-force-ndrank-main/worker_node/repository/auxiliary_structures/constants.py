@@ -3,6 +3,7 @@ from typing import Final
 MONTH_YEAR_REPO: Final = "month-year-repository"
 HOUR_DAY_MONTH_YEAR_REPO: Final = "hour-day-month-year-repository"
 MONTH_YEAR_ROUND_ROBIN_REPO: Final = "month-year-round-robin-repository"
+STANDARDIZED_ANOMALY_MONTH_YEAR_REPO: Final = "standardized-anomaly-month-year-repository"
 DEV_DUMMY_TAG: Final = "dummy-repository"
 
 #metadata tags:
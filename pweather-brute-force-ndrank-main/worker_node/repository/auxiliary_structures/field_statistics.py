@@ -0,0 +1,250 @@
+import os
+from typing import Dict, Final, List, Optional, Union
+import numpy as np
+import numpy.typing as npt
+import xarray
+
+"""Both the PCC and the RMSD require, for every time instance of the dataset, the sum,
+the sum of squares and the number of valid values of each field. Since these values
+never change, they can be calculated once for each repository and stored in a sidecar
+file (one per data variable) next to the settings file. The sidecar is a numpy
+structured array ordered by date, which allows it to be memory mapped and only the
+required rows are read from disk.
+
+Most data variables have values in every position of the grid, while a few (like the
+ones only defined over the ocean or over land) always miss the same positions. When
+every field of a data variable has the same valid positions, these are also stored
+in a mask file, so that the valid positions never have to be searched again.
+"""
+
+FIELD_STATISTICS_FILE: Final = "field-statistics-{}.npy"
+FIELD_MASK_FILE: Final = "field-mask-{}.npy"
+FIELD_STATISTICS_DTYPE: Final = np.dtype([
+    ("date", "datetime64[ns]"),
+    ("sum", np.float64),
+    ("sum_squares", np.float64),
+    ("count", np.int64)
+])
+
+class FieldMask:
+    """Positions of the flattened grid that have values in every field of a data variable
+    """
+    def __init__(self, valid: npt.NDArray[np.bool_]) -> None:
+        self._valid: npt.NDArray[np.bool_] = valid
+        self._valid_count: int = int(np.count_nonzero(valid))
+        self._columns: Union[slice, npt.NDArray[np.int64]] = slice(None) if self._valid_count == len(valid) \
+            else np.flatnonzero(valid)
+
+    @property
+    def valid(self) -> npt.NDArray[np.bool_]:
+        return self._valid
+
+    @property
+    def valid_count(self) -> int:
+        return self._valid_count
+
+    @property
+    def is_dense(self) -> bool:
+        """If every position of the grid has values"""
+        return self._valid_count == len(self._valid)
+
+    @property
+    def columns(self) -> Union[slice, npt.NDArray[np.int64]]:
+        """Index of the valid positions (a full slice when the fields are dense)"""
+        return self._columns
+
+    def __len__(self) -> int:
+        return len(self._valid)
+
+
+class FieldStatistics:
+    """Statistics of a block of fields, with one value per time instance
+    """
+    def __init__(self, sum: npt.NDArray[np.float64], sum_squares: npt.NDArray[np.float64],
+        count: npt.NDArray[np.int64], mask: Optional[FieldMask] = None) -> None:
+        self._sum: npt.NDArray[np.float64] = sum
+        self._sum_squares: npt.NDArray[np.float64] = sum_squares
+        self._count: npt.NDArray[np.int64] = count
+        self._mask: Optional[FieldMask] = mask
+
+    @property
+    def sum(self) -> npt.NDArray[np.float64]:
+        """Sum of the valid values of each field"""
+        return self._sum
+
+    @property
+    def sum_squares(self) -> npt.NDArray[np.float64]:
+        """Sum of the squares of the valid values of each field"""
+        return self._sum_squares
+
+    @property
+    def count(self) -> npt.NDArray[np.int64]:
+        """Number of valid (not NaN) values of each field"""
+        return self._count
+
+    @property
+    def mask(self) -> Optional[FieldMask]:
+        """Valid positions shared by every field of the data variable or None if they change between fields"""
+        return self._mask
+
+
+class FieldStatisticsSidecar:
+    """Memory mapped sidecar file with the statistics of every field of a data variable
+    """
+    def __init__(self, file_path: str, mask: Optional[FieldMask] = None) -> None:
+        self._values: npt.NDArray = np.load(file_path, mmap_mode="r")
+        if self._values.dtype != FIELD_STATISTICS_DTYPE:
+            raise ValueError("File " + file_path + " is not a valid field statistics file")
+        self._mask: Optional[FieldMask] = mask
+
+    @property
+    def mask(self) -> Optional[FieldMask]:
+        return self._mask
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def select(self, dates: npt.NDArray[np.datetime64]) -> Optional[FieldStatistics]:
+        """Returns the statistics of the fields with the given dates
+
+        Args:
+            dates (npt.NDArray[np.datetime64]): dates of the wanted fields
+
+        Returns:
+            Optional[FieldStatistics]: statistics in the same order as the dates or
+        None if any of the dates is missing from the sidecar
+        """
+        stored_dates: npt.NDArray[np.datetime64] = self._values["date"]
+        dates = dates.astype("datetime64[ns]")
+        indexes: npt.NDArray[np.int64] = np.searchsorted(stored_dates, dates)
+        if len(stored_dates) == 0 or np.any(indexes >= len(stored_dates)) or \
+            np.any(stored_dates[np.minimum(indexes, len(stored_dates) - 1)] != dates):
+            return None
+        rows: npt.NDArray = self._values[indexes]
+        return FieldStatistics(rows["sum"], rows["sum_squares"], rows["count"], self._mask)
+
+
+def get_field_statistics_path(dataset_path: str, data_var: str) -> str:
+    """Path of the sidecar file for a given data variable
+
+    Args:
+        dataset_path (str): folder of the dataset (ending with "/")
+        data_var (str): name of the data variable
+
+    Returns:
+        str: path of the sidecar file
+    """
+    return dataset_path + FIELD_STATISTICS_FILE.format(data_var)
+
+def get_field_mask_path(dataset_path: str, data_var: str) -> str:
+    """Path of the mask file for a given data variable
+
+    Args:
+        dataset_path (str): folder of the dataset (ending with "/")
+        data_var (str): name of the data variable
+
+    Returns:
+        str: path of the mask file
+    """
+    return dataset_path + FIELD_MASK_FILE.format(data_var)
+
+def load_field_mask(dataset_path: str, data_var: str) -> Optional[FieldMask]:
+    """Loads the mask file of a data variable
+
+    Args:
+        dataset_path (str): folder of the dataset (ending with "/")
+        data_var (str): name of the data variable
+
+    Returns:
+        Optional[FieldMask]: the mask or None if the valid positions change between fields
+    """
+    path: str = get_field_mask_path(dataset_path, data_var)
+    if not os.path.isfile(path):
+        return None
+    return FieldMask(np.load(path))
+
+def calculate_field_mask(dataset: xarray.Dataset, data_var: str, time_variation_dim: str) -> Optional[npt.NDArray[np.bool_]]:
+    """Calculates the valid positions of every field of a dataset file
+
+    Args:
+        dataset (xarray.Dataset): file of the dataset
+        data_var (str): data variable to be used
+        time_variation_dim (str): name of the time variation dimension
+
+    Returns:
+        Optional[npt.NDArray[np.bool_]]: valid positions of the flattened grid or None if they 
+    are not the same in every field
+    """
+    block: xarray.DataArray = dataset[data_var]
+    if not time_variation_dim in block.dims:
+        block = block.expand_dims(time_variation_dim)
+    block = block.transpose(time_variation_dim, ...)
+    valid: npt.NDArray[np.bool_] = ~np.isnan(block.values.reshape(block.shape[0], -1))
+    if not bool(np.all(valid == valid[0])):
+        return None
+    return valid[0]
+
+def calculate_field_statistics(dataset: xarray.Dataset, data_var: str, time_variation_dim: str,
+    time_initial_dim: str) -> npt.NDArray:
+    """Calculates the statistics of every field of a dataset file
+
+    Args:
+        dataset (xarray.Dataset): file of the dataset
+        data_var (str): data variable to be used
+        time_variation_dim (str): name of the time variation dimension
+        time_initial_dim (str): name of the time initial dimension
+
+    Returns:
+        npt.NDArray: structured array with the FIELD_STATISTICS_DTYPE
+    """
+    block: xarray.DataArray = dataset[data_var]
+    if not time_variation_dim in block.dims:
+        block = block.expand_dims(time_variation_dim)
+    block = block.transpose(time_variation_dim, ...)
+    values: npt.NDArray[np.float64] = block.values.astype(np.float64).reshape(block.shape[0], -1)
+    valid: npt.NDArray[np.bool_] = ~np.isnan(values)
+    values = np.where(valid, values, 0.0)
+
+    res: npt.NDArray = np.empty(block.shape[0], dtype=FIELD_STATISTICS_DTYPE)
+    res["date"] = block.coords[time_initial_dim].values + block.coords[time_variation_dim].values
+    res["sum"] = np.sum(values, axis=1)
+    res["sum_squares"] = np.einsum("ij,ij->i", values, values)
+    res["count"] = np.count_nonzero(valid, axis=1)
+    return res
+
+def write_field_statistics(dataset_path: str, statistics: Dict[str, List[npt.NDArray]]) -> None:
+    """Writes the sidecar file of each data variable, ordered by date
+
+    Args:
+        dataset_path (str): folder of the dataset (ending with "/")
+        statistics (Dict[str, List[npt.NDArray]]): statistics calculated for each file, by data variable
+    """
+    for data_var in statistics:
+        values: npt.NDArray = np.concatenate(statistics[data_var]) if len(statistics[data_var]) > 0 \
+            else np.empty(0, dtype=FIELD_STATISTICS_DTYPE)
+        values = values[np.argsort(values["date"], kind="stable")]
+        path: str = get_field_statistics_path(dataset_path, data_var)
+        #written to a temporary file first, so that a running worker never maps a partial file
+        temporary_path: str = path + ".tmp.npy"
+        np.save(temporary_path, values)
+        os.replace(temporary_path, path)
+
+def write_field_masks(dataset_path: str, masks: Dict[str, List[Optional[npt.NDArray[np.bool_]]]]) -> None:
+    """Writes the mask file of each data variable whose valid positions are the same in every file.
+    The previous mask file is removed when the valid positions change
+
+    Args:
+        dataset_path (str): folder of the dataset (ending with "/")
+        masks (Dict[str, List[Optional[npt.NDArray[np.bool_]]]]): valid positions of each file, by data variable
+    """
+    for data_var in masks:
+        path: str = get_field_mask_path(dataset_path, data_var)
+        file_masks: List[Optional[npt.NDArray[np.bool_]]] = masks[data_var]
+        first_mask: Optional[npt.NDArray[np.bool_]] = file_masks[0] if len(file_masks) > 0 else None
+        if first_mask is None or any(mask is None or not np.array_equal(mask, first_mask) for mask in file_masks):
+            if os.path.isfile(path):
+                os.remove(path)
+            continue
+        temporary_path: str = path + ".tmp.npy"
+        np.save(temporary_path, first_mask)
+        os.replace(temporary_path, path)
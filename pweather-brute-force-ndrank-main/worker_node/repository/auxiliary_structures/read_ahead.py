@@ -0,0 +1,139 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import threading
+from typing import Callable, Deque, Final, Iterator, List, Optional, Tuple
+import xarray
+
+"""While a file of the dataset is being searched, the disk is idle. To overlap the reading
+(and decompression) of the files with the comparisons, the next files are opened and read
+into memory by a background thread, in the order they will be searched.
+
+The files are only read into memory when they fit in the memory budget, which is shared by
+the file being searched and the files read ahead (each one can use an equal part of it).
+Larger files are only opened in advance and are read lazily during the search, as before.
+
+The netCDF and HDF5 libraries are not thread safe, and xarray only locks the reads of the
+values (not the opening and closing of the files). The background thread opens and reads the
+files while holding "file_lock", which is also held when a file read ahead is closed, and it
+is stopped while a file that was not read into memory is being searched.
+"""
+
+DEFAULT_READ_AHEAD_FILES: Final = 0
+DEFAULT_READ_AHEAD_MEMORY: Final = 2048 * 1024**2 #bytes
+
+class ReadAheadSettings:
+    """Number of files read in advance (0 disables the read-ahead) and memory budget of the
+    files read into memory (in bytes)
+    """
+    def __init__(self, files: int = DEFAULT_READ_AHEAD_FILES, memory: int = DEFAULT_READ_AHEAD_MEMORY) -> None:
+        self._files: int
+        self._memory: int
+        self.files = files
+        self.memory = memory
+
+    @property
+    def files(self) -> int:
+        return self._files
+
+    @files.setter
+    def files(self, files: int) -> None:
+        if files < 0:
+            raise ValueError("The number of files read ahead can not be negative")
+        self._files = files
+
+    @property
+    def memory(self) -> int:
+        return self._memory
+
+    @memory.setter
+    def memory(self, memory: int) -> None:
+        if memory < 0:
+            raise ValueError("The memory budget of the read-ahead can not be negative")
+        self._memory = memory
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._files > 0
+
+    @property
+    def max_file_bytes(self) -> int:
+        """Size of the largest file that is read into memory"""
+        return self._memory // (self._files + 1)
+
+
+#settings shared by all repositories of the process
+read_ahead_settings: Final = ReadAheadSettings()
+#serializes the opening, reading and closing of the files read ahead
+file_lock: Final = threading.RLock()
+
+def _lock_close(dataset: xarray.Dataset) -> None:
+    """Makes the given dataset close its files while holding "file_lock"
+
+    Args:
+        dataset (xarray.Dataset): dataset opened by the background thread
+    """
+    close: Optional[Callable[[], None]] = dataset._close
+    if close is None:
+        return
+    def locked_close() -> None:
+        with file_lock:
+            close()
+    dataset.set_close(locked_close)
+
+def read_ahead(file_paths: List[str], open_file: Callable[[str], xarray.Dataset],
+    settings: Optional[ReadAheadSettings] = None) -> Iterator[Tuple[str, xarray.Dataset]]:
+    """Opens every file in order, while the next files are read by a background thread
+
+    Args:
+        file_paths (List[str]): paths of the files, in the order they are searched
+        open_file (Callable[[str], xarray.Dataset]): opens a single file (lazily)
+        settings (Optional[ReadAheadSettings], optional): settings of the read-ahead. Defaults to None
+        (the value of "read_ahead_settings")
+
+    Yields:
+        Iterator[Tuple[str, xarray.Dataset]]: path and opened file, one by one
+    """
+    if settings is None:
+        settings = read_ahead_settings
+    if not settings.is_enabled:
+        for file_path in file_paths:
+            yield (file_path, open_file(file_path))
+        return
+
+    max_file_bytes: int = settings.max_file_bytes
+    def load_file(file_path: str) -> Tuple[xarray.Dataset, bool]:
+        with file_lock:
+            dataset: xarray.Dataset = open_file(file_path)
+            _lock_close(dataset)
+            if dataset.nbytes > max_file_bytes:
+                return dataset, False
+            try:
+                dataset.load()
+            except BaseException:
+                dataset.close()
+                raise
+            return dataset, True
+
+    #a single thread reads the files, so that the disk is read sequentially
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="read-ahead")
+    pending: Deque[Tuple[str, Future[Tuple[xarray.Dataset, bool]]]] = deque()
+    next_index: int = 0
+    try:
+        while next_index < len(file_paths) or len(pending) > 0:
+            #the previous file was already searched, so its part of the budget can be used by the next one
+            while next_index < len(file_paths) and len(pending) <= settings.files:
+                pending.append((file_paths[next_index], executor.submit(load_file, file_paths[next_index])))
+                next_index += 1
+            file_path, future = pending.popleft()
+            dataset, loaded = future.result()
+            if not loaded:
+                #the file is read during the search, so the files read ahead must be ready before it starts
+                # (and no other file is read until the search of this one ends)
+                wait([pending_future for _, pending_future in pending])
+            yield (file_path, dataset)
+    finally:
+        #the files read ahead that will no longer be searched (the iteration was stopped) are closed
+        executor.shutdown(wait=True, cancel_futures=True)
+        for _, future in pending:
+            if not future.cancelled() and future.exception() is None:
+                future.result()[0].close()
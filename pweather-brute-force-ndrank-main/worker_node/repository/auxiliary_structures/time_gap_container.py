@@ -1,10 +1,22 @@
-from datetime import datetime
-from typing import Dict, Final, List, Set, Optional
+from typing import Dict, Final, List, Set, Optional, Tuple
 
 import numpy as np
-import pandas
+import numpy.typing as npt
 from repository.auxiliary_structures.constants import ALL, HOUR
 
+HOURS_PER_DAY: Final = 24
+
+def get_hours(timestamps: npt.NDArray[np.datetime64]) -> npt.NDArray[np.int64]:
+    """Returns the hour of the day of every timestamp
+
+    Args:
+        timestamps (npt.NDArray[np.datetime64]): timestamps (of any shape)
+
+    Returns:
+        npt.NDArray[np.int64]: hour (0 to 23) of every timestamp
+    """
+    return np.asarray(timestamps).astype("datetime64[h]").astype(np.int64) % HOURS_PER_DAY
+
 
 class TimeGapContainer:
     """Manages the existing gaps in the time dimension for
@@ -18,6 +30,9 @@ class TimeGapContainer:
         #keys are organized as follows: (data_var, time tag)
         self._gap_for_specific_vars: Dict[str,Dict[str,Set[int]]] = {}
 
+        #gap of every hour of the day, by (data variables, search hours)
+        self._hour_masks: Dict[Tuple[Tuple[str, ...], Optional[Tuple[int, ...]]], npt.NDArray[np.bool_]] = {}
+
     def add_time_gap(self, tag: str, time_value: int, data_var: str) -> None:
         """Adds a time value for a specific hour or day (for example) where there
         is no available data for the given data variables
@@ -32,6 +47,7 @@ class TimeGapContainer:
         """
         if not tag in self._valid_tags:
             raise ValueError("Tag " + tag + " does not exist in TimeGapContainer")
+        self._hour_masks.clear()
         if data_var == ALL:
             self._gap_for_all_vars[tag].add(time_value)
         else:
@@ -44,28 +60,47 @@ class TimeGapContainer:
             self._gap_for_specific_vars[data_var][tag].add(time_value)
 
     
-    def _is_gap_hour(self, ts: np.datetime64, data_vars: List[str]) -> bool:
-        ts_datetime: datetime = pandas.to_datetime(ts)
-        for var in data_vars:
-            if ts_datetime.hour in self._gap_for_all_vars[HOUR]:
-                return True
-            if var in self._gap_for_specific_vars and \
-                ts_datetime.hour in self._gap_for_specific_vars[var][HOUR]:
-                return True
-        return False
-    
-    def _is_search_hour(self, ts:np.datetime64, search_hours: List[int]) -> bool:
-        """Verifies if the hour exists inside the search hours
+    def hour_mask(self, data_vars: List[str], search_hours: Optional[List[int]] = None) -> npt.NDArray[np.bool_]:
+        """Returns, for every hour of the day, if its time instances are a gap for the given
+        data variables (or are not part of the search hours). The masks are only calculated once
 
         Args:
-            ts (np.datetime64): given timestamp
-            search_hours (List[int]): hours that should be searched
+            data_vars (List[str]): data variables to be checked
+            search_hours (Optional[List[int]]): hours that should be searched or None if all hours
+            are searched. Default is None.
 
         Returns:
-            bool: True if the hour is inside search_hours
+            npt.NDArray[np.bool_]: array with 24 values, True if the hour is a gap
         """
-        ts_datetime: datetime = pandas.to_datetime(ts)
-        return ts_datetime.hour in search_hours
+        key: Tuple[Tuple[str, ...], Optional[Tuple[int, ...]]] = \
+            (tuple(data_vars), None if search_hours is None else tuple(search_hours))
+        if not key in self._hour_masks:
+            gap_hours: Set[int] = set()
+            if len(data_vars) > 0:
+                gap_hours.update(self._gap_for_all_vars[HOUR])
+            for var in data_vars:
+                if var in self._gap_for_specific_vars:
+                    gap_hours.update(self._gap_for_specific_vars[var][HOUR])
+            mask: npt.NDArray[np.bool_] = np.isin(np.arange(HOURS_PER_DAY), list(gap_hours))
+            if not search_hours is None:
+                mask |= ~np.isin(np.arange(HOURS_PER_DAY), search_hours)
+            self._hour_masks[key] = mask
+        return self._hour_masks[key]
+
+    def gap_mask(self, timestamps: npt.NDArray[np.datetime64], data_vars: List[str], 
+        search_hours: Optional[List[int]] = None) -> npt.NDArray[np.bool_]:
+        """Verifies, for a whole array of timestamps at once, which ones are a gap (see "is_gap")
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): time instances to be analysed (of any shape)
+            data_vars (List[str]): data variables to be checked
+            search_hours (Optional[List[int]]): hours that should be searched or None if all hours
+            are searched. Default is None.
+
+        Returns:
+            npt.NDArray[np.bool_]: True for the timestamps in the gap, with the same shape as the timestamps
+        """
+        return self.hour_mask(data_vars, search_hours)[get_hours(timestamps)]
 
     def is_gap(self, ts: np.datetime64, data_vars: List[str], search_hours: Optional[List[int]] = None) -> bool:
         """True if the given timestamp is a time instance value where
@@ -82,10 +117,4 @@ class TimeGapContainer:
         Returns:
             bool: true if it is in the gap
         """
-        if search_hours is None:
-            return self._is_gap_hour(ts,data_vars)
-        else:
-            if self._is_search_hour(ts,search_hours):
-                return self._is_gap_hour(ts,data_vars)
-            else:
-                return True
+        return bool(self.gap_mask(np.asarray(ts), data_vars, search_hours))
@@ -1,12 +1,13 @@
 import logging
-from typing import Dict, Final, Iterator, Optional, Tuple, Union
+from typing import Dict, Final, Iterator, List, Optional, Tuple, Union
 from xmlrpc.client import Boolean
 import numpy as np
 import numpy.typing as npt
 import  xarray, yaml
 from auxiliar.xarray_aux import open_dataset_with_file_name
 from repository.auxiliary_structures.dataset_indexer import HOUR_DAY_MONTH_YEAR_DATASET, MONTH_YEAR_DATASET, PROCESSING_FUNCTIONS, DatasetIndexer, DateContainer, subtract_timedelta
-from repository.auxiliary_structures.constants import HOUR_DAY_MONTH_YEAR_REPO, MONTH_YEAR_REPO, MONTH_YEAR_ROUND_ROBIN_REPO
+from repository.auxiliary_structures.constants import HOUR_DAY_MONTH_YEAR_REPO, MONTH_YEAR_REPO, MONTH_YEAR_ROUND_ROBIN_REPO, \
+    STANDARDIZED_ANOMALY_MONTH_YEAR_REPO
 from repository.repository_layer import RepositoryLayer, RepositoryMetadata
 from auxiliar.component_injector import component_injector
 
@@ -58,33 +59,50 @@ class _standardERA5FileFormat(RepositoryLayer):
             except KeyError:
                 raise ValueError("Key " + RESOLUTION_REDUCTION_PARAMETERS + " not found in file " + self._dataset_path + self._index_file)
 
-    def get_dataset(self) -> Iterator[Tuple[str, xarray.Dataset]]:
+    def get_dataset_file_paths(self) -> List[str]:
         """
-        Returns every file ordered by time
+        Returns the path of every file ordered by time
 
-        Yields:
-            Iterator[Tuple[str, xarray.Dataset]]: returns every existing 
-            file one by one
+        Returns:
+            List[str]: paths of the files
         """
-        for path in self._dataset_index.get_sorted_file_paths():
-            yield (path[1], open_dataset_with_file_name(path[1]))
+        return [path[1] for path in self._dataset_index.get_sorted_file_paths()]
 
-    def get_dataset_part(self, date_container: DateContainer) -> Optional[Tuple[str, xarray.Dataset]]:
+    def open_dataset_file(self, file_path: str) -> xarray.Dataset:
+        return open_dataset_with_file_name(file_path)
+
+    def get_dataset_part_path(self, date_container: DateContainer) -> Optional[str]:
         """
-        Returns the file 
+        Returns the path of the file, without opening it
 
         Args:
             date_container (DateContainer): date that is necessary
 
         Returns:
-            Optional[Tuple[str, xarray.Dataset]]: file with the containing date
+            Optional[str]: path of the file with the containing date
         """
         result: Optional[Tuple[int,str,DateContainer]] = \
             self._dataset_index.index_dataset(date_container)
         if result is None:
             return None
         else:
-            return (result[1], open_dataset_with_file_name(result[1]))
+            return result[1]
+
+    def get_dataset_part(self, date_container: DateContainer) -> Optional[Tuple[str, xarray.Dataset]]:
+        """
+        Returns the file 
+
+        Args:
+            date_container (DateContainer): date that is necessary
+
+        Returns:
+            Optional[Tuple[str, xarray.Dataset]]: file with the containing date
+        """
+        file_path: Optional[str] = self.get_dataset_part_path(date_container)
+        if file_path is None:
+            return None
+        else:
+            return (file_path, open_dataset_with_file_name(file_path))
 
 
 @component_injector.inject_repository(MONTH_YEAR_REPO)
@@ -104,12 +122,27 @@ class MonthYearRepository(_standardERA5FileFormat):
         super().__init__(dataset_path, index_file_name, MONTH_YEAR_DATASET)
         self._calculate_shift()
 
-    def get_dataset_part(self, date_container: DateContainer) -> Optional[Tuple[str, xarray.Dataset]]:
+    def get_dataset_part_path(self, date_container: DateContainer) -> Optional[str]:
         if date_container.has_day() and date_container.has_hour():
             date_container = subtract_timedelta(date_container,self._file_shift)
         date_container.unset_day()
         date_container.unset_hour()
-        return super().get_dataset_part(date_container)
+        return super().get_dataset_part_path(date_container)
+
+
+@component_injector.inject_repository(STANDARDIZED_ANOMALY_MONTH_YEAR_REPO)
+class StandardizedAnomalyMonthYearRepository(MonthYearRepository):
+    """Repository with data split in files by month, where every value is already a
+    standardized anomaly ((value - average) / standard deviation). These datasets are 
+    created offline by the "standardized-anomaly-reducer" of the resolution reducer, from
+    the average and standard deviation files also used by the "enhanced_pcc".
+
+    The metadata marks the data as standardized, so that the correlation functions
+    can skip the standardization of the dataset
+    """
+    def get_metadata(self) -> RepositoryMetadata:
+        with open(self._dataset_path + self._index_file, "r") as stream:
+            return RepositoryMetadata(yaml.safe_load(stream)[METADATA], standardized=True)
 
 
 @component_injector.inject_repository(HOUR_DAY_MONTH_YEAR_REPO)
@@ -133,6 +166,9 @@ class MonthYearRoundRobinRepository(MonthYearRepository):
     def get_dataset(self) -> Iterator[Tuple[str, xarray.Dataset]]:
         raise NotImplementedError("This repository does not support sequential iteration")
 
+    def get_dataset_file_paths(self) -> List[str]:
+        raise NotImplementedError("This repository does not support sequential iteration")
+
     def _verify_if_step_exists(self,ds: xarray.Dataset, dt64: np.datetime64) -> Boolean:
         metadata: RepositoryMetadata = self.get_metadata()
         time_date: Union[np.datetime64, npt.NDArray[np.datetime64]] #only a Union since can return both kinds
@@ -1,5 +1,7 @@
 from typing import Dict, List, Optional
 import numpy as np
+import numpy.typing as npt
+from repository.auxiliary_structures.time_gap_container import HOURS_PER_DAY, TimeGapContainer, get_hours
 from repository.repository_layer import RepositoryLayer, RepositoryMetadata
 
 """This class was created in a latter stage of development. It's the class
@@ -27,6 +29,7 @@ class RepositoryCollection:
                 raise ValueError("All repositories must be of the exact same type")
         
         self._repositories: List[RepositoryLayer] = repositories
+        self._time_gap_containers: Optional[List[TimeGapContainer]] = None
     
     @property
     def repositories(self) -> List[RepositoryLayer]:
@@ -71,6 +74,37 @@ class RepositoryCollection:
         
         return RepositoryCollection(final_list)
 
+    @property
+    def time_gap_containers(self) -> List[TimeGapContainer]:
+        """Returns the gaps of every repository, which are only read once from the metadata
+
+        Returns:
+            List[TimeGapContainer]: gaps of every repository
+        """
+        if self._time_gap_containers is None:
+            self._time_gap_containers = [repository.get_metadata().time_gap_container 
+                for repository in self._repositories]
+        return self._time_gap_containers
+
+    def gap_mask(self, timestamps: npt.NDArray[np.datetime64], data_vars: List[str],
+        search_hours: Optional[List[int]] = None) -> npt.NDArray[np.bool_]:
+        """Verifies, for a whole array of timestamps at once, which ones are a gap
+        in any of the datasets (see "is_gap")
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): time instances to be analysed (of any shape)
+            data_vars (List[str]): data variables to be checked
+            search_hours (Optional[List[int]]): hours that should be searched or None if all 
+            hours are searched. Default is None.
+
+        Returns:
+            npt.NDArray[np.bool_]: True for the timestamps in the gap, with the same shape as the timestamps
+        """
+        hour_mask: npt.NDArray[np.bool_] = np.zeros(HOURS_PER_DAY, dtype=np.bool_)
+        for time_gap_container in self.time_gap_containers:
+            hour_mask |= time_gap_container.hour_mask(data_vars, search_hours)
+        return hour_mask[get_hours(timestamps)]
+
     def is_gap(self, ts: np.datetime64, data_vars: List[str], 
         search_hours: Optional[List[int]] = None) -> bool:
         """True if the given timestamp is a time instance value where
@@ -89,10 +123,7 @@ class RepositoryCollection:
         Returns:
             bool: true if it is in the gap
         """
-        for time_gap_container in map(lambda x: x.get_metadata().time_gap_container, self._repositories):
-            if time_gap_container.is_gap(ts, data_vars, search_hours):
-                return True
-        return False
+        return bool(self.gap_mask(np.asarray(ts), data_vars, search_hours))
 
     def get_metadata_by_data_var(self, data_variable:str) -> RepositoryMetadata:
         """Returns the metadata of a repository that has the specific data_variable
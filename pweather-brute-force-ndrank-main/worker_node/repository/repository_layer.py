@@ -1,7 +1,14 @@
+import hashlib
+import logging
+import os
 import numpy as np
+import numpy.typing as npt
 import xarray
 from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type
 from repository.auxiliary_structures.dataset_indexer import DateContainer
+from repository.auxiliary_structures.field_statistics import FieldStatisticsSidecar, calculate_field_mask, \
+    calculate_field_statistics, get_field_mask_path, get_field_statistics_path, load_field_mask, write_field_masks, write_field_statistics
+from repository.auxiliary_structures.read_ahead import read_ahead
 from repository.auxiliary_structures.constants import DATA_VARS, STEP, TIME_GAP, TIME_INITIAL_DIM, TIME_VARIATION_DIM
 from repository.auxiliary_structures.time_gap_container import TimeGapContainer
 from schema import Schema #type: ignore
@@ -20,8 +27,9 @@ class RepositoryMetadata:
         }
     )
 
-    def __init__(self, info: Dict[str, Any]) -> None:
+    def __init__(self, info: Dict[str, Any], standardized: bool = False) -> None:
         self._step: int = info[STEP]
+        self._standardized: bool = standardized
         self._time_variation_dim: str = info[TIME_VARIATION_DIM]
         self._time_initial_dim: str = info[TIME_INITIAL_DIM]
         self._time_gap_container: TimeGapContainer = TimeGapContainer()
@@ -82,6 +90,16 @@ class RepositoryMetadata:
         """
         return self._data_vars
 
+    @property
+    def is_standardized(self) -> bool:
+        """If the data of the repository is already a standardized anomaly, 
+        (value - average) / standard deviation
+
+        Returns:
+            bool: True if the data is standardized
+        """
+        return self._standardized
+
 class RepositoryLayer:
     """
     Class for the representation of the repository layer
@@ -98,6 +116,7 @@ class RepositoryLayer:
         self._dataset_path: str = \
             dataset_path + "/" if dataset_path[-1] != "/" else dataset_path
         self._index_file: str = index_file_name
+        self._field_statistics: Dict[str, Optional[FieldStatisticsSidecar]] = {}
 
     def get_metadata(self) -> RepositoryMetadata:
         """Returns the existing attributes from the settings file
@@ -119,7 +138,37 @@ class RepositoryLayer:
 
     def get_dataset(self) -> Iterator[Tuple[str,xarray.Dataset]]:
         """
-        Method used to iterate the full dataset
+        Method used to iterate the full dataset. Every file of "get_dataset_file_paths" is
+        opened with "open_dataset_file", while the next files are read by a background 
+        thread (see "read_ahead_settings")
+
+        Yields:
+            Iterator[Tuple[str,xarray.Dataset]]: returns every existing file one by one
+
+        Raises:
+            NotImplementedError: if the files of the repository can not be listed
+        """
+        return read_ahead(self.get_dataset_file_paths(), self.open_dataset_file)
+
+    def get_dataset_file_paths(self) -> List[str]:
+        """
+        Returns the paths of every file of the dataset, in the same order as "get_dataset".
+        Used to search the files in parallel, each one opened with "open_dataset_file"
+
+        Raises:
+            NotImplementedError: if the files of the repository can not be searched independently
+        """
+        raise NotImplementedError("Method must be overriden")
+
+    def open_dataset_file(self, file_path: str) -> xarray.Dataset:
+        """
+        Opens a single file of the dataset
+
+        Args:
+            file_path (str): path returned by "get_dataset_file_paths"
+
+        Returns:
+            xarray.Dataset: opened file
 
         Raises:
             NotImplementedError: supposed to be overriden
@@ -142,6 +191,53 @@ class RepositoryLayer:
         """
         raise NotImplementedError("Method must be overriden")
 
+    def get_dataset_part_path(self, date_container: DateContainer) -> Optional[str]:
+        """
+        Returns the path of the file that possesses the given date, without reading it. The file
+        is opened with "open_dataset_file", so that several dates of the same file are read at once.
+        The date may still be missing from the file (for example, when the steps are distributed
+        between the workers), so the step must be verified after opening it
+
+        Args:
+            date_container (DateContainer): date where the result should be searched
+
+        Returns:
+            Optional[str]: path of the file or None, if the file is not found
+        """
+        res: Optional[Tuple[str, xarray.Dataset]] = self.get_dataset_part(date_container)
+        if res is None:
+            return None
+        res[1].close()
+        return res[0]
+
+    def get_version_stamp(self) -> str:
+        """
+        Returns a stamp that changes whenever the dataset changes (used to invalidate the cached
+        results, see "result_cache"). It is built from the settings file and the size and modification
+        time of every file of the dataset (every file inside the dataset folder when the files of the
+        repository can not be listed) and of the sidecar files of the fields
+
+        Returns:
+            str: version stamp of the dataset
+        """
+        stamp = hashlib.sha256()
+        with open(self._dataset_path + self._index_file, "rb") as f:
+            stamp.update(f.read())
+        file_paths: List[str]
+        try:
+            file_paths = list(self.get_dataset_file_paths())
+        except NotImplementedError:
+            file_paths = sorted(os.path.join(folder, file_name)
+                for folder, _, file_names in os.walk(self._dataset_path) for file_name in file_names)
+        #the statistics and masks of the fields are used to standardize and select the values
+        for data_var in sorted(self.get_metadata().data_vars):
+            file_paths.extend(path for path in [get_field_statistics_path(self._dataset_path, data_var),
+                get_field_mask_path(self._dataset_path, data_var)] if os.path.exists(path))
+        for file_path in file_paths:
+            file_stat: os.stat_result = os.stat(file_path)
+            stamp.update((file_path + ":" + str(file_stat.st_size) + ":" + str(file_stat.st_mtime_ns) + "\n").encode())
+        return stamp.hexdigest()
+
     @property
     def dividing_unit(self) -> DateContainer:
         """
@@ -160,6 +256,47 @@ class RepositoryLayer:
         """
         raise NotImplementedError("Method must be overriden")
 
+    def create_field_statistics(self) -> None:
+        """Calculates the statistics and the valid positions of every field of the dataset 
+        (see "field_statistics") and writes them to the sidecar files next to the settings file
+        """
+        metadata: RepositoryMetadata = self.get_metadata()
+        statistics: Dict[str, List[npt.NDArray]] = {}
+        masks: Dict[str, List[Optional[npt.NDArray[np.bool_]]]] = {}
+        for data_var in metadata.data_vars:
+            statistics[data_var] = []
+            masks[data_var] = []
+
+        for dataset_pair in self.get_dataset():
+            logging.info("Calculating field statistics of file " + dataset_pair[0])
+            for data_var in metadata.data_vars:
+                if data_var in dataset_pair[1].data_vars:
+                    statistics[data_var].append(calculate_field_statistics(dataset_pair[1], data_var,
+                        metadata.time_variation_dim, metadata.time_initial_dim))
+                    masks[data_var].append(calculate_field_mask(dataset_pair[1], data_var, 
+                        metadata.time_variation_dim))
+            self.close_dataset_file(dataset_pair[1])
+
+        write_field_statistics(self._dataset_path, statistics)
+        write_field_masks(self._dataset_path, masks)
+        self._field_statistics = {}
+
+    def get_field_statistics(self, data_var: str) -> Optional[FieldStatisticsSidecar]:
+        """Returns the memory mapped statistics of every field of the given data variable
+
+        Args:
+            data_var (str): name of the data variable
+
+        Returns:
+            Optional[FieldStatisticsSidecar]: the sidecar or None if it was not created for
+        this repository
+        """
+        if not data_var in self._field_statistics:
+            path: str = get_field_statistics_path(self._dataset_path, data_var)
+            self._field_statistics[data_var] = FieldStatisticsSidecar(path, 
+                load_field_mask(self._dataset_path, data_var)) if os.path.isfile(path) else None
+        return self._field_statistics[data_var]
+
     def close_dataset_file(self, dataset: xarray.Dataset) -> None:
         """Function used to close dataset files
 
@@ -173,4 +310,4 @@ class DummyRepositoryMetadata(RepositoryMetadata):
 
     """
     def __init__(self, info: Dict[str, Any]) -> None:
-        pass
+        self._standardized = False
@@ -1,6 +1,14 @@
-from typing import List, Tuple
+import threading
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 import pytest
+import xarray
 
+from repository.auxiliary_structures.field_statistics import FieldMask, FieldStatistics, FieldStatisticsSidecar, \
+    calculate_field_mask, calculate_field_statistics, get_field_mask_path, get_field_statistics_path, load_field_mask, \
+    write_field_masks, write_field_statistics
+
+from repository.auxiliary_structures.read_ahead import ReadAheadSettings, file_lock, read_ahead
 from repository.auxiliary_structures.dataset_indexer import MONTH_YEAR_DATASET, PROCESSING_FUNCTIONS, DatasetIndexer, DateContainer
 
 
@@ -71,3 +79,91 @@ def test_dataset_index_with_invalid_file_names() -> None:
             DatasetIndexer("./worker_node/testing_dataset_for_indexer/dataset2/settings.yaml",
                            "./worker_node/testing_dataset_for_indexer/dataset2/",
                            PROCESSING_FUNCTIONS[MONTH_YEAR_DATASET])
+
+
+def test_field_statistics_sidecar(tmp_path) -> None:
+    values = np.arange(2*2*3, dtype=np.float64).reshape(2,2,3)
+    values[1,0,0] = np.nan
+    dataset: xarray.Dataset = xarray.Dataset(
+        {"z": (["step","x","y"], values)},
+        coords=dict(
+            step=("step",np.array([6,12],dtype="timedelta64[h]").astype("timedelta64[ns]")),
+            time=np.datetime64("1980-01-01T00:00:00","ns")
+        )
+    )
+    dataset_path: str = str(tmp_path) + "/"
+    #files are provided out of order, the sidecar must be sorted by date
+    write_field_statistics(dataset_path, {"z": [
+        calculate_field_statistics(dataset.isel(step=1), "z", "step", "time"),
+        calculate_field_statistics(dataset.isel(step=[0]), "z", "step", "time")]})
+
+    sidecar: FieldStatisticsSidecar = FieldStatisticsSidecar(get_field_statistics_path(dataset_path, "z"))
+    assert len(sidecar) == 2
+
+    statistics: Optional[FieldStatistics] = sidecar.select(
+        np.array(["1980-01-01T12:00:00","1980-01-01T06:00:00"],dtype="datetime64[ns]"))
+    assert not statistics is None
+    assert list(statistics.sum) == [np.nansum(values[1]), values[0].sum()]
+    assert list(statistics.sum_squares) == [np.nansum(values[1]**2), (values[0]**2).sum()]
+    assert list(statistics.count) == [5, 6]
+
+    assert sidecar.select(np.array(["1980-01-01T18:00:00"],dtype="datetime64[ns]")) is None
+
+def test_field_mask(tmp_path) -> None:
+    values = np.arange(2*2*3, dtype=np.float64).reshape(2,2,3)
+    values[:,0,1] = np.nan
+    dataset: xarray.Dataset = xarray.Dataset({"z": (["step","x","y"], values)})
+    dataset_path: str = str(tmp_path) + "/"
+
+    write_field_masks(dataset_path, {"z": [calculate_field_mask(dataset, "z", "step"), 
+        calculate_field_mask(dataset.isel(step=0), "z", "step")]})
+    mask: Optional[FieldMask] = load_field_mask(dataset_path, "z")
+    assert not mask is None
+    assert not mask.is_dense and mask.valid_count == 5 and len(mask) == 6
+    assert np.array_equal(np.arange(6)[mask.columns], [0, 2, 3, 4, 5])
+
+    #the mask is removed when the valid positions change between fields
+    values[1,1,1] = np.nan
+    assert calculate_field_mask(dataset, "z", "step") is None
+    write_field_masks(dataset_path, {"z": [calculate_field_mask(dataset, "z", "step")]})
+    assert load_field_mask(dataset_path, "z") is None
+
+def test_read_ahead(tmp_path) -> None:
+    file_paths: List[str] = []
+    for i in range(3):
+        file_paths.append(str(tmp_path / ("file" + str(i) + ".nc")))
+        xarray.Dataset({"z": (["step","x"], np.full((2,4), float(i)))}).to_netcdf(file_paths[-1])
+
+    for settings, in_memory in [(ReadAheadSettings(2, 10**6), True), (ReadAheadSettings(1, 64), False), 
+        (ReadAheadSettings(0), False)]:
+        files: List[Tuple[str, xarray.Dataset]] = list(read_ahead(file_paths, xarray.open_dataset, settings))
+        assert [file[0] for file in files] == file_paths
+        for i, file in enumerate(files):
+            assert file[1]["z"].variable._in_memory == in_memory
+            assert (file[1]["z"].values == i).all()
+            file[1].close()
+
+    #the errors of the background thread are raised while iterating
+    with pytest.raises(FileNotFoundError):
+        for file in read_ahead(file_paths + [str(tmp_path / "missing.nc")], xarray.open_dataset, 
+            ReadAheadSettings(1)):
+            file[1].close()
+
+    #the files read ahead are only closed while the background thread is not using the netCDF library
+    file_iterator: Iterator[Tuple[str, xarray.Dataset]] = read_ahead(file_paths, xarray.open_dataset, ReadAheadSettings(1))
+    dataset: xarray.Dataset = next(file_iterator)[1]
+    closed: threading.Event = threading.Event()
+    def close_dataset() -> None:
+        dataset.close()
+        closed.set()
+    closing_thread: threading.Thread = threading.Thread(target=close_dataset)
+    with file_lock:
+        closing_thread.start()
+        assert not closed.wait(0.2)
+    assert closed.wait(10)
+    closing_thread.join()
+    for file in file_iterator:
+        file[1].close()
+
+    with pytest.raises(ValueError):
+        ReadAheadSettings(-1)
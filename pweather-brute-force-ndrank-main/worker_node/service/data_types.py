@@ -1,16 +1,19 @@
+import heapq
 import logging
-from typing import Any, Dict, Iterator, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Mapping, MutableMapping, Optional, Tuple, Union
 import numpy as np
 import numpy.typing as npt
 import xarray
 from correlation_functions.correlation_statistics import CorrelationStatistics
 from correlation_functions.main_structure import CorrelationFunction
+from correlation_functions.prepared_input import PreparedInput
 from repository.repository_layer import RepositoryMetadata
 
 
 class InputIterator:
     """The input iterator is responsible for receiving the respective input dataset files
-    and facilitate the iteration over it
+    and facilitate the iteration over it. The input is read into memory once, when the
+    iterator is created
     """
     def _is_coord_scalar(self, dataset: xarray.Dataset) -> bool:
         return not self._repository_metadata.time_variation_dim in dataset.coords.indexes
@@ -56,9 +59,15 @@ class InputIterator:
         temp.sort(key=lambda x: x[0]) # type: ignore
         self._input: List[xarray.Dataset] = list(map(lambda x: x[1], temp))
         self._input_statistics: List[Tuple[xarray.Dataset, Dict[str,CorrelationStatistics]]] = [] #the keys of the dictionary are the data variables
+        self._prepared_inputs: Dict[Tuple[str, str], List[PreparedInput]] = {} #the keys are (correlation function, data variable)
         self._used_data_vars: List[str] = used_data_vars
-        self._size_input:int = self._calculate_size()
         self._input_time_intervals: Optional[List[int]] = input_time_intevals
+        self._blocks: Dict[str, xarray.DataArray] = {}
+        self._instances: List[xarray.Dataset] = []
+        self._time_intervals_array: npt.NDArray[np.int64] = np.zeros(0, dtype=np.int64)
+        self._materialize()
+        self._time_intervals: List[int] = [int(value) for value in self._time_intervals_array]
+        self._size_input:int = len(self._instances)
 
         if not corr_function is None and not selection_params is None:
             self._calculate_statistics(corr_function, selection_params,self._repository_metadata)
@@ -67,35 +76,50 @@ class InputIterator:
         else:
             raise ValueError("Either corr_function and selection_params are defined, or are both None")
 
-    def _calculate_size(self) -> int:
-        """Calculates the size of the input by time instances
-
-        Returns:
-            int: size of the input
+    def _materialize(self) -> None:
+        """Reads every time instance of the input that is not a gap, in order, into a single block
+        per data variable (where the first dimension is the time variation dimension). Every
+        iteration then returns views of the rows of these blocks, without indexing the input files
+        again, which are closed afterwards
         """
-        res: int = 0
+        time_variation_dim: str = self._repository_metadata.time_variation_dim
+        instances: List[xarray.Dataset] = []
         date: np.datetime64
         for dataset in self._input:
             if self._is_coord_scalar(dataset):
                 date = self._get_date_of_dataset_with_single_time_instance(dataset)
                 if not self._repository_metadata.time_gap_container.is_gap(date, self._used_data_vars):
-                    res += 1
+                    instances.append(dataset)
                 else:
                     logging.warning("Skipped date value " + str(date) + " as it represents a gap in the dataset")
             else:
-                date = dataset.coords[self._repository_metadata.time_initial_dim].values #type: ignore
-
-                steps: npt.NDArray[np.timedelta64] = \
-                    dataset.coords[self._repository_metadata.time_variation_dim].values
-
+                steps: npt.NDArray[np.timedelta64] = dataset.coords[time_variation_dim].values
+                init_value: np.datetime64 = \
+                    dataset.coords[self._repository_metadata.time_initial_dim].values #type: ignore
                 for step in steps:
-                    if not self._repository_metadata.time_gap_container.is_gap(date + step, self._used_data_vars):
-                        res += 1
+                    date = init_value + step
+                    if not self._repository_metadata.time_gap_container.is_gap(date,self._used_data_vars):
+                        instances.append(dataset.sel({time_variation_dim: step}))
                     else:
                         logging.warning("Skipped date value " + str(date) + " as it represents a gap in the dataset")
-        return res
-    
-    
+
+        time_intervals: List[int] = []
+        time_interval_index: int = 0
+        time_interval_value: int
+        for _ in instances:
+            time_interval_index, time_interval_value = self._calculate_next_time_interval(time_interval_index)
+            time_intervals.append(time_interval_value)
+        self._time_intervals_array = np.array(time_intervals, dtype=np.int64)
+
+        if len(instances) > 0:
+            for var in instances[0].data_vars:
+                self._blocks[str(var)] = xarray.concat([instance[var] for instance in instances], 
+                    dim=time_variation_dim).load()
+            #selecting a single row of a block in memory returns a view of it
+            block_dataset: xarray.Dataset = xarray.Dataset(self._blocks)
+            self._instances = [block_dataset.isel({time_variation_dim: i}) for i in range(len(instances))]
+        self.close()
+
     def _calculate_statistics(self, corr_function: CorrelationFunction, selection_params: Dict[str,Any], 
         repository_metadata:RepositoryMetadata) -> None:
         """Calculates the statistics of the input files
@@ -105,28 +129,11 @@ class InputIterator:
             selection_params (Dict[str,Any]): parameters that are going to be used to create the candidate (no longer used)
             repository_metadata (RepositoryMetadata): metadata of the repository
         """
-        var_stats: Dict[str, CorrelationStatistics] = {}
-        for dataset_full in self._input:
-            if self._is_coord_scalar(dataset_full):
-                var_stats = {}
-                for var in self._used_data_vars:
-                    var_stats[var] = corr_function.setup_stats(dataset_full.to_array(),repository_metadata,var)
-
-                self._input_statistics.append(
-                    (dataset_full.sel(selection_params),var_stats))
-            else:
-                steps: npt.NDArray[np.timedelta64] = \
-                    dataset_full.coords[self._repository_metadata.time_variation_dim].values
-                for step in steps:
-                    params: Dict[str,Any] = {}
-                    var_stats = {}
-                    params[self._repository_metadata.time_variation_dim] = step
-                    
-                    for var in self._used_data_vars:
-                        var_stats[var] = corr_function.setup_stats(dataset_full.sel(params).to_array(),repository_metadata,var)
-
-                    self._input_statistics.append(
-                        (dataset_full.sel(params).sel(selection_params),var_stats))
+        for instance in self._instances:
+            var_stats: Dict[str, CorrelationStatistics] = {}
+            for var in self._used_data_vars:
+                var_stats[var] = corr_function.setup_input_stats(instance.to_array(),repository_metadata,var)
+            self._input_statistics.append((instance.sel(selection_params),var_stats))
 
     def _calculate_next_time_interval(self, time_interval_index:int) -> Tuple[int,int]:
         """
@@ -155,33 +162,8 @@ class InputIterator:
             Iterator[Tuple[xarray.Dataset,int]]: pair with the intended Dataset object and the 
             interval of time in numbers of timestamp between the returned timestamp and the next timestamp
         """
-        date: np.datetime64
-        time_interval_index: int = 0
-        time_interval_value: int = 0
-
-        for dataset in self._input:
-            if self._is_coord_scalar(dataset):
-                date = self._get_date_of_dataset_with_single_time_instance(dataset)
-                if not self._repository_metadata.time_gap_container.is_gap(date, self._used_data_vars):
-                    time_interval_index, time_interval_value = self._calculate_next_time_interval(time_interval_index)
-                    yield (dataset, time_interval_value)
-                else:
-                    logging.warning("Skipped date value " + str(date) + " as it represents a gap in the dataset")
-            else:
-                steps: npt.NDArray[np.timedelta64] = \
-                    dataset.coords[self._repository_metadata.time_variation_dim].values
-                init_value: np.datetime64 = \
-                    dataset.coords[self._repository_metadata.time_initial_dim].values #type: ignore
-                for step in steps:
-                    params: Dict[str,Any] = {}
-                    params[self._repository_metadata.time_variation_dim] = step
-                    
-                    date = init_value + step
-                    if not self._repository_metadata.time_gap_container.is_gap(date,self._used_data_vars):
-                        time_interval_index, time_interval_value = self._calculate_next_time_interval(time_interval_index)
-                        yield (dataset.sel(params), time_interval_value)
-                    else:
-                        logging.warning("Skipped date value " + str(date) + " as it represents a gap in the dataset")
+        for instance, time_interval in zip(self._instances, self._time_intervals):
+            yield (instance, time_interval)
 
     def iterate_with_statistics(self) -> Iterator[Tuple[xarray.Dataset, Dict[str,CorrelationStatistics],int]]:
         """Iterates the input files together with its respective statistics object
@@ -190,32 +172,52 @@ class InputIterator:
             Iterator[Tuple[xarray.Dataset, Dict[str,CorrelationStatistics],int]]: the Dataset object together
             with its statistics and the time gap in number timestamps from the next input file
         """
-        date: np.datetime64
-        time_interval_index: int = 0
-        time_interval_value: int = 0
+        for ds_stats_pair, time_interval in zip(self._input_statistics, self._time_intervals):
+            yield (ds_stats_pair[0], ds_stats_pair[1], time_interval)
 
-        for ds_stats_pair in self._input_statistics:
-            if self._is_coord_scalar(ds_stats_pair[0]):
-                date = self._get_date_of_dataset_with_single_time_instance(ds_stats_pair[0])
-                if not self._repository_metadata.time_gap_container.is_gap(date, self._used_data_vars):
-                    time_interval_index, time_interval_value = self._calculate_next_time_interval(time_interval_index)
-                    yield (ds_stats_pair[0], ds_stats_pair[1], time_interval_value)
-                else:
-                    logging.warning("Skipped date value " + str(date) + " as it represents a gap in the dataset")
-            else:
-                steps: npt.NDArray[np.timedelta64] = \
-                    ds_stats_pair[0].coords[self._repository_metadata.time_variation_dim].values
-                init_value: np.datetime64 = \
-                    ds_stats_pair[0].coords[self._repository_metadata.time_initial_dim].values #type: ignore
-                for step in steps:
-                    params: Dict[str,Any] = {}
-                    params[self._repository_metadata.time_variation_dim] = step
-                    date = init_value + step
-                    if not self._repository_metadata.time_gap_container.is_gap(date,self._used_data_vars):
-                        time_interval_index, time_interval_value = self._calculate_next_time_interval(time_interval_index)
-                        yield (ds_stats_pair[0].sel(params), ds_stats_pair[1], time_interval_value)
-                    else:
-                        logging.warning("Skipped date value " + str(date) + " as it represents a gap in the dataset")
+    def get_prepared_inputs(self, corr_function: CorrelationFunction, var: str) -> List[PreparedInput]:
+        """Returns every time instance of the input prepared by the correlation function, in the 
+        same order as "iterate". The inputs are only prepared once
+
+        Args:
+            corr_function (CorrelationFunction): used correlation function
+            var (str): data variable to be prepared
+
+        Returns:
+            List[PreparedInput]: prepared inputs
+        """
+        key: Tuple[str, str] = (corr_function.corr_func_name, var)
+        if not key in self._prepared_inputs:
+            self._prepared_inputs[key] = [corr_function.prepare_input(input_tuple[0][var], self._repository_metadata, var) 
+                for input_tuple in self.iterate()]
+        return self._prepared_inputs[key]
+
+    def get_time_intervals(self) -> List[int]:
+        """Returns the time interval of every time instance of the input, in the same order as "iterate"
+
+        Returns:
+            List[int]: interval of time in number of timestamps between each time instance and the next one
+        """
+        return self._time_intervals
+
+    @property
+    def time_intervals(self) -> npt.NDArray[np.int64]:
+        """Time interval of every time instance of the input (see "get_time_intervals")"""
+        return self._time_intervals_array
+
+    def to_block(self, var: str) -> xarray.DataArray:
+        """Returns all time instances of the input, in the same order as "iterate", stacked
+        into a single block where the first dimension is the time variation dimension
+
+        Args:
+            var (str): data variable of the block
+
+        Returns:
+            xarray.DataArray: block with one row per time instance
+        """
+        if not var in self._blocks:
+            raise ValueError("Data variable " + var + " is not part of the input")
+        return self._blocks[var]
 
     @property
     def size(self) -> int:
@@ -230,13 +232,19 @@ class ResultContainer:
     """Container for the similarity results
     """
 
-    def __init__(self, value: float):
+    def __init__(self, value: float, sum_counter: int = 1):
         self._value: float = value
-        self._sum_counter: int = 1
+        self._sum_counter: int = sum_counter
+
+    def add_value(self, value: float, sum_counter: int = 1) -> None:
+        """Sums the calculated similarity value into the already existing value
 
-    def add_value(self, value: float) -> None:
+        Args:
+            value (float): similarity value (or the sum of several similarity values)
+            sum_counter (int, optional): number of similarity values that were summed. Defaults to 1.
+        """
         self._value += value
-        self._sum_counter += 1
+        self._sum_counter += sum_counter
 
     @property
     def value(self) -> float:
@@ -250,6 +258,320 @@ class ResultContainer:
         return "{ Value: " + str(self._value) + \
         ", Sum Counter: " + str(self._sum_counter) + "}"
 
+
+class ResultStore(MutableMapping[str, ResultContainer]):
+    """Similarity results of every candidate, kept in two arrays (the sum of the similarity values and
+    the number of summed values) indexed by the time offset of the candidate from the first stored
+    timestamp, in multiples of a time resolution. The search only works with these arrays, so the
+    timestamps are only converted into strings when the results are read by key (like a dictionary of
+    "ResultContainer" objects).
+
+    The arrays grow as needed, and the resolution is reduced when a timestamp does not fall in it.
+    The containers returned by the store are copies, the results are changed with "add",
+    "add_values" or by assigning a new container to the timestamp.
+    """
+
+    def __init__(self, resolution: Optional[np.timedelta64] = None) -> None:
+        """
+        Args:
+            resolution (Optional[np.timedelta64], optional): expected difference between timestamps (usually
+            the step of the repositories). Defaults to None (obtained from the first timestamps).
+        """
+        self._origin: Optional[np.datetime64] = None
+        self._resolution: int = 0 if resolution is None else \
+            int(np.timedelta64(resolution, "ns").astype(np.int64)) #nanoseconds, 0 while unknown
+        self._start: int = 0 #offset (in resolutions from the origin) of the first position of the arrays
+        self._values: npt.NDArray[np.float64] = np.zeros(0)
+        self._counters: npt.NDArray[np.int64] = np.zeros(0, dtype=np.int64)
+
+    def _to_timestamps(self, timestamps: Any) -> npt.NDArray[np.datetime64]:
+        return np.asarray(timestamps, dtype="datetime64[ns]").ravel()
+
+    def _rescale(self, resolution: int) -> None:
+        """Reduces the resolution of the arrays (which must divide the current resolution)"""
+        if self._resolution != 0 and len(self._values) > 0:
+            factor: int = self._resolution // resolution
+            values: npt.NDArray[np.float64] = np.zeros((len(self._values) - 1) * factor + 1)
+            counters: npt.NDArray[np.int64] = np.zeros(len(values), dtype=np.int64)
+            values[::factor] = self._values
+            counters[::factor] = self._counters
+            self._values, self._counters = values, counters
+            self._start *= factor
+        self._resolution = resolution
+
+    def _positions(self, timestamps: npt.NDArray[np.datetime64]) -> npt.NDArray[np.int64]:
+        """Returns the position of every timestamp in the arrays, which are extended to contain them
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): timestamps (one dimension, in nanoseconds)
+
+        Returns:
+            npt.NDArray[np.int64]: position of every timestamp
+        """
+        if len(timestamps) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self._origin is None:
+            self._origin = timestamps[0]
+        deltas: npt.NDArray[np.int64] = (timestamps - self._origin).astype(np.int64)
+        resolution: int = int(np.gcd(self._resolution, np.gcd.reduce(deltas)))
+        if resolution != self._resolution:
+            self._rescale(resolution)
+        offsets: npt.NDArray[np.int64] = deltas // max(self._resolution, 1)
+
+        #the arrays grow at least to double their size, in the direction of the new timestamps
+        low: int = int(offsets.min())
+        high: int = int(offsets.max()) + 1
+        end: int = self._start + len(self._values)
+        if low < self._start or high > end or len(self._values) == 0:
+            if len(self._values) == 0:
+                new_start, new_end = low, high
+            else:
+                new_start = min(self._start, low if low >= self._start else low - len(self._values))
+                new_end = max(end, high if high <= end else high + len(self._values))
+            values: npt.NDArray[np.float64] = np.zeros(new_end - new_start)
+            counters: npt.NDArray[np.int64] = np.zeros(new_end - new_start, dtype=np.int64)
+            values[self._start - new_start:end - new_start] = self._values
+            counters[self._start - new_start:end - new_start] = self._counters
+            self._values, self._counters, self._start = values, counters, new_start
+        return offsets - self._start
+
+    def _find(self, timestamp: np.datetime64) -> Optional[int]:
+        """Returns the position of a stored timestamp or None if it is not stored"""
+        if self._origin is None:
+            return None
+        delta: int = int((np.datetime64(timestamp, "ns") - self._origin).astype(np.int64))
+        if delta % max(self._resolution, 1) != 0 or (self._resolution == 0 and delta != 0):
+            return None
+        position: int = delta // max(self._resolution, 1) - self._start
+        if position < 0 or position >= len(self._values) or self._counters[position] == 0:
+            return None
+        return position
+
+    def add_values(self, timestamps: npt.NDArray[np.datetime64], values: npt.NDArray[np.float64],
+        sum_counters: Optional[npt.NDArray[np.int64]] = None) -> None:
+        """Sums the similarity values into the results of the timestamps. The values of the same
+        timestamp are summed before being added to the result
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): timestamp of every value
+            values (npt.NDArray[np.float64]): similarity values (or sums of several similarity values)
+            sum_counters (Optional[npt.NDArray[np.int64]], optional): number of similarity values summed in
+            each value. Defaults to None (one per value).
+        """
+        positions: npt.NDArray[np.int64] = self._positions(self._to_timestamps(timestamps))
+        if len(positions) == 0:
+            return
+        low: int = int(positions.min())
+        high: int = int(positions.max()) + 1
+        self._values[low:high] += np.bincount(positions - low, weights=np.ravel(values), minlength=high - low)
+        self._counters[low:high] += np.bincount(positions - low, 
+            weights=None if sum_counters is None else np.ravel(sum_counters), minlength=high - low).astype(np.int64)
+
+    def add(self, timestamp: np.datetime64, value: float, sum_counter: int = 1) -> None:
+        """Sums a similarity value into the result of the timestamp
+
+        Args:
+            timestamp (np.datetime64): timestamp of the result
+            value (float): similarity value
+            sum_counter (int, optional): number of similarity values that were summed. Defaults to 1.
+        """
+        position: int = int(self._positions(self._to_timestamps(timestamp))[0])
+        self._values[position] += value
+        self._counters[position] += sum_counter
+
+    def select(self, timestamps: npt.NDArray[np.datetime64]) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+        """Returns the results of the given (stored) timestamps
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): stored timestamps
+
+        Returns:
+            Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]: sum of the values and number of summed values
+        """
+        positions: npt.NDArray[np.int64] = self._positions(self._to_timestamps(timestamps))
+        return self._values[positions], self._counters[positions]
+
+    def pop_complete(self, timestamps: npt.NDArray[np.datetime64], input_size: int) -> \
+        Tuple[npt.NDArray[np.datetime64], npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+        """Removes the results of the given timestamps that are complete
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): timestamps to be verified (without repetitions)
+            input_size (int): number of values of a complete result
+
+        Returns:
+            Tuple[npt.NDArray[np.datetime64], npt.NDArray[np.float64], npt.NDArray[np.int64]]: timestamps,
+            sum of the values and number of summed values of the removed results
+        """
+        timestamps = self._to_timestamps(timestamps)
+        positions: npt.NDArray[np.int64] = self._positions(timestamps)
+        complete: npt.NDArray[np.bool_] = self._counters[positions] >= input_size
+        positions = positions[complete]
+        res = (timestamps[complete], self._values[positions], self._counters[positions])
+        self._values[positions] = 0.0
+        self._counters[positions] = 0
+        return res
+
+    def merge(self, other: "ResultStore") -> npt.NDArray[np.datetime64]:
+        """Sums the results of another store (for example, of a file searched by another process)
+
+        Args:
+            other (ResultStore): results to be added
+
+        Returns:
+            npt.NDArray[np.datetime64]: timestamps of the added results
+        """
+        timestamps: npt.NDArray[np.datetime64] = other.timestamps
+        self.add_values(timestamps, other.sum_values, other.sum_counters)
+        return timestamps
+
+    def _stored(self) -> npt.NDArray[np.bool_]:
+        return self._counters != 0
+
+    @property
+    def timestamps(self) -> npt.NDArray[np.datetime64]:
+        """Timestamps of the stored results, in chronological order"""
+        if self._origin is None:
+            return np.zeros(0, dtype="datetime64[ns]")
+        offsets: npt.NDArray[np.int64] = np.flatnonzero(self._stored()) + self._start
+        return self._origin + (offsets * self._resolution).astype("timedelta64[ns]")
+
+    @property
+    def sum_values(self) -> npt.NDArray[np.float64]:
+        """Sum of the similarity values of the stored results (in the same order as "timestamps")"""
+        return self._values[self._stored()]
+
+    @property
+    def sum_counters(self) -> npt.NDArray[np.int64]:
+        """Number of summed values of the stored results (in the same order as "timestamps")"""
+        return self._counters[self._stored()]
+
+    def __getitem__(self, key: str) -> ResultContainer:
+        position: Optional[int] = self._find(np.datetime64(key, "ns"))
+        if position is None:
+            raise KeyError(key)
+        return ResultContainer(float(self._values[position]), int(self._counters[position]))
+
+    def __setitem__(self, key: str, result: ResultContainer) -> None:
+        position: int = int(self._positions(self._to_timestamps(key))[0])
+        self._values[position] = result.value
+        self._counters[position] = result.sum_counter
+
+    def __delitem__(self, key: str) -> None:
+        position: Optional[int] = self._find(np.datetime64(key, "ns"))
+        if position is None:
+            raise KeyError(key)
+        self._values[position] = 0.0
+        self._counters[position] = 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(np.datetime_as_string(self.timestamps).tolist())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._stored()))
+
+
+def results_to_arrays(results: Mapping[str, ResultContainer]) -> \
+    Tuple[List[str], npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """Returns the timestamps (as strings), the sum of the values and the number of summed values of
+    the results. The arrays of a "ResultStore" are read directly, so the timestamps are only converted
+    into strings once, when the results are sent
+
+    Args:
+        results (Mapping[str, ResultContainer]): results of a search
+
+    Returns:
+        Tuple[List[str], npt.NDArray[np.float64], npt.NDArray[np.int64]]: timestamps, values and 
+        sum counters of the results
+    """
+    if isinstance(results, ResultStore):
+        return np.datetime_as_string(results.timestamps).tolist(), results.sum_values, results.sum_counters
+    timestamps: List[str] = list(results)
+    return timestamps, np.array([results[ts].value for ts in timestamps], dtype=np.float64), \
+        np.array([results[ts].sum_counter for ts in timestamps], dtype=np.int64)
+
+
+class TopNResults:
+    """Keeps the N complete results with the best final similarity value (the value divided by the
+    number of summed values). The results are kept in a heap whose root is the worst kept result, so
+    every insertion costs O(log N) and the results can be added while the search is executed
+    """
+
+    def __init__(self, num_results: int, corr_function: CorrelationFunction) -> None:
+        """
+        Args:
+            num_results (int): number of wanted results
+            corr_function (CorrelationFunction): used correlation function
+        """
+        self._num_results: int = num_results
+        self._reverse_order: bool = corr_function.is_reverse_order()
+        #(heap value, insertion order, timestamp, result). When the values are the same, the last
+        # inserted result is the first to be removed. Missing values are always the worst
+        self._heap: List[Tuple[float, int, Union[str, np.datetime64], ResultContainer]] = []
+        self._counter: int = 0
+
+    @property
+    def num_results(self) -> int:
+        return self._num_results
+
+    def _heap_value(self, value: float) -> float:
+        if np.isnan(value):
+            return -np.inf
+        return value if self._reverse_order else -value
+
+    def add(self, timestamp: Union[str, np.datetime64], result: ResultContainer) -> None:
+        """Adds a complete result, which is only kept if it is one of the best N results
+
+        Args:
+            timestamp (Union[str, np.datetime64]): timestamp of the result
+            result (ResultContainer): complete result
+        """
+        elem: Tuple[float, int, Union[str, np.datetime64], ResultContainer] = \
+            (self._heap_value(result.value / result.sum_counter), -self._counter, timestamp, result)
+        self._counter += 1
+        if len(self._heap) < self._num_results:
+            heapq.heappush(self._heap, elem)
+        elif elem[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, elem)
+
+    def add_values(self, timestamps: npt.NDArray[np.datetime64], values: npt.NDArray[np.float64],
+        sum_counters: npt.NDArray[np.int64]) -> None:
+        """Adds several complete results (see "ResultStore.pop_complete"), in the given order
+
+        Args:
+            timestamps (npt.NDArray[np.datetime64]): timestamps of the results
+            values (npt.NDArray[np.float64]): sum of the similarity values of every result
+            sum_counters (npt.NDArray[np.int64]): number of summed values of every result
+        """
+        final_values: npt.NDArray[np.float64] = values / sum_counters
+        heap_values: npt.NDArray[np.float64] = np.where(np.isnan(final_values), -np.inf,
+            final_values if self._reverse_order else -final_values)
+        #when the heap is full, only the results better than its worst result can be kept
+        candidates: npt.NDArray[np.int64] = np.arange(len(heap_values))
+        if len(self._heap) >= self._num_results:
+            candidates = candidates[heap_values > self._heap[0][0]]
+        for index in candidates.tolist():
+            self.add(timestamps[index], ResultContainer(float(values[index]), int(sum_counters[index])))
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """Final similarity value of the N-th best result or None if there are not N results yet"""
+        if len(self._heap) < self._num_results:
+            return None
+        value: float = self._heap[0][0]
+        return value if self._reverse_order else -value
+
+    def to_dict(self) -> Dict[str, ResultContainer]:
+        """Returns the kept results, from the best to the worst
+
+        Returns:
+            Dict[str, ResultContainer]: results by timestamp
+        """
+        return {str(elem[2]): elem[3] for elem in sorted(self._heap, reverse=True)}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
 class CandidateContainer:
     """Container for the similarity range results
     Used to track the current accumulated similarity value, but also
@@ -291,6 +613,18 @@ class CandidateContainer:
         self._best_value += best_value
         self._worst_value += worst_value
 
+    def merge(self, other: "CandidateContainer") -> None:
+        """Sums the values of a candidate calculated separately (for example, in another file
+        searched by another process) into the already existing values
+
+        Args:
+            other (CandidateContainer): candidate with the same timestamp
+        """
+        self._best_value += other._best_value
+        self._worst_value += other._worst_value
+        for var, count in other._sum_counter.items():
+            self._sum_counter[var] = self._sum_counter.get(var, 0) + count
+
     @property
     def best_value(self) -> float:
         return self._best_value
@@ -341,51 +675,74 @@ class CandidateContainer:
             return False
 
 
+class _RankedCandidate:
+    """Candidate of the list of candidates, ordered by worst value and, when the worst values are
+    the same, by insertion order. The comparison is inverted ("a < b" when "a" ranks after "b"),
+    so that the root of a heap is always the candidate that ranks last
+    """
+    __slots__ = ("datetime", "container", "order", "_corr_func")
+
+    def __init__(self, datetime: np.datetime64, container: CandidateContainer, order: int,
+        corr_func: CorrelationFunction) -> None:
+        self.datetime: np.datetime64 = datetime
+        self.container: CandidateContainer = container
+        self.order: int = order
+        self._corr_func: CorrelationFunction = corr_func
+
+    def __lt__(self, other: "_RankedCandidate") -> bool:
+        if self._corr_func.compare(self.container.worst_value, other.container.worst_value):
+            return True
+        if self._corr_func.compare(other.container.worst_value, self.container.worst_value):
+            return False
+        return self.order > other.order
+
+
 class CandidateListManager:
-    """Class responsible for managing the existing candidate list"""
+    """Class responsible for managing the existing candidate list
+
+    The candidates are ranked by worst value. The best "top_res" candidates are kept in a heap whose
+    root is the "top_res"-th candidate (its worst value is the threshold to enter the list) and the
+    remaining ones in a heap whose root is the last candidate, which is removed while its best value is
+    worse than the threshold. Both insertions and removals cost O(log n)
+    """
 
     def __init__(self, used_correlation_function: CorrelationFunction, top_res: int) -> None:
-        # structure of the elements of the list: timestamp, best value, worst value
-        self._list: List[Tuple[np.datetime64, CandidateContainer]] = []
+        self._top: List[_RankedCandidate] = []
+        self._remaining: List[_RankedCandidate] = []
         self._corr_func: CorrelationFunction = used_correlation_function
         self._top_res: int = top_res
+        self._counter: int = 0
 
-    def _pop_if_worst_interval(self) -> bool:
-        """Removes the last element in the list if it's best value is worse
-        than the worst value in the "top_res" position 
-
-        Returns:
-            bool: True if the item was removed
+    def _pop_worst_intervals(self) -> None:
+        """Removes the last candidates while their best value is worse than the worst 
+        value in the "top_res" position 
         """
-        if len(self._list) <= self._top_res:
-            return False
-        else:
-            last_elem_best_val: float = self._list[-1][1].best_value
-            top_res_n_worst_val: float = self._list[self._top_res-1][1].worst_value
+        top_res_n_worst_val: float = self._top[0].container.worst_value
+        while len(self._remaining) > 0:
+            last_elem_best_val: float = self._remaining[0].container.best_value
             if self._corr_func.compare(last_elem_best_val, top_res_n_worst_val) and \
                 last_elem_best_val != top_res_n_worst_val:
-                self._list.pop()
-                return True
+                heapq.heappop(self._remaining)
             else:
-                return False
-    
+                break
+
     def _insert_sorted(self, value: Tuple[np.datetime64, CandidateContainer]) -> None:
-        """Inserts the element inside the list of candidates and sorts it by
-        worst similarity value
+        """Inserts the element inside the list of candidates, ranked by worst similarity value
 
         Args:
-            value (Tuple[np.datetime64, float, float]): value to be inserted
+            value (Tuple[np.datetime64, CandidateContainer]): value to be inserted
         """
-        self._list.append(value)
-        for i in range(len(self._list)-1, 0, -1):
-            if self._corr_func.compare(self._list[i-1][1].worst_value,self._list[i][1].worst_value):
-                self._list[i-1],self._list[i] = self._list[i],self._list[i-1]
-            else:
-                break
-
-        for i in range(len(self._list), self._top_res, -1):
-            if not self._pop_if_worst_interval():
-                break
+        elem: _RankedCandidate = _RankedCandidate(value[0], value[1], self._counter, self._corr_func)
+        self._counter += 1
+        if len(self._top) < self._top_res:
+            heapq.heappush(self._top, elem)
+            return
+        if self._top[0] < elem:
+            #the new candidate enters the best "top_res", moving the previous last one to the remaining
+            heapq.heappush(self._remaining, heapq.heapreplace(self._top, elem))
+        else:
+            heapq.heappush(self._remaining, elem)
+        self._pop_worst_intervals()
 
     def add_value(self, datetime: np.datetime64, candidate_container: CandidateContainer) -> None:
         """Adds the value to the list of candidates, if it should be added
@@ -395,35 +752,40 @@ class CandidateListManager:
             best_value (float): best calculated similarity value
             worst_value (float): worst calculated similarity value
         """
-        if len(self._list) < self._top_res:
+        if len(self._top) < self._top_res:
             self._insert_sorted((datetime,candidate_container))
         else:
-            top_res_n_worst_val: float = self._list[self._top_res-1][1].worst_value
+            top_res_n_worst_val: float = self._top[0].container.worst_value
             if self._corr_func.compare(top_res_n_worst_val, candidate_container.best_value) or \
                 top_res_n_worst_val == candidate_container.best_value:
                 self._insert_sorted((datetime,candidate_container))
 
+    def _sorted_list(self) -> List[_RankedCandidate]:
+        #every candidate in the best "top_res" ranks before the remaining ones
+        return sorted(self._top, reverse=True) + sorted(self._remaining, reverse=True)
+
     def get_results(self) -> Iterator[np.datetime64]:
         """Returns the datetime values remaining in the list of candidates
 
         Yields:
             Iterator[np.datetime64]: Iterator with the existing values
         """
-        for elem in self._list:
-            yield elem[0]
+        for elem in self._sorted_list():
+            yield elem.datetime
 
     def to_dict(self) -> Dict[np.datetime64, CandidateContainer]:
         res: Dict[np.datetime64, CandidateContainer] = {}
-        for elem in self._list:
-            res[elem[0]] = elem[1]
+        for elem in self._sorted_list():
+            res[elem.datetime] = elem.container
         return res
 
 
     def __str__(self) -> str:
         res: str = "Obtained results:\n"
 
-        for ts in self._list:
-            res += str(ts) + "\n"
-        res += "Total_size: " + str(len(self._list))
+        sorted_list: List[_RankedCandidate] = self._sorted_list()
+        for ts in sorted_list:
+            res += str((ts.datetime, ts.container)) + "\n"
+        res += "Total_size: " + str(len(sorted_list))
         
         return res
\ No newline at end of file
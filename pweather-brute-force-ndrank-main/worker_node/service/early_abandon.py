@@ -0,0 +1,167 @@
+import heapq
+from typing import Final, List, Optional
+import numpy as np
+import numpy.typing as npt
+from correlation_functions.main_structure import CorrelationFunction
+
+"""When only the best N results are wanted, the comparisons of a candidate can be
+abandoned as soon as a bound of its similarity value is already worse than the N-th
+best complete candidate found so far. A candidate is only abandoned when all of its
+comparisons belong to the file being searched, so that no partial value of it is
+ever returned (partial values are completed by other workers).
+"""
+
+DEFAULT_EARLY_ABANDON_BLOCK_SIZE: Final = 16384
+
+class EarlyAbandonSettings:
+    """Number of grid points summed before the bounds are verified (0 disables the early abandon)
+    """
+    def __init__(self, block_size: int = DEFAULT_EARLY_ABANDON_BLOCK_SIZE) -> None:
+        self._block_size: int
+        self.block_size = block_size
+
+    @property
+    def block_size(self) -> int:
+        return self._block_size
+
+    @block_size.setter
+    def block_size(self, block_size: int) -> None:
+        if block_size < 0:
+            raise ValueError("The block size of the early abandon can not be negative")
+        self._block_size = block_size
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._block_size > 0
+
+
+#settings shared by all services of the process
+early_abandon_settings: Final = EarlyAbandonSettings()
+
+class CandidateThreshold:
+    """Keeps the similarity values of the best N complete candidates found so far
+    """
+    def __init__(self, num_results: int, corr_function: CorrelationFunction) -> None:
+        """
+        Args:
+            num_results (int): number of wanted results
+            corr_function (CorrelationFunction): used correlation function
+        """
+        self._num_results: int = num_results
+        self._reverse_order: bool = corr_function.is_reverse_order()
+        #the values are stored so that the root of the heap is always the worst kept value
+        self._values: List[float] = []
+
+    def add(self, value: float) -> None:
+        """Adds the similarity value of a complete candidate
+
+        Args:
+            value (float): final similarity value of the candidate (already divided by the number of values)
+        """
+        if np.isnan(value):
+            return
+        heap_value: float = value if self._reverse_order else -value
+        if len(self._values) < self._num_results:
+            heapq.heappush(self._values, heap_value)
+        elif heap_value > self._values[0]:
+            heapq.heapreplace(self._values, heap_value)
+
+    def add_values(self, values: npt.NDArray[np.float64]) -> None:
+        """Adds the similarity values of several complete candidates
+
+        Args:
+            values (npt.NDArray[np.float64]): final similarity values of the candidates
+        """
+        heap_values: npt.NDArray[np.float64] = values[~np.isnan(values)]
+        if not self._reverse_order:
+            heap_values = -heap_values
+        #when the heap is full, only the values better than its worst value can be kept
+        if len(self._values) >= self._num_results:
+            heap_values = heap_values[heap_values > self._values[0]]
+        for heap_value in heap_values.tolist():
+            if len(self._values) < self._num_results:
+                heapq.heappush(self._values, heap_value)
+            elif heap_value > self._values[0]:
+                heapq.heapreplace(self._values, heap_value)
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """Similarity value of the N-th best candidate or None if there are not N complete candidates yet"""
+        if len(self._values) < self._num_results:
+            return None
+        return self._values[0] if self._reverse_order else -self._values[0]
+
+    def is_excluded(self, bounds: npt.NDArray[np.float64]) -> npt.NDArray[np.bool_]:
+        """Verifies which candidates can no longer be part of the best N results
+
+        Args:
+            bounds (npt.NDArray[np.float64]): best value each candidate can still obtain
+
+        Returns:
+            npt.NDArray[np.bool_]: True for the candidates whose bound is worse than the threshold
+        """
+        threshold: Optional[float] = self.threshold
+        if threshold is None:
+            return np.zeros(bounds.shape, dtype=np.bool_)
+        return bounds < threshold if self._reverse_order else bounds > threshold
+
+
+class EarlyAbandonScan:
+    """Tracks the candidates of a single file during the calculation of the similarity values
+    of every data variable ("CorrelationFunction.calculate_batch_early_abandon")
+    """
+    def __init__(self, keys: npt.NDArray[np.datetime64], num_data_vars: int, threshold: CandidateThreshold) -> None:
+        """
+        Args:
+            keys (npt.NDArray[np.datetime64]): candidate timestamp of every comparison (dates, input instances)
+            num_data_vars (int): number of searched data variables
+            threshold (CandidateThreshold): best complete candidates of the search
+        """
+        self._shape: tuple = keys.shape
+        self._num_data_vars: int = num_data_vars
+        self._threshold: CandidateThreshold = threshold
+        self._inverse: npt.NDArray[np.int64]
+        self._keys, self._inverse = np.unique(keys.ravel(), return_inverse=True)
+        #only the candidates with every input instance in the file can be abandoned
+        self._complete: npt.NDArray[np.bool_] = np.bincount(self._inverse) == keys.shape[1]
+        self._known_sums: npt.NDArray[np.float64] = np.zeros(len(self._keys))
+        self._abandoned: npt.NDArray[np.bool_] = np.zeros(len(self._keys), dtype=np.bool_)
+
+    def abandoned_cells(self, bounds: npt.NDArray[np.float64]) -> npt.NDArray[np.bool_]:
+        """Updates the abandoned candidates with the bounds of the data variable being calculated
+
+        Args:
+            bounds (npt.NDArray[np.float64]): bound of every comparison (dates, input instances)
+
+        Returns:
+            npt.NDArray[np.bool_]: comparisons (dates, input instances) of the abandoned candidates
+        """
+        candidate_bounds: npt.NDArray[np.float64] = self._known_sums + \
+            np.bincount(self._inverse, weights=bounds.ravel() / self._num_data_vars, minlength=len(self._keys))
+        #the value of a complete candidate is divided by the number of summed values
+        candidate_bounds /= self._shape[1] * self._num_data_vars
+        self._abandoned |= self._complete & self._threshold.is_excluded(candidate_bounds)
+        return self._abandoned[self._inverse].reshape(self._shape)
+
+    def add_values(self, values: npt.NDArray[np.float64]) -> None:
+        """Adds the final values of a data variable, which become part of the bounds of the next ones
+
+        Args:
+            values (npt.NDArray[np.float64]): similarity values (dates, input instances), NaN if abandoned
+        """
+        self._known_sums += np.bincount(self._inverse, weights=np.nan_to_num(values.ravel()) / self._num_data_vars,
+            minlength=len(self._keys))
+
+    @property
+    def valid_cells(self) -> npt.NDArray[np.bool_]:
+        """Comparisons (dates, input instances) of the candidates that were not abandoned"""
+        return ~self._abandoned[self._inverse].reshape(self._shape)
+
+    @property
+    def abandoned_keys(self) -> npt.NDArray[np.datetime64]:
+        return self._keys[self._abandoned]
+
+    @property
+    def complete_keys(self) -> npt.NDArray[np.datetime64]:
+        """Candidates (not abandoned) with every input instance in the file"""
+        return self._keys[self._complete & ~self._abandoned]
@@ -1,6 +1,7 @@
 from datetime import datetime
+import functools
 import logging
-from typing import Any, Dict, Final, Iterable, Iterator, List, Optional, Set, Tuple, Union, cast
+from typing import Any, Callable, Dict, Final, Iterable, Iterator, List, Optional, Set, Tuple, Union, cast
 import xarray
 import numpy as np
 import numpy.typing as npt
@@ -8,12 +9,17 @@ import pandas as pd
 from auxiliar.ts_logger import get_ts_debug_handler
 from auxiliar.xarray_aux import open_dataset_with_file_name
 from correlation_functions.main_structure import CorrelationFunction
+from correlation_functions.prepared_input import PreparedInput
 from repository.auxiliary_structures.dataset_indexer import DateContainer
+from repository.auxiliary_structures.field_statistics import FieldStatistics, FieldStatisticsSidecar
 from repository.auxiliary_structures.time_gap_container import TimeGapContainer
 from repository.repository_collection import RepositoryCollection
 from service.constants import SIMPLE_SERVICE
-from service.data_types import InputIterator, ResultContainer
-from service.service_main_structure import HeuristicResult, RequestParameters, ServiceLayer
+from service.data_types import InputIterator, ResultStore, TopNResults
+from service.early_abandon import CandidateThreshold, EarlyAbandonScan, early_abandon_settings
+from service.parallel_search import parallel_search_settings, search_files_in_parallel
+from service.service_main_structure import HeuristicResult, ProgressCallback, RequestParameters, SearchProgress, ServiceLayer
+from service.shared_scan import shared_scan, shared_scan_settings
 from auxiliar.component_injector import component_injector
 from repository.repository_layer import RepositoryLayer, RepositoryMetadata
 
@@ -53,21 +59,184 @@ class BruteForceService(ServiceLayer):
         return InputIterator(aux, self._repositories.get_metadata_by_data_var(data_var), 
                     request_params.search_data_var, request_params.input_step_difference)
 
+    def _calculate_batch_similarities(self, dataset: xarray.Dataset, steps: List[np.timedelta64], iterable: bool,
+        input_iterator_collection: Dict[str,InputIterator], input_blocks: Dict[str, xarray.DataArray],
+        data_vars: List[str], corr_function: CorrelationFunction, repository: RepositoryLayer, 
+        metadata: RepositoryMetadata, scan: Optional[EarlyAbandonScan] = None) -> Dict[str, npt.NDArray[np.float64]]:
+        """Calculates, for every data variable of the repository, the similarity between all given steps
+        of a file and all time instances of the input in a single call to the correlation function
+
+        Args:
+            dataset (xarray.Dataset): file of the dataset being searched
+            steps (List[np.timedelta64]): steps of the file that should be compared
+            iterable (bool): False if the file only has a single step (scalar coordinate)
+            input_iterator_collection (Dict[str,InputIterator]): input of each data variable
+            input_blocks (Dict[str, xarray.DataArray]): cache with the already stacked inputs
+            data_vars (List[str]): data variables being searched
+            corr_function (CorrelationFunction): correlation function being used
+            repository (RepositoryLayer): repository the file belongs to
+            metadata (RepositoryMetadata): metadata of the repository
+            scan (Optional[EarlyAbandonScan], optional): candidates of the file, given when the comparisons
+            of the candidates that can not be part of the best results should be abandoned. Defaults to None.
+
+        Returns:
+            Dict[str, npt.NDArray[np.float64]]: matrix (steps, input instances) for each data variable
+        (NaN in the abandoned comparisons). Data variables for which the batched calculation is not 
+        possible are not part of the result
+        """
+        res: Dict[str, npt.NDArray[np.float64]] = {}
+        if not corr_function.supports_batch or len(steps) == 0:
+            return res
+
+        time_variation_dim: str = metadata.time_variation_dim
+        dates: npt.NDArray[np.datetime64] = \
+            cast(npt.NDArray[np.datetime64], dataset.coords[metadata.time_initial_dim].values + np.array(steps))
+        for var in data_vars:
+            if not var in metadata.data_vars:
+                continue
+            if not var in input_blocks:
+                input_blocks[var] = input_iterator_collection[var].to_block(var)
+            input_block: xarray.DataArray = input_blocks[var]
+
+            dataset_block: xarray.DataArray = dataset[var]
+            if iterable:
+                dataset_block = dataset_block.sel({time_variation_dim: steps})
+            else:
+                dataset_block = dataset_block.expand_dims(time_variation_dim)
+            dataset_block = dataset_block.transpose(time_variation_dim, ...)
+
+            #the batched calculation requires both blocks to share the same grid (same coordinates in
+            # the same order, since the values are compared by position), otherwise the values are 
+            # calculated one by one
+            if set(dataset_block.dims) != set(input_block.dims) or \
+                any(dataset_block.sizes[dim] != input_block.sizes[dim] for dim in dataset_block.dims[1:]) or \
+                any(dim in dataset_block.indexes and dim in input_block.indexes and 
+                    not dataset_block.indexes[dim].equals(input_block.indexes[dim]) for dim in dataset_block.dims[1:]):
+                logging.debug("Input and dataset grids differ, batched calculation not used for " + var)
+                continue
+
+            field_statistics: Optional[FieldStatisticsSidecar] = repository.get_field_statistics(var)
+            dataset_statistics: Optional[FieldStatistics] = None if field_statistics is None \
+                else field_statistics.select(dates)
+            values: Optional[npt.NDArray[np.float64]] = None
+            if not scan is None:
+                values = corr_function.calculate_batch_early_abandon(dataset_block, input_block, metadata, var,
+                    scan.abandoned_cells, early_abandon_settings.block_size)
+            if values is None:
+                values = corr_function.calculate_batch(dataset_block, input_block, metadata, var, dataset_statistics,
+                    input_iterator_collection[var].get_prepared_inputs(corr_function, var))
+            if not scan is None:
+                scan.add_values(values)
+            res[var] = values
+        return res
+
+    def _calculate_candidate_keys(self, dates: npt.NDArray[np.datetime64], time_intervals: List[int],
+        step_variation: np.timedelta64, time_gaps: Union[RepositoryCollection, TimeGapContainer], 
+        data_vars: List[str], search_hours: Optional[List[int]]) -> npt.NDArray[np.datetime64]:
+        """Calculates the timestamp of the candidate to which each comparison between a date of the 
+        dataset and a time instance of the input contributes. The first time instance of the input is 
+        compared with the candidate timestamp itself, the following ones with the next timestamps 
+        (skipping the gaps and the given time intervals)
+
+        Args:
+            dates (npt.NDArray[np.datetime64]): compared dates of the dataset
+            time_intervals (List[int]): time interval of every time instance of the input
+            step_variation (np.timedelta64): difference between two consecutive timestamps
+            time_gaps (Union[RepositoryCollection, TimeGapContainer]): gaps of the repositories being searched
+            data_vars (List[str]): data variables being searched
+            search_hours (Optional[List[int]]): hours being searched (None if all hours are searched)
+
+        Returns:
+            npt.NDArray[np.datetime64]: matrix (dates, input instances) with the candidate timestamps
+        """
+        res: npt.NDArray[np.datetime64] = np.empty((len(dates), len(time_intervals)), dtype="datetime64[ns]")
+        keys: npt.NDArray[np.datetime64] = dates.astype("datetime64[ns]")
+        for input_index, input_interval in enumerate(time_intervals):
+            keys = keys - step_variation * input_interval
+            res[:, input_index] = keys
+            keys = keys - step_variation
+            if input_index + 1 == len(time_intervals):
+                break
+            gaps: npt.NDArray[np.bool_] = time_gaps.gap_mask(keys, data_vars, search_hours)
+            while gaps.any():
+                keys[gaps] -= step_variation
+                gaps[gaps] = time_gaps.gap_mask(keys[gaps], data_vars, search_hours)
+        return res
+
+    def _accumulate_batch_values(self, res: ResultStore, keys: npt.NDArray[np.datetime64],
+        values: npt.NDArray[np.float64], num_data_vars: int, 
+        valid_cells: Optional[npt.NDArray[np.bool_]] = None) -> npt.NDArray[np.datetime64]:
+        """Sums the similarity values of every comparison into the respective candidate. All values of the
+        same candidate (one per input time instance, along a diagonal of the matrix when there are no gaps)
+        are summed before being stored, so that each candidate is only updated once per file
+
+        Args:
+            res (ResultStore): results of the search
+            keys (npt.NDArray[np.datetime64]): candidate timestamp of every comparison 
+            (see "_calculate_candidate_keys")
+            values (npt.NDArray[np.float64]): similarity value of every comparison
+            num_data_vars (int): number of searched data variables
+            valid_cells (Optional[npt.NDArray[np.bool_]], optional): comparisons to be summed, the ones
+            of the abandoned candidates are left out. Defaults to None (all comparisons).
+
+        Returns:
+            npt.NDArray[np.datetime64]: candidates of the summed comparisons
+        """
+        if not valid_cells is None:
+            keys = keys[valid_cells]
+            values = values[valid_cells]
+        res.add_values(keys, values / num_data_vars)
+        return keys.ravel()
+
+    def _create_early_abandon_scan(self, keys: Optional[npt.NDArray[np.datetime64]], 
+        request_parameters: RequestParameters, corr_function: CorrelationFunction, metadata: RepositoryMetadata,
+        candidate_threshold: Optional[CandidateThreshold]) -> Optional[EarlyAbandonScan]:
+        """Creates the tracking of the candidates of a file when its comparisons can be abandoned, which
+        requires every searched data variable to be in the file and to share the same input time intervals
+
+        Args:
+            keys (Optional[npt.NDArray[np.datetime64]]): candidate timestamps of the file, None if the 
+            data variables have different time intervals
+            request_parameters (RequestParameters): parameters of the request
+            corr_function (CorrelationFunction): correlation function being used
+            metadata (RepositoryMetadata): metadata of the repository
+            candidate_threshold (Optional[CandidateThreshold]): best complete candidates of the search
+
+        Returns:
+            Optional[EarlyAbandonScan]: tracking of the candidates or None if no comparison can be abandoned
+        """
+        if candidate_threshold is None or keys is None or not corr_function.supports_early_abandon or \
+            not early_abandon_settings.is_enabled or request_parameters.search_data_var is None:
+            return None
+        if any(not var in metadata.data_vars for var in request_parameters.search_data_var):
+            return None
+        return EarlyAbandonScan(keys, len(request_parameters.search_data_var), candidate_threshold)
+
     def execute_search(self, file_paths: Dict[str,List[str]], request_parameters: RequestParameters, corr_function: CorrelationFunction, 
-        num_results: Optional[int] = None) -> Tuple[Dict[str, ResultContainer],int]:
+        num_results: Optional[int] = None, 
+        progress: Optional[ProgressCallback] = None,
+        candidate_threshold: Optional[CandidateThreshold] = None,
+        top_results: Optional[TopNResults] = None) -> Tuple[ResultStore,int]:
         """
         Executes a full brute force search in the local portion of the 
         existing dataset
 
         Args:
             file_paths (Dict[str,List[str]]): files with the given input
+            progress (Optional[ProgressCallback], optional): receives a snapshot after every searched file, with
+            the best complete results found so far when "top_results" is given. Defaults to None.
+            candidate_threshold (Optional[CandidateThreshold], optional): best complete candidates found so
+            far, given when only the best results are wanted so that the comparisons of the candidates that
+            can not be part of them are abandoned. Abandoned candidates are not part of the result. 
+            Defaults to None.
+            top_results (Optional[TopNResults], optional): when given, the candidates completed in each file
+            are moved from the result to it, so that only the best complete candidates are kept during the
+            search. Defaults to None (every candidate is part of the result).
 
         Returns:
-            Dict[str, ResultContainer]: found results together with the starting 
-            timestamp in the dataset
+            Tuple[ResultStore,int]: found results by starting timestamp in the dataset and size of the input
         """
         logging.info("Opening input files")
-        debug_ts_logger: logging.Logger = get_ts_debug_handler()
 
         if request_parameters.search_data_var is None:
             raise ValueError("Brute force service requires for the data variable to be defined")
@@ -79,98 +248,337 @@ class BruteForceService(ServiceLayer):
         input_iterator_collection: Dict[str,InputIterator] 
         input_iterator_collection, input_size = \
             self._open_input_as_dataset_with_multiple_vars(file_paths, request_parameters)
-        res: Dict[str, ResultContainer] = {}
+        res: ResultStore = ResultStore(np.timedelta64(int(repo_subset.step_variation),'ns'))
+        input_blocks: Dict[str, xarray.DataArray] = {}
+        #every data variable sums one value per input time instance into a candidate
+        complete_size: int = input_size * len(request_parameters.search_data_var)
+
+        total_files: int = 0 if progress is None else self._count_files(repo_subset.repositories)
+        scanned_files: int = 0
+        def file_searched() -> None:
+            nonlocal scanned_files
+            scanned_files += 1
+            if not progress is None:
+                progress(SearchProgress(scanned_files, total_files, {} if top_results is None else top_results.to_dict(),
+                    None if top_results is None else top_results.threshold))
+
+        #the files are read once for all requests of the same batch (see "shared_scan_settings")
+        if shared_scan_settings.is_enabled:
+            repository_metadata: Dict[int, RepositoryMetadata] = \
+                {id(repository): repository.get_metadata() for repository in repo_subset.repositories}
+            def search_shared_file(repository: RepositoryLayer, file_path: str, dataset: xarray.Dataset) -> None:
+                self._search_file(file_path, dataset, repository, repository_metadata[id(repository)], repo_subset,
+                    input_iterator_collection, input_blocks, complete_size, request_parameters, corr_function, res,
+                    candidate_threshold, top_results)
+                file_searched()
+            shared_scan.execute(repo_subset.repositories, search_shared_file)
+            return res, input_size
 
         #the first step is to iterate all existing repositories to find out which have
         # the desired data variables
         for repository in repo_subset.repositories:
             metadata: RepositoryMetadata = repository.get_metadata()
-            step_variation: np.timedelta64 = np.timedelta64(int(repo_subset.step_variation),'ns')
-            #the datasets have two time dimensions:
-            # - one that has a single timestamp (usually the first date of the given file)
-            # - another will all step values of the existing time dimension
-            # in order to obtain on actual timestamp, it is necessary to sum the the first
-            #timestamp together with the used step value
-            # This is valid for the data that has been processed
-            step_values: npt.NDArray[np.timedelta64]
-            time_date: Union[np.datetime64, npt.NDArray[np.datetime64]] #only a Union since can return both kinds
-                                                                        #with .values attribute (even tho only the
-                                                                        #np.datetime64 is relevant for this context)
-            # from this point, then a sequencial iteration of each file is done one by one
-            for dataset_pair in repository.get_dataset():
-                logging.info("Searching file " + dataset_pair[0])
-                step_values = dataset_pair[1].coords[metadata.time_variation_dim].values
-                time_date = dataset_pair[1].coords[metadata.time_initial_dim].values
-                iterable: bool = True
-
-                if not isinstance(step_values, Iterable):
-                    step_values = cast(npt.NDArray[np.timedelta64],np.array([step_values]))
-                    iterable = False
-
-                for step in step_values:
-                    #verifies if the current timestamp is part of the gaps of data
-                    # or the timestamps that were provided by the request
-                    debug_ts_logger.debug("START OF SINGLE STEP")
-                    if repo_subset.is_gap(step + time_date, request_parameters.search_data_var,request_parameters.search_hours):
-                        logging.debug("Skipping " + str(time_date + step))
-                        continue
-                    params: Dict[str, Any] = {}
-                    params[metadata.time_variation_dim] = step
-                    dataset_section: xarray.Dataset
-                    data_array_section: xarray.DataArray
-                    input_array: xarray.DataArray
-
-                    debug_ts_logger.debug("START SELECT OF STEP")
-                    if iterable:
-                        dataset_section = dataset_pair[1].sel(params)
-                    else:
-                        dataset_section = dataset_pair[1]
-                    debug_ts_logger.debug("END SELECT OF STEP")
-
-                    for var in request_parameters.search_data_var:
-                        key: np.datetime64 = time_date + step
-                        if var in metadata.data_vars:
-                            input_iterator: InputIterator = input_iterator_collection[var]
-
-                            for input_tuple in input_iterator.iterate():
-                                input_ts: xarray.Dataset = input_tuple[0]
-                                input_interval: int = input_tuple[1]
-
-                                key -= step_variation * input_interval
-                                debug_ts_logger.debug("START SELECT AND ARRAY CONVERSION")
-                                data_array_section = dataset_section[[var]].to_array()
-                                debug_ts_logger.debug("END SELECT AND ARRAY CONVERSION")
-
-                                input_array = input_ts[var]
-                                debug_ts_logger.debug("START CORRELATION")
-                                sim_val_raw: float = corr_function.calculate(data_array_section, input_array, metadata, var)
-                                debug_ts_logger.debug("END CORRELATION")
-                                sim_val_raw /= len(request_parameters.search_data_var)
-
-                                str_key: str = str(key)
-
-                                if not str_key in res:
-                                    res[str_key] = ResultContainer(sim_val_raw)
-                                else:
-                                    res[str_key].add_value(sim_val_raw)
-                                key -= step_variation
-                                while repo_subset.is_gap(key, request_parameters.search_data_var,request_parameters.search_hours):
-                                    key -= step_variation
-
-                            debug_ts_logger.debug("END OF SINGLE STEP")
-                dataset_pair[1].close()
+            dataset_file_paths: Optional[List[str]] = self._get_parallel_file_paths(repository)
+            if dataset_file_paths is None:
+                # from this point, then a sequencial iteration of each file is done one by one
+                for dataset_pair in repository.get_dataset():
+                    self._search_file(dataset_pair[0], dataset_pair[1], repository, metadata, repo_subset,
+                        input_iterator_collection, input_blocks, complete_size, request_parameters, corr_function, res,
+                        candidate_threshold, top_results)
+                    dataset_pair[1].close()
+                    file_searched()
+                continue
+
+            #the files are searched by a pool of processes, each one returning the results of its file
+            self._load_input(input_iterator_collection, input_blocks, request_parameters.search_data_var, corr_function)
+            #the state of the request is sent to the processes (see "search_files_in_parallel")
+            search_file: Callable[[int], Tuple[ResultStore, Optional[TopNResults]]] = functools.partial(
+                self._search_parallel_file, dataset_file_paths, repository, metadata, repo_subset,
+                input_iterator_collection, input_blocks, complete_size, request_parameters, corr_function,
+                candidate_threshold, None if top_results is None else top_results.num_results)
+
+            for file_res, file_top_results in search_files_in_parallel(search_file, len(dataset_file_paths)):
+                self._merge_file_results(res, file_res, file_top_results, complete_size, candidate_threshold, top_results)
+                file_searched()
 
         return res, input_size
 
-    def _get_file_from_heuristic(self, date: datetime,repository: RepositoryLayer) -> Optional[xarray.Dataset]:
-        """Returns the file specific to the heuristic value
+    def _search_parallel_file(self, file_paths: List[str], repository: RepositoryLayer, metadata: RepositoryMetadata,
+        repo_subset: RepositoryCollection, input_iterator_collection: Dict[str,InputIterator], 
+        input_blocks: Dict[str, xarray.DataArray], complete_size: int, request_parameters: RequestParameters,
+        corr_function: CorrelationFunction, candidate_threshold: Optional[CandidateThreshold], 
+        num_top_results: Optional[int], file_index: int) -> Tuple[ResultStore, Optional[TopNResults]]:
+        """Searches a single file in a process of the pool, returning its results to be merged (see "_merge_file_results")
+
+        Args:
+            file_paths (List[str]): files of the repository
+            num_top_results (Optional[int]): number of best complete results kept during the search, None if 
+            every candidate is part of the result
+            file_index (int): index of the searched file
+
+            The remaining arguments are the ones of "_search_file"
+
+        Returns:
+            Tuple[ResultStore, Optional[TopNResults]]: results and best complete results of the file
+        """
+        file_res: ResultStore = ResultStore(np.timedelta64(int(repo_subset.step_variation),'ns'))
+        file_top_results: Optional[TopNResults] = None if num_top_results is None else \
+            TopNResults(num_top_results, corr_function)
+        file_path: str = file_paths[file_index]
+        dataset: xarray.Dataset = repository.open_dataset_file(file_path)
+        try:
+            self._search_file(file_path, dataset, repository, metadata, repo_subset, input_iterator_collection, 
+                input_blocks, complete_size, request_parameters, corr_function, file_res, candidate_threshold, 
+                file_top_results)
+        finally:
+            dataset.close()
+        return file_res, file_top_results
+
+    def _count_files(self, repositories: List[RepositoryLayer]) -> int:
+        """Returns the number of files of the repositories (used to report the progress of the search)
+
+        Args:
+            repositories (List[RepositoryLayer]): repositories being searched
+
+        Returns:
+            int: number of files, 0 if the files of a repository can not be listed
+        """
+        total_files: int = 0
+        for repository in repositories:
+            try:
+                total_files += len(repository.get_dataset_file_paths())
+            except NotImplementedError:
+                return 0
+        return total_files
+
+    def _get_parallel_file_paths(self, repository: RepositoryLayer) -> Optional[List[str]]:
+        """Returns the files of the repository when they should be searched in parallel 
+        (see "parallel_search_settings")
+
+        Args:
+            repository (RepositoryLayer): repository being searched
+
+        Returns:
+            Optional[List[str]]: paths of the files or None if they should be searched sequentially
+        """
+        if not parallel_search_settings.is_enabled:
+            return None
+        try:
+            file_paths: List[str] = repository.get_dataset_file_paths()
+        except NotImplementedError:
+            return None
+        return file_paths if len(file_paths) > 1 else None
+
+    def _load_input(self, input_iterator_collection: Dict[str,InputIterator], input_blocks: Dict[str, xarray.DataArray],
+        data_vars: List[str], corr_function: CorrelationFunction) -> None:
+        """Prepares the input before the files are searched by other processes, so that it is only
+        prepared once
+
+        Args:
+            input_iterator_collection (Dict[str,InputIterator]): input of each data variable
+            input_blocks (Dict[str, xarray.DataArray]): cache with the already stacked inputs
+            data_vars (List[str]): data variables being searched
+            corr_function (CorrelationFunction): correlation function being used
+        """
+        for var in data_vars:
+            input_iterator: InputIterator = input_iterator_collection[var]
+            input_iterator.get_time_intervals()
+            input_iterator.get_prepared_inputs(corr_function, var)
+            if corr_function.supports_batch and not var in input_blocks:
+                input_blocks[var] = input_iterator.to_block(var)
+
+    def _collect_complete_results(self, res: ResultStore, keys: npt.NDArray[np.datetime64], complete_size: int,
+        candidate_threshold: Optional[CandidateThreshold], top_results: TopNResults) -> None:
+        """Moves the given candidates that are complete from the results to the best results
+
+        Args:
+            res (ResultStore): results of the search
+            keys (npt.NDArray[np.datetime64]): candidates that were updated (without repetitions)
+            complete_size (int): number of values of a complete candidate (size of the input times the
+            number of searched data variables)
+            candidate_threshold (Optional[CandidateThreshold]): best complete candidates of the search
+            top_results (TopNResults): best complete results of the search
+        """
+        timestamps: npt.NDArray[np.datetime64]
+        values: npt.NDArray[np.float64]
+        sum_counters: npt.NDArray[np.int64]
+        timestamps, values, sum_counters = res.pop_complete(keys, complete_size)
+        top_results.add_values(timestamps, values, sum_counters)
+        if not candidate_threshold is None:
+            candidate_threshold.add_values(values / sum_counters)
+
+    def _merge_file_results(self, res: ResultStore, file_res: ResultStore,
+        file_top_results: Optional[TopNResults], complete_size: int, candidate_threshold: Optional[CandidateThreshold], 
+        top_results: Optional[TopNResults]) -> None:
+        """Merges the results of a file searched by another process into the results of the search
+
+        Args:
+            res (ResultStore): results of the search
+            file_res (ResultStore): results of the file
+            file_top_results (Optional[TopNResults]): best complete results of the file
+            complete_size (int): number of values of a complete candidate (size of the input times the
+            number of searched data variables)
+            candidate_threshold (Optional[CandidateThreshold]): best complete candidates of the search
+            top_results (Optional[TopNResults]): best complete results of the search
+        """
+        file_keys: npt.NDArray[np.datetime64] = res.merge(file_res)
+        if top_results is None:
+            return
+        #the candidates split between files are only completed when the results of the files are merged
+        self._collect_complete_results(res, file_keys, complete_size, candidate_threshold, top_results)
+        if not file_top_results is None:
+            for str_key, result in file_top_results.to_dict().items():
+                top_results.add(str_key, result)
+                if not candidate_threshold is None:
+                    candidate_threshold.add(result.value / result.sum_counter)
+
+    def _search_file(self, file_path: str, dataset: xarray.Dataset, repository: RepositoryLayer, 
+        metadata: RepositoryMetadata, repo_subset: RepositoryCollection, input_iterator_collection: Dict[str,InputIterator],
+        input_blocks: Dict[str, xarray.DataArray], complete_size: int, request_parameters: RequestParameters, 
+        corr_function: CorrelationFunction, res: ResultStore, 
+        candidate_threshold: Optional[CandidateThreshold], top_results: Optional[TopNResults]) -> None:
+        """Compares every searched step of a file of the dataset with the input, summing the similarity
+        values into the candidates. The file is not closed, since it can be shared by several requests
+
+        Args:
+            file_path (str): path of the file
+            dataset (xarray.Dataset): opened file
+            repository (RepositoryLayer): repository the file belongs to
+            metadata (RepositoryMetadata): metadata of the repository
+            repo_subset (RepositoryCollection): repositories being searched
+            input_iterator_collection (Dict[str,InputIterator]): input of each data variable
+            input_blocks (Dict[str, xarray.DataArray]): cache with the already stacked inputs
+            complete_size (int): number of values of a complete candidate (size of the input times the
+            number of searched data variables)
+            request_parameters (RequestParameters): parameters of the request
+            corr_function (CorrelationFunction): correlation function being used
+            res (ResultStore): results of the search
+            candidate_threshold (Optional[CandidateThreshold]): best complete candidates of the search
+            (see "execute_search")
+            top_results (Optional[TopNResults]): best complete results of the search (see "execute_search")
+        """
+        if request_parameters.search_data_var is None:
+            raise ValueError("Brute force service requires for the data variable to be defined")
+        logging.info("Searching file " + file_path)
+        debug_ts_logger: logging.Logger = get_ts_debug_handler()
+        step_variation: np.timedelta64 = np.timedelta64(int(repo_subset.step_variation),'ns')
+        #the datasets have two time dimensions:
+        # - one that has a single timestamp (usually the first date of the given file)
+        # - another will all step values of the existing time dimension
+        # in order to obtain on actual timestamp, it is necessary to sum the the first
+        #timestamp together with the used step value
+        # This is valid for the data that has been processed
+        step_values: npt.NDArray[np.timedelta64]
+        time_date: Union[np.datetime64, npt.NDArray[np.datetime64]] #only a Union since can return both kinds
+                                                                    #with .values attribute (even tho only the
+                                                                    #np.datetime64 is relevant for this context)
+        step_values = dataset.coords[metadata.time_variation_dim].values
+        time_date = dataset.coords[metadata.time_initial_dim].values
+        iterable: bool = True
+
+        if not isinstance(step_values, Iterable):
+            step_values = cast(npt.NDArray[np.timedelta64],np.array([step_values]))
+            iterable = False
+
+        #verifies which timestamps are part of the gaps of data
+        # or the timestamps that were provided by the request
+        searched_steps: List[np.timedelta64] = list(step_values[~repo_subset.gap_mask(time_date + step_values,
+            request_parameters.search_data_var, request_parameters.search_hours)])
+        searched_dates: npt.NDArray[np.datetime64] = \
+            cast(npt.NDArray[np.datetime64], time_date + np.array(searched_steps, dtype="timedelta64[ns]"))
+        #the candidate of every comparison of the file (the keys of the data variables compared one step at
+        # a time are also calculated at once, instead of skipping the gaps of every key)
+        candidate_keys: Dict[Tuple[int, ...], npt.NDArray[np.datetime64]] = {}
+        for var in request_parameters.search_data_var:
+            time_intervals: List[int] = input_iterator_collection[var].get_time_intervals()
+            if not tuple(time_intervals) in candidate_keys and (candidate_threshold is not None or \
+                var in metadata.data_vars):
+                candidate_keys[tuple(time_intervals)] = self._calculate_candidate_keys(searched_dates, 
+                    time_intervals, step_variation, repo_subset, request_parameters.search_data_var,
+                    request_parameters.search_hours)
+        scan: Optional[EarlyAbandonScan] = self._create_early_abandon_scan(
+            next(iter(candidate_keys.values())) if len(candidate_keys) == 1 else None,
+            request_parameters, corr_function, metadata, candidate_threshold)
+
+        debug_ts_logger.debug("START BATCH CORRELATION")
+        batch_values: Dict[str, npt.NDArray[np.float64]] = \
+            self._calculate_batch_similarities(dataset, searched_steps, iterable, input_iterator_collection,
+                input_blocks, request_parameters.search_data_var, corr_function, repository, metadata, scan)
+        debug_ts_logger.debug("END BATCH CORRELATION")
+
+        debug_ts_logger.debug("START BATCH ACCUMULATION")
+        file_keys: List[npt.NDArray[np.datetime64]] = []
+        for var in batch_values:
+            file_keys.append(self._accumulate_batch_values(res, 
+                candidate_keys[tuple(input_iterator_collection[var].get_time_intervals())], batch_values[var], 
+                len(request_parameters.search_data_var), None if scan is None else scan.valid_cells))
+        debug_ts_logger.debug("END BATCH ACCUMULATION")
+        abandoned_keys: npt.NDArray[np.datetime64] = np.zeros(0, dtype="datetime64[ns]") if scan is None \
+            else scan.abandoned_keys
+
+        #data variables that could not be calculated in a single block are compared one step at a time
+        remaining_data_vars: List[str] = [var for var in request_parameters.search_data_var 
+            if var in metadata.data_vars and not var in batch_values]
+
+        for step_index, step in enumerate(searched_steps):
+            if len(remaining_data_vars) == 0:
+                break
+            debug_ts_logger.debug("START OF SINGLE STEP")
+            params: Dict[str, Any] = {}
+            params[metadata.time_variation_dim] = step
+            dataset_section: xarray.Dataset
+            data_array_section: xarray.DataArray
+            input_array: xarray.DataArray
+
+            debug_ts_logger.debug("START SELECT OF STEP")
+            if iterable:
+                dataset_section = dataset.sel(params)
+            else:
+                dataset_section = dataset
+            debug_ts_logger.debug("END SELECT OF STEP")
+
+            for var in remaining_data_vars:
+                input_iterator: InputIterator = input_iterator_collection[var]
+                prepared_inputs: List[PreparedInput] = input_iterator.get_prepared_inputs(corr_function, var)
+                step_keys: npt.NDArray[np.datetime64] = \
+                    candidate_keys[tuple(input_iterator.get_time_intervals())][step_index]
+                compared: npt.NDArray[np.int64] = np.flatnonzero(~np.isin(step_keys, abandoned_keys))
+                similarity_values: npt.NDArray[np.float64] = np.zeros(len(compared))
+
+                for value_index, input_index in enumerate(compared.tolist()):
+                    debug_ts_logger.debug("START SELECT AND ARRAY CONVERSION")
+                    data_array_section = dataset_section[[var]].to_array()
+                    debug_ts_logger.debug("END SELECT AND ARRAY CONVERSION")
+
+                    debug_ts_logger.debug("START CORRELATION")
+                    similarity_values[value_index] = corr_function.calculate_prepared(data_array_section,
+                        prepared_inputs[input_index], metadata, var)
+                    debug_ts_logger.debug("END CORRELATION")
+
+                res.add_values(step_keys[compared], similarity_values / len(request_parameters.search_data_var))
+                file_keys.append(step_keys[compared])
+
+                debug_ts_logger.debug("END OF SINGLE STEP")
+
+        #the candidates completed in this file become part of the threshold of the next comparisons
+        if not top_results is None:
+            self._collect_complete_results(res, np.unique(np.concatenate(file_keys)) if len(file_keys) > 0 \
+                else np.zeros(0, dtype="datetime64[ns]"), complete_size, candidate_threshold, top_results)
+        elif not scan is None and not candidate_threshold is None:
+            complete_values: npt.NDArray[np.float64]
+            complete_counters: npt.NDArray[np.int64]
+            complete_values, complete_counters = res.select(scan.complete_keys)
+            candidate_threshold.add_values(complete_values / complete_counters)
+
+    def _get_file_path_from_heuristic(self, date: datetime, repository: RepositoryLayer) -> Optional[str]:
+        """Returns the path of the file specific to the heuristic value
 
         Args:
             date (date): received date value
             repository (RepositoryLayer): repository being used
 
         Returns:
-            Optional[xarray.Dataset]: found file of None if it is not found
+            Optional[str]: path of the found file or None if it is not found
         """
         year: int = date.year
         month: int = date.month
@@ -178,15 +586,67 @@ class BruteForceService(ServiceLayer):
         hour: int = date.hour
         
         container: DateContainer = DateContainer(year, month, day, hour)
-        res: Optional[Tuple[str, xarray.Dataset]] = repository.get_dataset_part(container)
-        if res is None:
-            return None
-        else:
-            return res[1]
+        return repository.get_dataset_part_path(container)
+
+    def _search_heuristic_file(self, file_path: str, 
+        var_comparisons: Dict[str, List[Tuple[np.datetime64, int, np.datetime64]]], repository: RepositoryLayer,
+        input_iterator_collection: Dict[str,InputIterator], num_data_vars: int, corr_function: CorrelationFunction,
+        res: ResultStore) -> None:
+        """Calculates the comparisons of the heuristic timestamps that belong to a single file. The file is
+        opened once and the required steps of every data variable are read at once, in the order of the steps
+
+        Args:
+            file_path (str): path of the file
+            var_comparisons (Dict[str, List[Tuple[np.datetime64, int, np.datetime64]]]): compared date of the
+            dataset, index of the input instance and candidate timestamp of every comparison, by data variable
+            repository (RepositoryLayer): repository the file belongs to
+            input_iterator_collection (Dict[str,InputIterator]): input of each data variable
+            num_data_vars (int): number of searched data variables
+            corr_function (CorrelationFunction): correlation function being used
+            res (ResultStore): results of the search
+        """
+        metadata: RepositoryMetadata = repository.get_metadata()
+        dataset: xarray.Dataset = repository.open_dataset_file(file_path)
+        #only a Union since can return both kinds
+        #with .values attribute (even tho only the
+        #np.datetime64 is relevant for this context)
+        time_date: np.datetime64 = dataset.coords[metadata.time_initial_dim].values # type: ignore
+
+        for var, comparisons in var_comparisons.items():
+            field_statistics: Optional[FieldStatisticsSidecar] = repository.get_field_statistics(var)
+            prepared_inputs: List[PreparedInput] = input_iterator_collection[var].get_prepared_inputs(corr_function, var)
+            comparisons = sorted(comparisons, key=lambda comparison: comparison[0])
+            dates64: npt.NDArray[np.datetime64] = np.array([comparison[0] for comparison in comparisons], 
+                dtype="datetime64[ns]")
+
+            #position of every step in the file, -1 if the file does not have the step
+            step_positions: npt.NDArray[np.int64] = \
+                dataset.indexes[metadata.time_variation_dim].get_indexer(pd.TimedeltaIndex(dates64 - time_date))
+            if (step_positions < 0).any():
+                logging.info("Steps not found in file " + file_path + ", continuing...")
+            read_positions: npt.NDArray[np.int64]
+            section_indexes: npt.NDArray[np.int64]
+            read_positions, section_indexes = np.unique(step_positions[step_positions >= 0], return_inverse=True)
+            dataset_section: xarray.DataArray = \
+                dataset[var].isel({metadata.time_variation_dim: read_positions}).load()
+
+            compared: npt.NDArray[np.int64] = np.flatnonzero(step_positions >= 0)
+            for section_index, comparison_index in zip(section_indexes.tolist(), compared.tolist()):
+                date64: np.datetime64
+                input_index: int
+                date_heuristic: np.datetime64
+                date64, input_index, date_heuristic = comparisons[comparison_index]
+                dataset_statistics: Optional[FieldStatistics] = None if field_statistics is None \
+                    else field_statistics.select(np.array([date64]))
+                sim_val_raw: float = corr_function.calculate_prepared(
+                    dataset_section.isel({metadata.time_variation_dim: section_index}),
+                    prepared_inputs[input_index], metadata, var, dataset_statistics)
+                res.add(date_heuristic, sim_val_raw / num_data_vars)
+        dataset.close()
 
     def execute_search_on_ts(self, result_iterator: Iterator[HeuristicResult], file_paths: Dict[str,List[str]], 
         request_parameters: RequestParameters, corr_function: CorrelationFunction,
-        num_results:Optional[int] = None) -> Tuple[Dict[str, ResultContainer], int]:
+        num_results:Optional[int] = None) -> Tuple[ResultStore, int]:
 
         if request_parameters.ts_neighbour_gap is None:
             raise ValueError("Search on timestamps in brute force search requires for the ts_neighbour_gap to be defined")
@@ -197,7 +657,7 @@ class BruteForceService(ServiceLayer):
         repo_subset: RepositoryCollection = \
             self._repositories.get_subsection_repositories(request_parameters.search_data_var)
 
-        res: Dict[str, ResultContainer] = {}
+        res: ResultStore = ResultStore(np.timedelta64(int(repo_subset.step_variation),'ns'))
 
         logging.info("Opening input files")
         ts_neighbour_gap: int = request_parameters.ts_neighbour_gap
@@ -211,22 +671,24 @@ class BruteForceService(ServiceLayer):
         input_iterator_collection, input_size = \
                 self._open_input_as_dataset_with_multiple_vars(file_paths, request_parameters)
 
-        #SECTION RESPONSIBLE FOR CALCULATING THE SIMILARITY VALUE
+        #the comparisons of every heuristic timestamp are grouped by the file that has the compared date,
+        # so that every file is only opened once
+        file_comparisons: Dict[str, Dict[str, List[Tuple[np.datetime64, int, np.datetime64]]]] = {}
+        file_repositories: Dict[str, RepositoryLayer] = {}
+        step_variation: np.timedelta64 = np.timedelta64(int(repo_subset.step_variation),'ns')
+
+        #SECTION RESPONSIBLE FOR GATHERING THE COMPARISONS
         for heuristic in result_iterator: #the result_iterator is iterated first, because it can only be iterated once
                                           # therefore, this has always to be on top of the loop
             received_date_heuristic: np.datetime64 = np.datetime64(heuristic.ts)
-            heuristic_neighbour_list: List[np.datetime64] = []
-            
+
+            #calculate the neighbouring timestamps
+            heuristic_neighbour_list: List[np.datetime64] = [received_date_heuristic + step_variation * i
+                for i in range(-ts_neighbour_gap+1,ts_neighbour_gap)]
+            logging.debug("Created neighbour list: " + str(heuristic_neighbour_list))
+
             for var in request_parameters.search_data_var:
                 repository: RepositoryLayer = repo_subset.get_repository_by_data_var(var)
-                metadata: RepositoryMetadata = repository.get_metadata()
-                step_variation: np.timedelta64 = np.timedelta64(int(repo_subset.step_variation),'ns')
-
-                #calculate the neighbouring timestamps
-                for i in range(-ts_neighbour_gap+1,ts_neighbour_gap):
-                    heuristic_neighbour_list.append(received_date_heuristic + step_variation * i)
-                
-                logging.debug("Created neighbour list: " + str(heuristic_neighbour_list))
                 
                 for date_heuristic in heuristic_neighbour_list:
                     if date_heuristic in already_searched_ts[var] or \
@@ -237,7 +699,6 @@ class BruteForceService(ServiceLayer):
 
                     dates64: List[np.datetime64] = []
                     input_iterator: InputIterator = input_iterator_collection[var]
-                    input_da: Iterator[Tuple[xarray.Dataset, int]] = input_iterator.iterate()
                     logging.debug("Converted heuristic timestamp: " + str(date_heuristic))
 
                     #First step: gather all required datetimes for the given heuristic and the size of the input
@@ -250,40 +711,23 @@ class BruteForceService(ServiceLayer):
                         date_aux += step_variation
 
                     #Second step: for every existing date verify if it exists in the local portion of the dataset
-                    for date64 in dates64:
-                        dataset_part: Optional[xarray.Dataset] = self._get_file_from_heuristic(pd.to_datetime(date64), repository)
-
-                        input_ts: xarray.Dataset 
-                        input_ts, _ = next(input_da)
+                    for input_index, date64 in enumerate(dates64):
+                        file_path: Optional[str] = self._get_file_path_from_heuristic(pd.to_datetime(date64), repository)
 
                         #Verifies if the file exists
-                        if dataset_part is None:
+                        if file_path is None:
                             logging.info("File not found, continuing...")
                             continue
-                                
-                        #Third step: if the required data is available, calculate the respective step
-
-                        #only a Union since can return both kinds
-                        #with .values attribute (even tho only the
-                        #np.datetime64 is relevant for this context)
-                        time_date: np.datetime64 = dataset_part.coords[metadata.time_initial_dim].values # type: ignore
+                        file_repositories[file_path] = repository
+                        file_comparisons.setdefault(file_path, {}).setdefault(var, []).append(
+                            (date64, input_index, date_heuristic))
 
-                        step: np.timedelta64 = date64 - time_date
-                        params: Dict[str, Any] = {}
-                        params[metadata.time_variation_dim] = step
-                        dataset_section: xarray.Dataset = dataset_part.sel(params)
-
-                        #Final step: calculate the similarity and store it in the result container
-                        sim_val_raw: float = corr_function.calculate(dataset_section[var], input_ts[var], metadata, var)
-
-                        sim_val_raw /= len(request_parameters.search_data_var)
-                        str_key: str = str(date_heuristic)
-
-                        if not str_key in res:
-                            res[str_key] = ResultContainer(sim_val_raw)
-                        else:
-                            res[str_key].add_value(sim_val_raw)
-
-                        dataset_part.close()
+        #SECTION RESPONSIBLE FOR CALCULATING THE SIMILARITY VALUE
+        #the files are read in the order of their first compared date (a sequential pass over the dataset)
+        for comparisons_file_path in sorted(file_comparisons, key=lambda path: min(comparison[0]
+            for comparisons in file_comparisons[path].values() for comparison in comparisons)):
+            self._search_heuristic_file(comparisons_file_path, file_comparisons[comparisons_file_path], 
+                file_repositories[comparisons_file_path], input_iterator_collection, 
+                len(request_parameters.search_data_var), corr_function, res)
 
         return res, input_size
\ No newline at end of file
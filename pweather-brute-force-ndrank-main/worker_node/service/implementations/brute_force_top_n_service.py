@@ -1,129 +1,100 @@
 from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import numpy.typing as npt
 from correlation_functions.main_structure import CorrelationFunction
 from service.constants import SIMPLE_TOP_N_SERVICE
-from service.data_types import ResultContainer
+from service.data_types import ResultStore, TopNResults
+from service.early_abandon import CandidateThreshold
 from service.implementations.brute_force_service import BruteForceService
 from auxiliar.component_injector import component_injector
-from service.service_main_structure import HeuristicResult, RequestParameters
+from service.service_main_structure import HeuristicResult, ProgressCallback, RequestParameters
 
 @component_injector.inject_service(SIMPLE_TOP_N_SERVICE)
 class BruteForceTopNService(BruteForceService):
 
-    def _insert_sorted(self, elems: List[Tuple[str,ResultContainer]], corr_function: CorrelationFunction):
-        """Sorts the last element in a similar way to insertion sort.
-        It assumes that the rest of the list is sorted
+    def _filter_results_by_number_results(self, all_results: ResultStore, complete_size: int,
+        num_results: int, corr_function: CorrelationFunction) -> ResultStore:
+        """Filters the calculated results by the given number of results (the complete results
+        that are not part of the best ones are removed from the given results)
 
         Args:
-            elems (List[Tuple[str,ResultContainer]]): list with the element to be sorted
-            corr_function (CorrelationFunction): used correlation function
-        """
-        for i in range(len(elems)-1,0,-1):
-            if corr_function.compare(elems[i-1][1].value /elems[i-1][1].sum_counter,
-                    elems[i][1].value /elems[i][1].sum_counter):
-                elems[i-1], elems[i] = elems[i], elems[i-1]
-            else:
-                break
-
-    def _filter_results_by_number_results(self, all_results: Dict[str,ResultContainer], size_input: int,
-        num_results: int, corr_function: CorrelationFunction) -> Dict[str, ResultContainer]:
-        """Filters the calculated results by the given number of results
-
-        Args:
-            all_results (Dict[str,ResultContainer]): obtained results
-            size_input (int): size of the input
+            all_results (ResultStore): obtained results
+            complete_size (int): number of values of a complete candidate (size of the input times 
+            the number of searched data variables)
             num_results (int): number of wanted results
             corr_function (CorrelationFunction): used correlation function
 
         Returns:
-            Dict[str, ResultContainer]: results filtered by the num_results parameter
+            ResultStore: results filtered by the num_results parameter
         """
-        
-        totals: List[Tuple[str,ResultContainer]] = []
-        res: Dict[str, ResultContainer] = {}
-        worst_sim_value: Optional[Tuple[str,ResultContainer]] = None 
-
-        for timestamp in all_results:
-            elem: Tuple[str,ResultContainer] = (timestamp, all_results[timestamp])
-            if elem[1].sum_counter < size_input:
-                res[elem[0]] = elem[1]
-            elif worst_sim_value is None:
-                worst_sim_value = elem
-                totals.append(elem)
-            else:   
-                if corr_function.compare(worst_sim_value[1].value /worst_sim_value[1].sum_counter, 
-                        elem[1].value /elem[1].sum_counter ) or len(totals) < num_results:
-                    if len(totals) >= num_results:
-                        totals.pop()
-                    totals.append(elem)
-                    self._insert_sorted(totals, corr_function)
-                    worst_sim_value = totals[-1]
-
-        for elem in totals:
-            res[elem[0]] = elem[1]
-
-        return res
+        top_results: TopNResults = TopNResults(num_results, corr_function)
+        timestamps: npt.NDArray[np.datetime64]
+        values: npt.NDArray[np.float64]
+        sum_counters: npt.NDArray[np.int64]
+        timestamps, values, sum_counters = all_results.pop_complete(all_results.timestamps, complete_size)
+        top_results.add_values(timestamps, values, sum_counters)
 
+        all_results.update(top_results.to_dict())
+        return all_results
 
     def execute_search(self, file_paths: Dict[str,List[str]], request_parameters: RequestParameters, corr_function: CorrelationFunction, 
-        num_results: Optional[int] = None) -> Tuple[Dict[str, ResultContainer], int]:
+        num_results: Optional[int] = None, 
+        progress: Optional[ProgressCallback] = None,
+        candidate_threshold: Optional[CandidateThreshold] = None,
+        top_results: Optional[TopNResults] = None) -> Tuple[ResultStore, int]:
         """Executes the full brute force search and only returns the best n results and the results
         where there is only a partial value
 
         Args:
             file_paths (Dict[str,List[str]]): files with the given input
             num_results (Optional[int]): number of wanted results
+            progress (Optional[ProgressCallback], optional): receives the best complete results after every
+            searched file. Defaults to None.
+            candidate_threshold (Optional[CandidateThreshold], optional): best complete candidates found 
+            before the search. Defaults to None (no candidates).
+            top_results (Optional[TopNResults], optional): best complete results found before the search. 
+            Defaults to None (no results).
 
         Returns:
-            Tuple[Dict[str, ResultContainer], int]: _description_
+            Tuple[ResultStore, int]: partial results and best complete results, and size of the input
         """
 
         if num_results is None or num_results <= 0:
             raise ValueError("Number of results must be a positive number")
         
-        res_full: Dict[str,ResultContainer]
-        res: Dict[str, ResultContainer] = {}
+        res: ResultStore
         size_input: int
-        res_full, size_input = super().execute_search(file_paths, request_parameters, corr_function)
-
-        totals: List[Tuple[str,ResultContainer]] = []
-
-        worst_sim_value: Optional[Tuple[str,ResultContainer]] = None 
-
-        for timestamp in res_full:
-            elem: Tuple[str,ResultContainer] = (timestamp, res_full[timestamp])
-            if elem[1].sum_counter < size_input:
-                res[elem[0]] = elem[1]
-            elif worst_sim_value is None:
-                worst_sim_value = elem
-                totals.append(elem)
-            else:   
-                if corr_function.compare(worst_sim_value[1].value /worst_sim_value[1].sum_counter, 
-                        elem[1].value /elem[1].sum_counter ) or len(totals) < num_results:
-                    if len(totals) >= num_results:
-                        totals.pop()
-                    totals.append(elem)
-                    self._insert_sorted(totals, corr_function)
-                    worst_sim_value = totals[-1]
-
-        for elem in totals:
-            res[elem[0]] = elem[1]
+        #the comparisons of the candidates that can no longer be part of the best results are abandoned
+        if candidate_threshold is None:
+            candidate_threshold = CandidateThreshold(num_results, corr_function)
+        #the complete candidates are selected while the files are searched, so the search only
+        # returns the partial ones
+        if top_results is None:
+            top_results = TopNResults(num_results, corr_function)
+        res, size_input = super().execute_search(file_paths, request_parameters, corr_function,
+            progress=progress, candidate_threshold=candidate_threshold, top_results=top_results)
+
+        res.update(top_results.to_dict())
         return res, size_input
 
     def execute_search_on_ts(self, result_iterator: Iterator[HeuristicResult], file_paths: Dict[str,List[str]], 
         request_parameters: RequestParameters, corr_function: CorrelationFunction, 
-        num_results: Optional[int] = None) -> Tuple[Dict[str, ResultContainer], int]:
+        num_results: Optional[int] = None) -> Tuple[ResultStore, int]:
         
         if num_results is None or num_results <= 0:
             raise ValueError("Number of results must be a positive number")
+        if request_parameters.search_data_var is None:
+            raise ValueError("Brute force service requires for the data variable to be defined")
         
-        res_full: Dict[str,ResultContainer]
-        res: Dict[str, ResultContainer] = {}
+        res_full: ResultStore
+        res: ResultStore
         size_input: int
 
         res_full, size_input = super().execute_search_on_ts(result_iterator, 
             file_paths, request_parameters, corr_function, num_results)
         
+        #every data variable sums one value per input time instance into a candidate
         res = self._filter_results_by_number_results(
-                        res_full, size_input, num_results, corr_function)
+                        res_full, size_input * len(request_parameters.search_data_var), num_results, corr_function)
         
         return res, size_input
\ No newline at end of file
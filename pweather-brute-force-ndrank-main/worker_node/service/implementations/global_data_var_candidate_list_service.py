@@ -1,13 +1,17 @@
 import datetime
+import functools
 import logging, xarray
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union, cast
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union, cast
 import numpy as np
 import numpy.typing as npt
 from correlation_functions.main_structure import CorrelationFunction
+from correlation_functions.prepared_input import PreparedInput
 from repository.repository_collection import RepositoryCollection
-from repository.repository_layer import RepositoryMetadata
-from service.data_types import CandidateContainer, CandidateListManager, InputIterator, ResultContainer
+from repository.repository_layer import RepositoryLayer, RepositoryMetadata
+from service.data_types import CandidateContainer, CandidateListManager, InputIterator, ResultContainer, ResultStore
 from service.implementations.brute_force_top_n_service import BruteForceTopNService
+from service.parallel_search import search_files_in_parallel
+from service.shared_scan import shared_scan, shared_scan_settings
 from service.service_main_structure import HeuristicResult, RequestParameters
 from service.constants import DATA_VAR_CANDIDATE_LIST_SERVICE
 from auxiliar.component_injector import component_injector
@@ -87,75 +91,45 @@ class DataVarCandidateListService(BruteForceTopNService):
         input_iterator_collection: Dict[str,InputIterator] 
         input_iterator_collection, input_size = \
             self._open_input_as_dataset_with_multiple_vars(file_paths, request_parameters)
+        input_blocks: Dict[str, xarray.DataArray] = {}
+
+        #the files are read once for all requests of the same batch (see "shared_scan_settings")
+        if shared_scan_settings.is_enabled:
+            repository_metadata: Dict[int, RepositoryMetadata] = \
+                {id(repository): repository.get_metadata() for repository in repo_subset.repositories}
+            def search_shared_file(repository: RepositoryLayer, file_path: str, dataset: xarray.Dataset) -> None:
+                self._search_file_for_candidates(file_path, dataset, repository, repository_metadata[id(repository)],
+                    repo_subset, input_iterator_collection, input_blocks, request_parameters, corr_function,
+                    candidates_temp_holder)
+            shared_scan.execute(repo_subset.repositories, search_shared_file)
+        else:
+            #the first step is to iterate all existing repositories to find out which have
+            # the desired data variables
+            for repository in repo_subset.repositories:
+                metadata: RepositoryMetadata = repository.get_metadata()
+                dataset_file_paths: Optional[List[str]] = self._get_parallel_file_paths(repository)
+                if dataset_file_paths is None:
+                    # from this point, then a sequencial iteration of each file is done one by one
+                    for dataset_pair in repository.get_dataset():
+                        self._search_file_for_candidates(dataset_pair[0], dataset_pair[1], repository, metadata,
+                            repo_subset, input_iterator_collection, input_blocks, request_parameters, corr_function,
+                            candidates_temp_holder)
+                    continue
+
+                #the files are searched by a pool of processes, each one returning the candidates of its file
+                self._load_input(input_iterator_collection, input_blocks, selection_data_vars, corr_function)
+                #the state of the request is sent to the processes (see "search_files_in_parallel")
+                search_file: Callable[[int], Dict[np.datetime64, CandidateContainer]] = functools.partial(
+                    self._search_parallel_file_for_candidates, dataset_file_paths, repository, metadata, repo_subset,
+                    input_iterator_collection, input_blocks, request_parameters, corr_function)
+
+                for file_candidates in search_files_in_parallel(search_file, len(dataset_file_paths)):
+                    for key, candidate in file_candidates.items():
+                        if not key in candidates_temp_holder:
+                            candidates_temp_holder[key] = candidate
+                        else:
+                            candidates_temp_holder[key].merge(candidate)
 
-        #the first step is to iterate all existing repositories to find out which have
-        # the desired data variables
-        for repository in repo_subset.repositories:
-            metadata: RepositoryMetadata = repository.get_metadata()
-            step_variation: np.timedelta64 = np.timedelta64(int(repo_subset.step_variation),'ns')
-            #the datasets have two time dimensions:
-            # - one that has a single timestamp (usually the first date of the given file)
-            # - another will all step values of the existing time dimension
-            # in order to obtain on actual timestamp, it is necessary to sum the the first
-            #timestamp together with the used step value
-            # This is valid for the data that has been processed
-            step_values: npt.NDArray[np.timedelta64]
-            time_date: Union[np.datetime64, npt.NDArray[np.datetime64]] #only a Union since can return both kinds
-                                                                        #with .values attribute (even tho only the
-                                                                        #np.datetime64 is relevant for this context)
-            # from this point, then a sequencial iteration of each file is done one by one
-            for dataset_pair in repository.get_dataset():
-                logging.info("Searching file " + dataset_pair[0])
-                step_values = dataset_pair[1].coords[metadata.time_variation_dim].values
-                time_date = dataset_pair[1].coords[metadata.time_initial_dim].values
-                iterable: bool = True
-
-                if not isinstance(step_values, Iterable):
-                    step_values = cast(npt.NDArray[np.timedelta64],np.array([step_values]))
-                    iterable = False
-
-                for step in step_values:
-                    if metadata.time_gap_container.is_gap(time_date + step, search_data_vars,request_parameters.search_hours):
-                        continue
-
-                    params: Dict[str, Any] = {}
-                    params[metadata.time_variation_dim] = step
-                    dataset_section: xarray.Dataset
-
-                    if iterable:
-                        dataset_section = dataset_pair[1].sel(params)
-                    else:
-                        dataset_section = dataset_pair[1]
-
-                    for var in selection_data_vars:
-                        key: np.datetime64 = time_date + step
-                        best_val: float = 0.0
-                        worst_val: float = 0.0
-                        if var in metadata.data_vars:
-                            input_iterator: InputIterator = input_iterator_collection[var]
-
-                            for input_tuple in input_iterator.iterate():
-                                input_ts: xarray.Dataset = input_tuple[0]
-                                input_interval: int = input_tuple[1]
-                                key -= step_variation * input_interval
-                                sim_val_raw: float = 0.0
-
-                                data_array_section = dataset_section[[var]].to_array()
-                                input_array = input_ts[var]
-                                sim_val_raw += corr_function.calculate(data_array_section, input_array, metadata, var)
-
-                                best_val = sim_val_raw / len(search_data_vars)
-                                worst_val = sim_val_raw / len(search_data_vars)
-
-                                if not key in candidates_temp_holder:
-                                    candidates_temp_holder[key] = CandidateContainer(best_val, worst_val,[var])
-                                else:
-                                    candidates_temp_holder[key].add_value(best_val, worst_val,[var])
-
-                                key -= step_variation
-                                while metadata.time_gap_container.is_gap(key, search_data_vars, request_parameters.search_hours):
-                                    key -= step_variation
-        
         #after all values from the evaluated portions have been calculated, the missing values from the other
         #variables have to be predicted and added to the existing values
         num_vars_used: int = len(selection_data_vars)
@@ -175,8 +149,128 @@ class DataVarCandidateListService(BruteForceTopNService):
 
         return {**candidate_list.to_dict(), **candidates_temp_holder}, input_size
 
+    def _search_parallel_file_for_candidates(self, file_paths: List[str], repository: RepositoryLayer,
+        metadata: RepositoryMetadata, repo_subset: RepositoryCollection, input_iterator_collection: Dict[str,InputIterator],
+        input_blocks: Dict[str, xarray.DataArray], request_parameters: RequestParameters,
+        corr_function: CorrelationFunction, file_index: int) -> Dict[np.datetime64, CandidateContainer]:
+        """Searches a single file for candidates in a process of the pool, returning its candidates to be merged
+
+        Args:
+            file_paths (List[str]): files of the repository
+            file_index (int): index of the searched file
+
+            The remaining arguments are the ones of "_search_file_for_candidates"
+
+        Returns:
+            Dict[np.datetime64, CandidateContainer]: candidates of the file
+        """
+        file_candidates: Dict[np.datetime64, CandidateContainer] = {}
+        file_path: str = file_paths[file_index]
+        dataset: xarray.Dataset = repository.open_dataset_file(file_path)
+        try:
+            self._search_file_for_candidates(file_path, dataset, repository, metadata, repo_subset, 
+                input_iterator_collection, input_blocks, request_parameters, corr_function, file_candidates)
+        finally:
+            dataset.close()
+        return file_candidates
+
+    def _search_file_for_candidates(self, file_path: str, dataset: xarray.Dataset, repository: RepositoryLayer,
+        metadata: RepositoryMetadata, repo_subset: RepositoryCollection, input_iterator_collection: Dict[str,InputIterator],
+        input_blocks: Dict[str, xarray.DataArray], request_parameters: RequestParameters,
+        corr_function: CorrelationFunction, candidates_temp_holder: Dict[np.datetime64, CandidateContainer]) -> None:
+        """Compares every searched step of a file of the dataset with the input, only for the selected
+        data variables, summing the similarity values into the candidates
+
+        Args:
+            file_path (str): path of the file
+            dataset (xarray.Dataset): opened file
+            repository (RepositoryLayer): repository the file belongs to
+            metadata (RepositoryMetadata): metadata of the repository
+            repo_subset (RepositoryCollection): repositories being searched
+            input_iterator_collection (Dict[str,InputIterator]): input of each data variable
+            input_blocks (Dict[str, xarray.DataArray]): cache with the already stacked inputs
+            request_parameters (RequestParameters): parameters of the request
+            corr_function (CorrelationFunction): correlation function being used
+            candidates_temp_holder (Dict[np.datetime64, CandidateContainer]): candidates of the search
+        """
+        if request_parameters.search_data_var is None or request_parameters.selection_data_vars is None:
+            raise ValueError("DataVarCandidateListService requires data variable selection")
+        search_data_vars: List[str] = request_parameters.search_data_var
+        selection_data_vars: List[str] = request_parameters.selection_data_vars
+        step_variation: np.timedelta64 = np.timedelta64(int(repo_subset.step_variation),'ns')
+        #the datasets have two time dimensions:
+        # - one that has a single timestamp (usually the first date of the given file)
+        # - another will all step values of the existing time dimension
+        # in order to obtain on actual timestamp, it is necessary to sum the the first
+        #timestamp together with the used step value
+        # This is valid for the data that has been processed
+        step_values: npt.NDArray[np.timedelta64]
+        time_date: Union[np.datetime64, npt.NDArray[np.datetime64]] #only a Union since can return both kinds
+                                                                    #with .values attribute (even tho only the
+                                                                    #np.datetime64 is relevant for this context)
+        logging.info("Searching file " + file_path)
+        step_values = dataset.coords[metadata.time_variation_dim].values
+        time_date = dataset.coords[metadata.time_initial_dim].values
+        iterable: bool = True
+
+        if not isinstance(step_values, Iterable):
+            step_values = cast(npt.NDArray[np.timedelta64],np.array([step_values]))
+            iterable = False
+
+        searched_steps: List[np.timedelta64] = list(step_values[~metadata.time_gap_container.gap_mask(
+            time_date + step_values, search_data_vars, request_parameters.search_hours)])
+        searched_dates: npt.NDArray[np.datetime64] = \
+            cast(npt.NDArray[np.datetime64], time_date + np.array(searched_steps, dtype="timedelta64[ns]"))
+        batch_values: Dict[str, npt.NDArray[np.float64]] = \
+            self._calculate_batch_similarities(dataset, searched_steps, iterable, input_iterator_collection,
+                input_blocks, selection_data_vars, corr_function, repository, metadata)
+        candidate_keys: Dict[Tuple[int, ...], npt.NDArray[np.datetime64]] = {}
+        for var in selection_data_vars:
+            time_intervals: List[int] = input_iterator_collection[var].get_time_intervals()
+            if var in metadata.data_vars and not tuple(time_intervals) in candidate_keys:
+                candidate_keys[tuple(time_intervals)] = self._calculate_candidate_keys(searched_dates,
+                    time_intervals, step_variation, metadata.time_gap_container, search_data_vars,
+                    request_parameters.search_hours)
+
+        for step_index, step in enumerate(searched_steps):
+            params: Dict[str, Any] = {}
+            params[metadata.time_variation_dim] = step
+            dataset_section: xarray.Dataset
+
+            if iterable:
+                dataset_section = dataset.sel(params)
+            else:
+                dataset_section = dataset
+
+            for var in selection_data_vars:
+                best_val: float = 0.0
+                worst_val: float = 0.0
+                if var in metadata.data_vars:
+                    input_iterator: InputIterator = input_iterator_collection[var]
+                    prepared_inputs: List[PreparedInput] = input_iterator.get_prepared_inputs(corr_function, var)
+                    step_keys: npt.NDArray[np.datetime64] = \
+                        candidate_keys[tuple(input_iterator.get_time_intervals())][step_index]
+
+                    for input_index, key in enumerate(step_keys):
+                        sim_val_raw: float = 0.0
+
+                        if var in batch_values:
+                            sim_val_raw += float(batch_values[var][step_index, input_index])
+                        else:
+                            data_array_section = dataset_section[[var]].to_array()
+                            sim_val_raw += corr_function.calculate_prepared(data_array_section,
+                                prepared_inputs[input_index], metadata, var)
+
+                        best_val = sim_val_raw / len(search_data_vars)
+                        worst_val = sim_val_raw / len(search_data_vars)
+
+                        if not key in candidates_temp_holder:
+                            candidates_temp_holder[key] = CandidateContainer(best_val, worst_val,[var])
+                        else:
+                            candidates_temp_holder[key].add_value(best_val, worst_val,[var])
+
     def execute_search_on_ts(self, result_iterator: Iterator[HeuristicResult], file_paths: Dict[str,List[str]], 
         request_parameters: RequestParameters, corr_function: CorrelationFunction,
-        num_results:Optional[int] = None) -> Tuple[Dict[str, ResultContainer], int]:
+        num_results:Optional[int] = None) -> Tuple[ResultStore, int]:
         return super().execute_search_on_ts(result_iterator, file_paths, request_parameters, corr_function,num_results)
-        
\ No newline at end of file
+        
@@ -0,0 +1,110 @@
+import importlib
+import multiprocessing
+import os
+import pickle
+import threading
+from typing import Any, Callable, Final, Iterator, Optional, TypeVar
+
+"""The files of a repository can be searched in parallel by a pool of processes, each one
+opening its own files and returning the partial results of every file, which are then merged
+by the service in the order of the files.
+
+The worker is multi-threaded (the gRPC server, the progress of the searches, the read-ahead),
+so the processes are not forked from it: a forked process could inherit a lock held by another
+thread and never release it. They are created by a "forkserver", a single-threaded process that
+imports the implementations once (like the worker, through "auxiliar"), so that the processes of
+every pool are started without importing them again. The state of the request (the repositories,
+the input, already in memory, and the correlation function) is serialized once for every process
+of the pool, and then only the index of each file and its results are sent between the processes.
+"""
+
+DEFAULT_SEARCH_PROCESSES: Final = 1
+#folder of the modules of the worker
+WORKER_PATH: Final = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+T = TypeVar("T")
+
+class ParallelSearchSettings:
+    """Number of processes used to search the files of a repository (1 searches them sequentially)
+    """
+    def __init__(self, processes: int = DEFAULT_SEARCH_PROCESSES) -> None:
+        self._processes: int
+        self.processes = processes
+
+    @property
+    def processes(self) -> int:
+        return self._processes
+
+    @processes.setter
+    def processes(self, processes: int) -> None:
+        if processes < 1:
+            raise ValueError("The number of search processes must be a positive number")
+        self._processes = processes
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._processes > 1
+
+
+#settings shared by all services of the process
+parallel_search_settings: Final = ParallelSearchSettings()
+
+#search of a single file, only defined inside the processes of the pool
+_file_search: Optional[Callable[[int], Any]] = None
+#context of the pools, created with the first pool of the worker
+_context: Optional[multiprocessing.context.BaseContext] = None
+_context_lock: Final = threading.Lock()
+
+def _set_file_search(file_search: bytes) -> None:
+    global _file_search
+    #the implementations are imported before the search is deserialized, in the same order as the worker
+    importlib.import_module("auxiliar")
+    _file_search = pickle.loads(file_search)
+
+def _search_file(file_index: int) -> Any:
+    if _file_search is None:
+        raise ValueError("The search of the files was not defined in this process")
+    return _file_search(file_index)
+
+def _get_context() -> multiprocessing.context.BaseContext:
+    """Returns the context of the pools, configuring the forkserver the first time. The configuration
+    changes the environment of the worker, so it is only done once for all requests
+
+    Returns:
+        multiprocessing.context.BaseContext: context of the "forkserver"
+    """
+    global _context
+    with _context_lock:
+        if _context is None:
+            context = multiprocessing.get_context("forkserver")
+            #the forkserver imports the preloaded modules with the paths of the environment (the paths of the
+            # worker are only given to the processes it creates)
+            python_path: Optional[str] = os.environ.get("PYTHONPATH")
+            if python_path is None or not WORKER_PATH in python_path.split(os.pathsep):
+                os.environ["PYTHONPATH"] = WORKER_PATH if python_path is None else WORKER_PATH + os.pathsep + python_path
+            context.set_forkserver_preload(["auxiliar"])
+            _context = context
+        return _context
+
+def search_files_in_parallel(file_search: Callable[[int], T], num_files: int,
+    processes: Optional[int] = None) -> Iterator[T]:
+    """Executes the search of every file in a pool of processes
+
+    Args:
+        file_search (Callable[[int], T]): searches the file with the given index, returning its results.
+        The search (for example, a "functools.partial" of a method of the service) and its results must 
+        be serializable
+        num_files (int): number of files
+        processes (Optional[int], optional): number of processes. Defaults to None (the value of
+        "parallel_search_settings")
+
+    Yields:
+        Iterator[T]: results of every file, in the order of the files
+    """
+    if processes is None:
+        processes = parallel_search_settings.processes
+    if num_files == 0:
+        return
+    with _get_context().Pool(min(processes, num_files), initializer=_set_file_search,
+        initargs=(pickle.dumps(file_search),)) as pool:
+        yield from pool.imap(_search_file, range(num_files))
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from typing import Dict, Final, List, Mapping, Optional, Tuple
+from correlation_functions.compute_precision import compute_precision
+from service.data_types import ResultContainer, results_to_arrays
+from service.service_main_structure import RequestParameters, ServiceLayer
+
+"""The same input files are often submitted several times with the same options (for example,
+by dashboards or when the master is restarted), and every submission would repeat the full search.
+With the result cache, the final results of the searches of the worker are stored in local files,
+so that a repeated request returns them without searching the repositories.
+
+A request is identified by a hash of the bytes of its input files, the request parameters, the
+correlation function, the number of results, the service and the version stamp of each repository
+(see "RepositoryLayer.get_version_stamp"), so the cached results are no longer used once the
+dataset changes. The least recently used results are removed when the files exceed the size cap.
+"""
+
+DEFAULT_RESULT_CACHE_FOLDER: Final = "./result_cache"
+DEFAULT_RESULT_CACHE_SIZE: Final = 0 #bytes
+RESULT_CACHE_EXTENSION: Final = ".res"
+
+class ResultCacheSettings:
+    """Folder of the cached results and maximum size of its files (in bytes, 0 disables the cache)
+    """
+    def __init__(self, folder: str = DEFAULT_RESULT_CACHE_FOLDER, size: int = DEFAULT_RESULT_CACHE_SIZE) -> None:
+        self._folder: str
+        self._size: int
+        self.folder = folder
+        self.size = size
+
+    @property
+    def folder(self) -> str:
+        return self._folder
+
+    @folder.setter
+    def folder(self, folder: str) -> None:
+        if len(folder) == 0:
+            raise ValueError("The folder of the result cache can not be empty")
+        self._folder = folder
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @size.setter
+    def size(self, size: int) -> None:
+        if size < 0:
+            raise ValueError("The size of the result cache can not be negative")
+        self._size = size
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._size > 0
+
+
+#settings shared by all controllers of the process
+result_cache_settings: Final = ResultCacheSettings()
+
+def _request_parameters_description(request_parameters: RequestParameters) -> str:
+    """Describes every parameter of the request that changes the results
+
+    Args:
+        request_parameters (RequestParameters): parameters of the request
+
+    Returns:
+        str: description of the parameters
+    """
+    selection_parameters: Optional[List[Tuple[str, float, float]]] = None
+    if not request_parameters.dataset_selection_parameters is None:
+        selection_parameters = [(param.name, param.min, param.max)
+            for param in request_parameters.dataset_selection_parameters]
+    return repr([request_parameters.search_data_var, selection_parameters, request_parameters.ts_neighbour_gap,
+        request_parameters.search_hours, request_parameters.input_step_difference,
+        request_parameters.selection_data_vars])
+
+
+class ResultCache:
+    """Stores the final results of the searches in local files, identified by the content of the request
+    """
+    def __init__(self, settings: Optional[ResultCacheSettings] = None) -> None:
+        """
+        Args:
+            settings (Optional[ResultCacheSettings], optional): settings of the cache. Defaults to None
+            (the value of "result_cache_settings")
+        """
+        self._settings: ResultCacheSettings = result_cache_settings if settings is None else settings
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._settings.is_enabled
+
+    def request_key(self, service: ServiceLayer, file_paths: Dict[str, List[str]], request_parameters: RequestParameters,
+        corr_function_name: str, num_results: Optional[int] = None) -> str:
+        """Builds the key that identifies the results of a request
+
+        Args:
+            service (ServiceLayer): service that executes the search
+            file_paths (Dict[str, List[str]]): input files of each data variable
+            request_parameters (RequestParameters): parameters of the request
+            corr_function_name (str): name of the correlation function
+            num_results (Optional[int], optional): number of wanted results. Defaults to None.
+
+        Returns:
+            str: key of the request
+        """
+        key = hashlib.sha256()
+        key.update(repr([type(service).__name__, corr_function_name, num_results, str(compute_precision),
+            _request_parameters_description(request_parameters)]).encode())
+        #only the content of the input files is used, since their names change between requests
+        for data_var in sorted(file_paths):
+            key.update(("\n" + data_var).encode())
+            for file_path in file_paths[data_var]:
+                with open(file_path, "rb") as f:
+                    key.update(hashlib.sha256(f.read()).digest())
+        for repository in service.repositories.repositories:
+            key.update(repository.get_version_stamp().encode())
+        return key.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._settings.folder, key + RESULT_CACHE_EXTENSION)
+
+    def get(self, key: str) -> Optional[Tuple[Mapping[str, ResultContainer], int]]:
+        """Returns the cached results of a request
+
+        Args:
+            key (str): key of the request (see "request_key")
+
+        Returns:
+            Optional[Tuple[Mapping[str, ResultContainer], int]]: results and size of the input, or None
+            if the request is not cached
+        """
+        if not self.is_enabled:
+            return None
+        path: str = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    timestamps, values, sum_counters, input_size = pickle.load(f)
+                #the modification time orders the cached results by their last use
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+        logging.info("Results found in the result cache")
+        results: Dict[str, ResultContainer] = {ts: ResultContainer(value, sum_counter)
+            for ts, value, sum_counter in zip(timestamps, values, sum_counters)}
+        return results, input_size
+
+    def put(self, key: str, results: Mapping[str, ResultContainer], input_size: int) -> None:
+        """Stores the results of a request, removing the least recently used results if the size
+        of the cache is exceeded
+
+        Args:
+            key (str): key of the request (see "request_key")
+            results (Mapping[str, ResultContainer]): final results of the search
+            input_size (int): size of the input
+        """
+        if not self.is_enabled:
+            return
+        timestamps, values, sum_counters = results_to_arrays(results)
+        path: str = self._path(key)
+        with self._lock:
+            os.makedirs(self._settings.folder, exist_ok=True)
+            #the file is only visible once it is complete
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump((timestamps, values.tolist(), sum_counters.tolist(), input_size), f)
+            os.replace(path + ".tmp", path)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Removes the least recently used results until the files fit in the size of the settings
+        """
+        entries: List[Tuple[int, int, str]] = []
+        for file_name in os.listdir(self._settings.folder):
+            if file_name.endswith(RESULT_CACHE_EXTENSION):
+                path: str = os.path.join(self._settings.folder, file_name)
+                file_stat: os.stat_result = os.stat(path)
+                entries.append((file_stat.st_mtime_ns, file_stat.st_size, path))
+        entries.sort()
+        total_size: int = sum(entry[1] for entry in entries)
+        for _, size, path in entries:
+            if total_size <= self._settings.size:
+                break
+            os.remove(path)
+            total_size -= size
+
+
+#cache shared by all controllers of the process
+result_cache: Final = ResultCache()
@@ -1,4 +1,4 @@
-from typing import Dict, Iterator, List, Optional, Tuple, Type
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Type
 
 import numpy as np
 from controller.file_protocol.dtos.dataset_properties import InputFileProperties
@@ -196,7 +196,46 @@ class RequestParameters:
     def selection_data_vars(self, data_vars: List[str]) -> None:
         self._selection_data_vars = data_vars
     
-    
+
+class SearchProgress:
+    """Snapshot of a search that is still being executed, reported after every searched file
+    """
+
+    def __init__(self, scanned_files: int, total_files: int, results: Mapping[str, ResultContainer],
+        threshold: Optional[float] = None) -> None:
+        """
+        Args:
+            scanned_files (int): number of files already searched
+            total_files (int): number of files to be searched (0 if unknown)
+            results (Mapping[str, ResultContainer]): best complete results found so far
+            threshold (Optional[float], optional): final similarity value of the N-th best result. 
+            Defaults to None (there are not N complete results yet).
+        """
+        self._scanned_files: int = scanned_files
+        self._total_files: int = total_files
+        self._results: Mapping[str, ResultContainer] = results
+        self._threshold: Optional[float] = threshold
+
+    @property
+    def scanned_files(self) -> int:
+        return self._scanned_files
+
+    @property
+    def total_files(self) -> int:
+        return self._total_files
+
+    @property
+    def results(self) -> Mapping[str, ResultContainer]:
+        return self._results
+
+    @property
+    def threshold(self) -> Optional[float]:
+        return self._threshold
+
+
+#receives the snapshots of a search
+ProgressCallback = Callable[[SearchProgress], None]
+
 class ServiceLayer:
     """
     Class for the representation of the service layer.
@@ -217,7 +256,8 @@ class ServiceLayer:
         return self._repositories
 
     def execute_search(self, file_paths: Dict[str, List[str]], request_parameters: RequestParameters, 
-        corr_function: CorrelationFunction, num_results:Optional[int] = None) -> Tuple[Dict[str, ResultContainer],int]:
+        corr_function: CorrelationFunction, num_results:Optional[int] = None, 
+        progress: Optional[ProgressCallback] = None) -> Tuple[Mapping[str, ResultContainer],int]:
         """Method to execute a full brute force search
 
         Args:
@@ -225,9 +265,11 @@ class ServiceLayer:
             request_parameters (RequestParameters): extra parameters that can be used for the search process
             corr_function (CorrelationFunction): correlation function to be used
             num_results (Optional[int]): number of wanted results
+            progress (Optional[ProgressCallback]): receives a snapshot of the search after every searched file.
+            Defaults to None.
 
         Returns:
-            Tuple[Dict[str, ResultContainer],int]: Obtained results and size of the input in the time dimension
+            Tuple[Mapping[str, ResultContainer],int]: Obtained results and size of the input in the time dimension
         """
         raise NotImplementedError("Method must be overriden")
 
@@ -260,7 +302,7 @@ class ServiceLayer:
     
     def execute_search_on_ts(self, result_iterator: Iterator[HeuristicResult], file_paths: Dict[str,List[str]], 
         request_parameters: RequestParameters, corr_function: CorrelationFunction,
-        num_results:Optional[int] = None) -> Tuple[Dict[str, ResultContainer], int]:
+        num_results:Optional[int] = None) -> Tuple[Mapping[str, ResultContainer], int]:
         """Method to execute a search on the given timestamp
 
         Args:
@@ -270,7 +312,7 @@ class ServiceLayer:
             num_results (Optional[int]): number of wanted results
         
         Returns:
-            Tuple[Dict[str, ResultContainer], int]: received results
+            Tuple[Mapping[str, ResultContainer], int]: received results
         """
         raise NotImplementedError("Method must be overriden")
     
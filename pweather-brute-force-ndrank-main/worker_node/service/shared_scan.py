@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Final, List, Optional
+import xarray
+from repository.repository_layer import RepositoryLayer
+
+"""When several requests arrive at the worker around the same time, each one would read
+(and decompress) every file of the repositories. With the shared scan, the requests that
+arrive within a batching window are attached to a single pass over the files: every file
+is opened once and searched for all attached requests before the next one is opened.
+
+The first request of a batch waits for the window and then executes the pass in its own
+thread, while the other requests of the batch wait for it to finish. Every request keeps
+its own results, only the files are shared. The files that fit in the memory budget of the
+read-ahead (see "read_ahead_settings") are read from the disk a single time.
+"""
+
+DEFAULT_SHARED_SCAN_WINDOW: Final = 0.0 #seconds
+
+FileSearch = Callable[[RepositoryLayer, str, xarray.Dataset], None]
+
+class SharedScanSettings:
+    """Time (in seconds) the first request of a batch waits for other requests (0 disables the shared scan)
+    """
+    def __init__(self, window: float = DEFAULT_SHARED_SCAN_WINDOW) -> None:
+        self._window: float
+        self.window = window
+
+    @property
+    def window(self) -> float:
+        return self._window
+
+    @window.setter
+    def window(self, window: float) -> None:
+        if window < 0:
+            raise ValueError("The window of the shared scan can not be negative")
+        self._window = window
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._window > 0
+
+
+#settings shared by all services of the process
+shared_scan_settings: Final = SharedScanSettings()
+
+class _ScanJob:
+    """Search of a single request attached to a pass"""
+    def __init__(self, repositories: List[RepositoryLayer], search_file: FileSearch) -> None:
+        self.repositories: List[RepositoryLayer] = repositories
+        self.search_file: FileSearch = search_file
+        self.error: Optional[BaseException] = None
+        self.finished: threading.Event = threading.Event()
+
+    def uses(self, repository: RepositoryLayer) -> bool:
+        return any(repository is job_repository for job_repository in self.repositories)
+
+
+class SharedScan:
+    """Groups the searches of the requests that arrive within the window of the settings into
+    a single pass over the files of their repositories
+    """
+    def __init__(self, settings: Optional[SharedScanSettings] = None) -> None:
+        """
+        Args:
+            settings (Optional[SharedScanSettings], optional): settings of the shared scan. Defaults to None
+            (the value of "shared_scan_settings")
+        """
+        self._settings: SharedScanSettings = shared_scan_settings if settings is None else settings
+        self._lock: threading.Lock = threading.Lock()
+        self._pending: List[_ScanJob] = []
+
+    def execute(self, repositories: List[RepositoryLayer], search_file: FileSearch) -> None:
+        """Searches every file of the repositories, together with the requests of the same batch.
+        Returns when every file was searched
+
+        Args:
+            repositories (List[RepositoryLayer]): repositories searched by the request
+            search_file (FileSearch): searches a single file (repository, file path, opened file) for
+            the request. The file is closed by the pass
+
+        Raises:
+            BaseException: the error raised while the files of the request were searched
+        """
+        job: _ScanJob = _ScanJob(repositories, search_file)
+        with self._lock:
+            self._pending.append(job)
+            is_first: bool = len(self._pending) == 1
+        if is_first:
+            time.sleep(self._settings.window)
+            with self._lock:
+                jobs: List[_ScanJob] = self._pending
+                self._pending = []
+            self._scan(jobs)
+        job.finished.wait()
+        if not job.error is None:
+            raise job.error
+
+    def _scan(self, jobs: List[_ScanJob]) -> None:
+        """Executes the pass over the repositories of the jobs, in the order they were requested
+
+        Args:
+            jobs (List[_ScanJob]): searches of the batch
+        """
+        logging.info("Shared scan of " + str(len(jobs)) + " requests")
+        repositories: Dict[int, RepositoryLayer] = {}
+        for job in jobs:
+            for repository in job.repositories:
+                repositories.setdefault(id(repository), repository)
+        try:
+            for repository in repositories.values():
+                repository_jobs: List[_ScanJob] = [job for job in jobs if job.uses(repository)]
+                try:
+                    for file_path, dataset in repository.get_dataset():
+                        try:
+                            for job in repository_jobs:
+                                if job.error is None:
+                                    try:
+                                        job.search_file(repository, file_path, dataset)
+                                    except Exception as e:
+                                        job.error = e
+                        finally:
+                            dataset.close()
+                except Exception as e:
+                    #the files of the repository can not be iterated (for example, round robin repositories)
+                    for job in repository_jobs:
+                        if job.error is None:
+                            job.error = e
+        finally:
+            for job in jobs:
+                job.finished.set()
+
+
+#pass shared by all services of the process (the repositories are compared by identity)
+shared_scan: Final = SharedScan()
@@ -1,13 +1,24 @@
-from typing import Any, Dict, Final
+import os
+from typing import Any, Dict, Final, List, Tuple
 import pytest
 import xarray
 import numpy as np
 import numpy.typing as npt
+from auxiliar.climatology_cache import ClimatologyCache
+from auxiliar.component_injector import component_injector
+from correlation_functions.compute_precision import FLOAT32_PRECISION, FLOAT64_PRECISION, compute_precision
 from correlation_functions.correlation_statistics import CorrelationStatistics
 
-from correlation_functions.main_structure import CorrelationFunction
-from correlation_functions.implementations.implementations import EnhancedPcc, Rmsd
+from correlation_functions.main_structure import CorrelationFunction, calculate_batch_metrics
+from correlation_functions.moments import DATASET_COUNT, SUM_DATASET, SUM_PRODUCTS, SUM_SQUARES_DATASET, \
+    calculate_field_moments
+from correlation_functions.prepared_input import PreparedInput
+from correlation_functions.statistics_collection import StatisticsCollection
+from correlation_functions.implementations.implementations import EnhancedPcc, ParameterFileCollection, Pcc, Rmsd, \
+    _cauchy_schwarz_partial_bounds
+from repository.auxiliary_structures.field_statistics import FieldMask, FieldStatistics
 from repository.repository_layer import DummyRepositoryMetadata, RepositoryMetadata
+from service.early_abandon import CandidateThreshold, EarlyAbandonScan
 
 PROPERTIES_PATH: Final = "./worker_node/test/test_correlation_properties/properties.yaml"
 
@@ -131,4 +142,425 @@ def test_nan_replacement() -> None:
 
     assert not np.isnan(da1).any()
     assert not np.isnan(res).any()
-    
\ No newline at end of file
+    
+def _create_block(values: npt.NDArray, date_as_string: str, name: str = "z") -> xarray.DataArray:
+    return xarray.DataArray(
+        data=values,
+        dims=["step","x","y"],
+        coords=dict(
+            step=(["step"], [np.timedelta64(i,'h') for i in range(values.shape[0])]),
+            x=("x",np.arange(values.shape[1])),
+            y=("y",np.arange(values.shape[2])),
+            time=np.datetime64(date_as_string)
+        ),
+        name=name
+    )
+
+def test_calculate_batch() -> None:
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(0)
+    dataset_values: npt.NDArray = generator.normal(size=(5,4,3))
+    input_values: npt.NDArray = generator.normal(size=(2,4,3))
+    dataset_values[1,0,0] = np.nan
+    input_values[0,2,1] = np.nan
+
+    dataset_block: xarray.DataArray = _create_block(dataset_values, "2014-01-01T00:00:00")
+    input_block: xarray.DataArray = _create_block(input_values, "2014-01-01T00:00:00").transpose("step","y","x")
+
+    corr_function: CorrelationFunction
+    for corr_function in [Pcc("pcc"), Rmsd("rmsd")]:
+        assert corr_function.supports_batch
+        res: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z")
+        assert res.shape == (5,2)
+        for i in range(5):
+            for j in range(2):
+                expected: float = corr_function.calculate(dataset_block.isel(step=i), input_block.isel(step=j), 
+                    repo_metadata, "z")
+                assert np.isclose(res[i,j], expected)
+
+def test_calculate_batch_with_statistics() -> None:
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(1)
+    dataset_values: npt.NDArray = generator.normal(loc=50, size=(5,4,3))
+    input_values: npt.NDArray = generator.normal(loc=50, size=(2,4,3))
+    dataset_block: xarray.DataArray = _create_block(dataset_values, "2014-01-01T00:00:00")
+    input_block: xarray.DataArray = _create_block(input_values, "2014-01-01T00:00:00")
+
+    flat_values: npt.NDArray = dataset_values.reshape(5,-1)
+    statistics: FieldStatistics = FieldStatistics(flat_values.sum(axis=1), (flat_values**2).sum(axis=1), 
+        np.full(5, flat_values.shape[1]))
+
+    corr_function: CorrelationFunction
+    for corr_function in [Pcc("pcc"), Rmsd("rmsd")]:
+        assert np.allclose(corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z", statistics),
+            corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z"))
+
+def test_enhanced_pcc_batch() -> None:
+    pcc: EnhancedPcc = EnhancedPcc("enhanced-pcc",PROPERTIES_PATH)
+    repo_metadata: RepositoryMetadata = RepositoryMetadata({
+        "step": 1.0,
+        'time-variation-dim': "step",
+        'time-initial-dim': "time",
+        "data-vars": ["z"]
+    })
+    da1: xarray.DataArray = _create_data_array([[3],[2],[5],[6]],"2014-01-01T00:00:00")
+    da2: xarray.DataArray = _create_data_array([[1],[4],[3],[2]],"2014-01-01T00:00:00")
+
+    res: npt.NDArray = pcc.calculate_batch(xarray.concat([da1, da2], dim="step"), da2, repo_metadata, "z")
+
+    assert res.shape == (2,1)
+    assert round(res[0,0],5) == round(pcc.calculate(da1,da2,repo_metadata,"z"),5) == -0.28284
+    assert round(res[1,0],5) == 1.0
+
+def test_enhanced_pcc_standardized_repository() -> None:
+    pcc: EnhancedPcc = EnhancedPcc("enhanced-pcc",PROPERTIES_PATH)
+    info: Dict[str, Any] = {
+        "step": 1.0,
+        'time-variation-dim': "step",
+        'time-initial-dim': "time",
+        "data-vars": ["z"]
+    }
+    repo_metadata: RepositoryMetadata = RepositoryMetadata(info)
+    standardized_metadata: RepositoryMetadata = RepositoryMetadata(info, standardized=True)
+    assert not repo_metadata.is_standardized and standardized_metadata.is_standardized
+
+    da1: xarray.DataArray = _create_data_array([[3],[2],[5],[6]],"2014-01-01T00:00:00")
+    da2: xarray.DataArray = _create_data_array([[1],[4],[3],[2]],"2014-01-01T00:00:00")
+    standardized_da1: xarray.DataArray = pcc._process_arrays_correctly(da1,repo_metadata,"z")
+
+    expected: float = pcc.calculate(da1,da2,repo_metadata,"z")
+    assert round(pcc.calculate(standardized_da1,da2,standardized_metadata,"z"),5) == round(expected,5)
+    assert round(pcc.calculate_batch(standardized_da1,da2,standardized_metadata,"z")[0,0],5) == round(expected,5)
+
+    #the statistics of a standardized repository are the ones of its stored values
+    stats: Dict[str, Any] = pcc.setup_stats(da1,repo_metadata,"z").get_values()
+    standardized_stats: Dict[str, Any] = pcc.setup_stats(standardized_da1,standardized_metadata,"z").get_values()
+    assert stats.keys() == standardized_stats.keys()
+    for key in stats:
+        assert np.isclose(stats[key], standardized_stats[key])
+    input_stats: Dict[str, Any] = pcc.setup_input_stats(da2,standardized_metadata,"z").get_values()
+    assert input_stats == pcc.setup_input_stats(da2,repo_metadata,"z").get_values()
+
+    for selection_params in [{"x": slice(1,2)}, {"x": slice(1,4)}]:
+        bounds: Tuple[float, float] = pcc.calculate_partial_value(da2.sel(selection_params), da1.sel(selection_params),
+            pcc.setup_input_stats(da2,repo_metadata,"z"), pcc.setup_stats(da1,repo_metadata,"z"), selection_params, 
+            repo_metadata, "z")
+        standardized_bounds: Tuple[float, float] = pcc.calculate_partial_value(da2.sel(selection_params), 
+            standardized_da1.sel(selection_params), pcc.setup_input_stats(da2,standardized_metadata,"z"), 
+            pcc.setup_stats(standardized_da1,standardized_metadata,"z"), selection_params, standardized_metadata, "z")
+        assert np.allclose(bounds, standardized_bounds)
+    #with every value, both bounds are the final value
+    assert round(standardized_bounds[0],5) == round(standardized_bounds[1],5) == round(expected,5)
+
+    pcc.uses_standardized_repositories = False
+    assert round(pcc.calculate(da1,da2,standardized_metadata,"z"),5) == round(expected,5)
+
+def test_prepared_input() -> None:
+    repo_metadata: RepositoryMetadata = RepositoryMetadata({
+        "step": 1.0,
+        'time-variation-dim': "step",
+        'time-initial-dim': "time",
+        "data-vars": ["z"]
+    })
+    da1: xarray.DataArray = _create_data_array([[3],[2],[5],[6]],"2014-01-01T00:00:00")
+    da2: xarray.DataArray = _create_data_array([[1],[4],[3],[2]],"2014-01-01T00:00:00")
+
+    corr_function: CorrelationFunction
+    for corr_function in [Pcc("pcc"), EnhancedPcc("enhanced-pcc",PROPERTIES_PATH), Rmsd("rmsd")]:
+        prepared: PreparedInput = corr_function.prepare_input(da2, repo_metadata, "z")
+        expected: float = corr_function.calculate(da1, da2, repo_metadata, "z")
+        assert np.isclose(corr_function.calculate_prepared(da1, prepared, repo_metadata, "z"), expected)
+
+        res: npt.NDArray = corr_function.calculate_batch(xarray.concat([da1, da2], dim="step"), da2, repo_metadata, "z",
+            prepared_inputs=[prepared])
+        assert np.isclose(res[0,0], expected)
+
+def test_rmsd_norm_expansion() -> None:
+    rmsd: Rmsd = Rmsd("rmsd")
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(2)
+    #values with the magnitude of the geopotential, where the cancellation is more relevant
+    dataset_array: xarray.DataArray = _create_block(generator.normal(loc=50000, scale=100, size=(1,40,30)), 
+        "2014-01-01T00:00:00").isel(step=0)
+    input_array: xarray.DataArray = _create_block(generator.normal(loc=50000, scale=100, size=(1,40,30)), 
+        "2014-01-01T00:00:00").isel(step=0)
+
+    def expected_rmsd(dataset_part: xarray.DataArray, input_part: xarray.DataArray, count: int) -> float:
+        return float(np.sqrt(((dataset_part - input_part)**2).sum().values.item() / count))
+
+    expected: float = expected_rmsd(dataset_array, input_array, dataset_array.size)
+    assert np.isclose(rmsd.calculate(dataset_array, input_array, repo_metadata, "z"), expected, rtol=1e-9)
+
+    prepared: PreparedInput = rmsd.prepare_input(input_array, repo_metadata, "z")
+    flat_values: npt.NDArray = dataset_array.values.ravel()
+    statistics: FieldStatistics = FieldStatistics(np.array([flat_values.sum()]), np.array([np.dot(flat_values, flat_values)]),
+        np.array([flat_values.size]))
+    assert np.isclose(rmsd.calculate_prepared(dataset_array, prepared, repo_metadata, "z"), expected, rtol=1e-9)
+    assert np.isclose(rmsd.calculate_prepared(dataset_array, prepared, repo_metadata, "z", statistics), expected, rtol=1e-9)
+    assert rmsd.calculate_prepared(input_array, prepared, repo_metadata, "z") == 0.0
+
+    params: Dict[str, Any] = {"x": slice(0, 9)}
+    dataset_stats: CorrelationStatistics = rmsd.setup_stats(dataset_array, repo_metadata, "z")
+    input_stats: CorrelationStatistics = rmsd.setup_stats(input_array, repo_metadata, "z")
+    best_value: float = rmsd.calculate_partial_value(input_array.sel(params), dataset_array.sel(params), 
+        input_stats, dataset_stats, params, repo_metadata, "z")[0]
+    assert np.isclose(best_value, expected_rmsd(dataset_array.sel(params), input_array.sel(params), dataset_array.size), 
+        rtol=1e-9)
+
+    #missing values use the original calculation
+    dataset_array[0, 0] = np.nan
+    assert np.isclose(rmsd.calculate_prepared(dataset_array, prepared, repo_metadata, "z"), 
+        expected_rmsd(dataset_array, input_array, dataset_array.count().values.item()))
+
+def test_single_compute_precision() -> None:
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(3)
+    dataset_values: npt.NDArray = generator.normal(loc=50000, scale=100, size=(6,40,30)).astype(np.float32)
+    input_values: npt.NDArray = generator.normal(loc=50000, scale=100, size=(2,40,30)).astype(np.float32)
+    dataset_block: xarray.DataArray = _create_block(dataset_values, "2014-01-01T00:00:00")
+    input_block: xarray.DataArray = _create_block(input_values, "2014-01-01T00:00:00")
+
+    flat_values: npt.NDArray = dataset_values.reshape(6,-1).astype(np.float64)
+    statistics: FieldStatistics = FieldStatistics(flat_values.sum(axis=1), (flat_values**2).sum(axis=1), 
+        np.full(6, flat_values.shape[1]))
+
+    with pytest.raises(ValueError):
+        compute_precision.mode = "float16"
+
+    corr_function: CorrelationFunction
+    try:
+        for corr_function in [Pcc("pcc"), Rmsd("rmsd")]:
+            for dataset_statistics in [None, statistics]:
+                compute_precision.mode = FLOAT64_PRECISION
+                expected: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z",
+                    dataset_statistics)
+                compute_precision.mode = FLOAT32_PRECISION
+                res: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z",
+                    dataset_statistics)
+                assert res.dtype == np.float64
+                assert np.allclose(res, expected, rtol=1e-5, atol=1e-6)
+    finally:
+        compute_precision.mode = FLOAT64_PRECISION
+
+def test_rmsd_early_abandon() -> None:
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(4)
+    dataset_values: npt.NDArray = generator.normal(size=(6,40,30))
+    input_values: npt.NDArray = generator.normal(size=(2,40,30))
+    dataset_block: xarray.DataArray = _create_block(dataset_values, "2014-01-01T00:00:00")
+    input_block: xarray.DataArray = _create_block(input_values, "2014-01-01T00:00:00")
+    corr_function: Rmsd = Rmsd("rmsd")
+    expected: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z")
+
+    bounds: List[npt.NDArray] = []
+    def never_abandon(lower_bounds: npt.NDArray) -> npt.NDArray:
+        bounds.append(lower_bounds.copy())
+        return np.zeros(lower_bounds.shape, dtype=np.bool_)
+    res: Any = corr_function.calculate_batch_early_abandon(dataset_block, input_block, repo_metadata, "z",
+        never_abandon, 500)
+    assert np.allclose(res, expected)
+    #the bounds only grow until they reach the final values
+    assert len(bounds) == 4
+    assert all(np.all(bounds[i] <= bounds[i+1] + 1e-12) for i in range(len(bounds)-1))
+    assert np.allclose(bounds[-1], expected)
+
+    res = corr_function.calculate_batch_early_abandon(dataset_block, input_block, repo_metadata, "z",
+        lambda lower_bounds: np.ones(lower_bounds.shape, dtype=np.bool_), 500)
+    assert np.isnan(res).all()
+
+    #fields with a large mean (like the geopotential), where the first input is equal to the third field
+    large_dataset_values: npt.NDArray = 50000 + 100 * generator.normal(size=(6,40,30))
+    large_input_values: npt.NDArray = np.stack([large_dataset_values[2], 50000 + 100 * generator.normal(size=(40,30))])
+    large_dataset_block: xarray.DataArray = _create_block(large_dataset_values, "2014-01-01T00:00:00")
+    large_input_block: xarray.DataArray = _create_block(large_input_values, "2014-01-01T00:00:00")
+    expected = corr_function.calculate_batch(large_dataset_block, large_input_block, repo_metadata, "z")
+    #the cells whose bound exceeds the median of the final values are abandoned
+    limit: float = float(np.median(expected))
+    res = corr_function.calculate_batch_early_abandon(large_dataset_block, large_input_block, repo_metadata, "z",
+        lambda lower_bounds: lower_bounds > limit, 500)
+    kept: npt.NDArray = ~np.isnan(res)
+    assert kept.any() and not kept.all()
+    assert np.allclose(res[kept], expected[kept], rtol=1e-12, atol=0)
+    assert res[2, 0] == 0.0
+
+    #only candidate 3 has both comparisons in the block
+    keys: npt.NDArray = np.array([[8, 0], [3, 1], [9, 3]]).astype("datetime64[h]")
+    threshold: CandidateThreshold = CandidateThreshold(2, corr_function)
+    assert threshold.threshold is None
+    for value in [5.0, np.nan, 1.0, 3.0]:
+        threshold.add(value)
+    assert threshold.threshold == 3.0
+    scan: EarlyAbandonScan = EarlyAbandonScan(keys, 1, threshold)
+    abandoned: npt.NDArray = scan.abandoned_cells(np.array([[1.0, 1.0], [2.0, 9.0], [9.0, 9.0]]))
+    assert np.array_equal(abandoned, [[False, False], [True, False], [False, True]])
+    assert list(scan.abandoned_keys) == [keys[1,0]]
+    assert len(scan.complete_keys) == 0
+
+def test_cauchy_schwarz_partial_bounds() -> None:
+    generator: np.random.Generator = np.random.default_rng(5)
+    for _ in range(20):
+        input_values: npt.NDArray = generator.normal(size=200)
+        dataset_values: npt.NDArray = input_values * generator.uniform(-1, 1) + generator.normal(size=200)
+        input_values -= input_values.mean()
+        dataset_values -= dataset_values.mean()
+        expected: float = float(np.corrcoef(input_values, dataset_values)[0,1])
+
+        for known_count in [0, 50, 150, 200]:
+            known_input: npt.NDArray = input_values[:known_count]
+            known_dataset: npt.NDArray = dataset_values[:known_count]
+            bounds: Any = _cauchy_schwarz_partial_bounds(known_input @ known_dataset, known_input @ known_input,
+                known_dataset @ known_dataset, input_values @ input_values, dataset_values @ dataset_values)
+            assert bounds[1] - 1e-12 <= expected <= bounds[0] + 1e-12
+            if known_count == 0:
+                assert bounds == (1.0, -1.0)
+            elif known_count == 200:
+                assert np.isclose(bounds[0], expected) and np.isclose(bounds[1], expected)
+
+    #the bounds can not be calculated for constant fields
+    assert _cauchy_schwarz_partial_bounds(0.0, 0.0, 1.0, 0.0, 2.0) is None
+
+def test_statistics_collection(tmp_path: Any) -> None:
+    repo_metadata: RepositoryMetadata = RepositoryMetadata({
+        "step": 21600000000000,
+        'time-variation-dim': "step",
+        'time-initial-dim': "time",
+        "data-vars": ["z"]
+    })
+    skip_functions: List[str] = [name for name, _ in component_injector.get_all_correlation_function_instances()
+        if name != "rmsd"]
+    collection: StatisticsCollection = StatisticsCollection()
+    dates: List[np.datetime64] = [np.datetime64("2014-01-01T12:00:00"), np.datetime64("2014-01-01T00:00:00"),
+        np.datetime64("2014-01-02T06:00:00")]
+    for i, date in enumerate(dates):
+        dataset: xarray.Dataset = xarray.Dataset({"z": (("x",), np.arange(4.0) + i)})
+        collection.insert_statistic(date, dataset, repo_metadata, skip_functions)
+
+    with pytest.raises(ValueError):
+        collection.insert_statistic(np.datetime64("2014-01-01T01:00:00"), dataset, repo_metadata, skip_functions)
+
+    collection.save(str(tmp_path))
+    for statistics in [collection, StatisticsCollection.load(str(tmp_path))]:
+        for i, date in enumerate(dates):
+            values: Dict[str, Any] = statistics.get_statistics("rmsd", "z", date).get_values()
+            assert values["min"] == i and values["max"] == 3 + i
+        #the timestamps between the inserted ones do not have statistics
+        with pytest.raises(ValueError):
+            statistics.get_statistics("rmsd", "z", np.datetime64("2014-01-01T18:00:00"))
+        with pytest.raises(ValueError):
+            statistics.get_statistics("rmsd", "t", dates[0])
+        with pytest.raises(ValueError):
+            statistics.get_statistics("pcc", "z", dates[0])
+
+    #the loaded columns are memory mapped, but new timestamps can still be inserted
+    loaded: StatisticsCollection = StatisticsCollection.load(str(tmp_path))
+    loaded.insert_statistic(np.datetime64("2013-12-31T18:00:00"), dataset, repo_metadata, skip_functions)
+    assert loaded.get_statistics("rmsd", "z", np.datetime64("2013-12-31T18:00:00")).get_values()["min"] == 2
+    assert loaded.get_statistics("rmsd", "z", dates[2]).get_values()["min"] == 2
+    assert os.path.isfile(os.path.join(str(tmp_path), "rmsd", "z", "min.npy"))
+
+def test_statistics_collection_moments() -> None:
+    repo_metadata: RepositoryMetadata = RepositoryMetadata({
+        "step": 21600000000000,
+        'time-variation-dim': "step",
+        'time-initial-dim': "time",
+        "data-vars": ["z"]
+    })
+    skip_functions: List[str] = [name for name, _ in component_injector.get_all_correlation_function_instances()
+        if not name in ["pcc", "rmsd"]]
+    values: npt.NDArray = np.array([50000.0, 50010.0, np.nan, 49990.0])
+    collection: StatisticsCollection = StatisticsCollection()
+    date: np.datetime64 = np.datetime64("2014-01-01T00:00:00")
+    collection.insert_statistic(date, xarray.Dataset({"z": (("x",), values)}), repo_metadata, skip_functions)
+
+    #the moments of the field required by each function are stored with its statistics
+    pcc_values: Dict[str, Any] = collection.get_statistics("pcc", "z", date).get_values()
+    rmsd_values: Dict[str, Any] = collection.get_statistics("rmsd", "z", date).get_values()
+    assert set(pcc_values) == {SUM_DATASET, SUM_SQUARES_DATASET}
+    assert set(rmsd_values) == {"min", "max", "count", DATASET_COUNT, SUM_SQUARES_DATASET}
+    assert pcc_values[SUM_DATASET] == 150000.0
+    assert pcc_values[SUM_SQUARES_DATASET] == rmsd_values[SUM_SQUARES_DATASET] == np.nansum(values**2)
+    assert rmsd_values[DATASET_COUNT] == 3
+
+    with pytest.raises(ValueError):
+        calculate_field_moments(values, [SUM_PRODUCTS])
+
+def test_calculate_batch_metrics() -> None:
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(6)
+    dataset_values: npt.NDArray = generator.normal(loc=50000, scale=100, size=(5,20,10))
+    input_values: npt.NDArray = generator.normal(loc=50000, scale=100, size=(3,20,10))
+    corr_functions: List[CorrelationFunction] = [Pcc("pcc"), Rmsd("rmsd")]
+
+    for missing in [False, True]:
+        if missing:
+            dataset_values[generator.random(dataset_values.shape) < 0.1] = np.nan
+            input_values[generator.random(input_values.shape) < 0.1] = np.nan
+        dataset_block: xarray.DataArray = _create_block(dataset_values, "2014-01-01T00:00:00")
+        input_block: xarray.DataArray = _create_block(input_values, "2014-01-01T00:00:00")
+
+        res: Dict[str, npt.NDArray] = calculate_batch_metrics(corr_functions, dataset_block, input_block)
+        for corr_function in corr_functions:
+            expected: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z")
+            assert np.allclose(res[corr_function.corr_func_name], expected, rtol=1e-9)
+
+    with pytest.raises(ValueError):
+        calculate_batch_metrics([Pcc("pcc"), EnhancedPcc("enhanced-pcc")], dataset_block, input_block)
+
+def test_masked_field_statistics() -> None:
+    repo_metadata: RepositoryMetadata = DummyRepositoryMetadata({})
+    generator: np.random.Generator = np.random.default_rng(7)
+    dataset_values: npt.NDArray = generator.normal(size=(6,20,10))
+    input_values: npt.NDArray = generator.normal(size=(2,20,10))
+    #the same positions are missing in every field of the dataset
+    valid: npt.NDArray = generator.random((20,10)) > 0.3
+    dataset_values[:, ~valid] = np.nan
+    dataset_block: xarray.DataArray = _create_block(dataset_values, "2014-01-01T00:00:00")
+    input_block: xarray.DataArray = _create_block(input_values, "2014-01-01T00:00:00")
+
+    flat_values: npt.NDArray = np.nan_to_num(dataset_values.reshape(6,-1))
+    statistics: FieldStatistics = FieldStatistics(flat_values.sum(axis=1), (flat_values**2).sum(axis=1),
+        np.full(6, valid.sum()), FieldMask(valid.ravel()))
+
+    for corr_function in [Pcc("pcc"), Rmsd("rmsd")]:
+        expected: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z")
+        res: npt.NDArray = corr_function.calculate_batch(dataset_block, input_block, repo_metadata, "z", statistics)
+        assert np.allclose(res, expected)
+
+    rmsd: Rmsd = Rmsd("rmsd")
+    prepared_input: PreparedInput = rmsd.prepare_input(input_block[0], repo_metadata, "z")
+    single_statistics: FieldStatistics = FieldStatistics(statistics.sum[:1], statistics.sum_squares[:1],
+        statistics.count[:1], statistics.mask)
+    assert np.isclose(rmsd.calculate_prepared(dataset_block[0], prepared_input, repo_metadata, "z", single_statistics),
+        rmsd.calculate(dataset_block[0], input_block[0], repo_metadata, "z"))
+
+def test_climatology_cache() -> None:
+    cache: ClimatologyCache = ClimatologyCache(2)
+    loads: List[int] = []
+    def loader(value: int) -> xarray.DataArray:
+        loads.append(value)
+        return xarray.DataArray(np.array([value]))
+
+    assert cache.get(1, lambda: loader(1)).values[0] == 1
+    assert cache.get(2, lambda: loader(2)).values[0] == 2
+    assert cache.get(1, lambda: loader(1)).values[0] == 1
+    #the least recently used array (2) is removed
+    assert cache.get(3, lambda: loader(3)).values[0] == 3
+    assert cache.get(1, lambda: loader(1)).values[0] == 1
+    assert cache.get(2, lambda: loader(2)).values[0] == 2
+
+    assert loads == [1, 2, 3, 2]
+    assert cache.hits == 2 and cache.misses == 4
+    assert len(cache) == 2
+
+    with pytest.raises(ValueError):
+        ClimatologyCache(0)
+
+def test_parameter_file_collection_cache() -> None:
+    cache: ClimatologyCache = ClimatologyCache()
+    path: str = "./worker_node/test/test_correlation_properties/standard-deviation/"
+    files: ParameterFileCollection = ParameterFileCollection(path, "standard_deviation.yaml", True, cache)
+
+    array: xarray.DataArray = files.get_array(1, 1, 0)
+    assert files.get_array(1, 1, 0) is array
+    assert cache.hits == 1 and cache.misses == 1
+    assert not (array.values == 0).any() and not np.isnan(array.values).any()
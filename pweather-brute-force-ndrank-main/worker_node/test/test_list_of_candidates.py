@@ -2,7 +2,8 @@ from typing import List, Tuple
 import pytest
 import numpy as np
 from correlation_functions.main_structure import CorrelationFunction
-from service.data_types import CandidateContainer, CandidateListManager
+from correlation_functions.implementations.implementations import Pcc, Rmsd
+from service.data_types import CandidateContainer, CandidateListManager, ResultContainer, ResultStore, TopNResults
 
 class TemporaryCorrFunc(CorrelationFunction):
 
@@ -288,4 +289,64 @@ def test_with_elements_quite_far_away() -> None:
     assert len(res) == len(final_result)
     
     for i in range(len(res)):
-        assert res[i] == final_result[i][0]
\ No newline at end of file
+        assert res[i] == final_result[i][0]
+
+def test_top_n_results() -> None:
+    #final values: 0.5, 0.9, 0.2, 0.9, nan, 0.7
+    results: List[Tuple[str, ResultContainer]] = [
+        ("1980-01-01", ResultContainer(1.0, 2)),
+        ("1980-01-02", ResultContainer(0.9)),
+        ("1980-01-03", ResultContainer(0.4, 2)),
+        ("1980-01-04", ResultContainer(1.8, 2)),
+        ("1980-01-05", ResultContainer(np.nan)),
+        ("1980-01-06", ResultContainer(0.7))
+    ]
+    pcc_results: TopNResults = TopNResults(3, Pcc("pcc"))
+    rmsd_results: TopNResults = TopNResults(2, Rmsd("rmsd"))
+    assert pcc_results.threshold is None
+    for timestamp, result in results:
+        pcc_results.add(timestamp, result)
+        rmsd_results.add(timestamp, result)
+
+    assert list(pcc_results.to_dict()) == ["1980-01-02", "1980-01-04", "1980-01-06"]
+    assert pcc_results.threshold == pytest.approx(0.7)
+    assert list(rmsd_results.to_dict()) == ["1980-01-03", "1980-01-01"]
+    assert rmsd_results.threshold == pytest.approx(0.5)
+    assert len(rmsd_results) == 2
+
+def test_candidate_container_merge() -> None:
+    #candidate split between two files, with two variables in the first and one in the second
+    candidate: CandidateContainer = CandidateContainer(0.2, 0.1, ["z"])
+    candidate.add_value(0.3, 0.2, ["t"])
+    other: CandidateContainer = CandidateContainer(0.4, 0.3, ["z"])
+    candidate.merge(other)
+    candidate.add_value(0.1, 0.0, ["t"])
+
+    assert candidate.best_value == pytest.approx(1.0)
+    assert candidate.worst_value == pytest.approx(0.6)
+    assert candidate.sum_counter == 2
+
+def test_result_store() -> None:
+    store: ResultStore = ResultStore(np.timedelta64(6, "h"))
+    keys: np.ndarray = np.array(["1980-01-02T00", "1980-01-01T18", "1980-01-02T00"], dtype="datetime64[ns]")
+    store.add_values(keys, np.array([0.25, 0.5, 0.5]))
+    #a timestamp outside of the resolution and another before the first one
+    store.add(np.datetime64("1980-01-01T03", "ns"), 0.75)
+    store["1979-12-30T00:00:00.000000000"] = ResultContainer(1.5, 2)
+
+    assert list(store) == ["1979-12-30T00:00:00.000000000", "1980-01-01T03:00:00.000000000",
+        "1980-01-01T18:00:00.000000000", "1980-01-02T00:00:00.000000000"]
+    assert store["1980-01-02T00:00:00.000000000"].value == pytest.approx(0.75)
+    assert store["1980-01-02T00:00:00.000000000"].sum_counter == 2
+    assert not "1980-01-01T06:00:00.000000000" in store
+
+    timestamps, values, sum_counters = store.pop_complete(keys[:2], 2)
+    assert list(timestamps) == [keys[0]] and list(values) == [0.75] and list(sum_counters) == [2]
+    assert len(store) == 3
+
+    other: ResultStore = ResultStore()
+    other.add(np.datetime64("1980-01-01T18", "ns"), 0.5)
+    store.merge(other)
+    assert store["1980-01-01T18:00:00.000000000"].value == pytest.approx(1.0)
+    del store["1979-12-30T00:00:00.000000000"]
+    assert len(store) == 2
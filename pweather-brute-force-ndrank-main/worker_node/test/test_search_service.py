@@ -2,19 +2,51 @@ import logging
 import numpy
 import pytest
 import pickle
-from typing import Any, BinaryIO, Dict, Tuple
+from typing import Any, BinaryIO, Dict, Iterator, List, Mapping, Tuple
+import threading
+import time
+import os
 
 import xarray
 from repository.implementations.month_year_repo import MonthYearRepository
 from repository.repository_collection import RepositoryCollection
 
+from repository.auxiliary_structures.constants import DATA_VARS, STEP, TIME_INITIAL_DIM, TIME_VARIATION_DIM
 from repository.repository_layer import RepositoryLayer, RepositoryMetadata
-from service.data_types import CandidateContainer, ResultContainer
+from service.data_types import CandidateContainer, InputIterator, ResultContainer
 from service.implementations.brute_force_service import BruteForceService
+from service.implementations.brute_force_top_n_service import BruteForceTopNService
 from service.implementations.global_data_var_candidate_list_service import DataVarCandidateListService
-from service.service_main_structure import DatasetSelectionParameter, HeuristicResult, RequestParameters, ServiceLayer
+from service.service_main_structure import DatasetSelectionParameter, HeuristicResult, ProgressCallback, RequestParameters, SearchProgress, ServiceLayer
+from service.shared_scan import SharedScan, SharedScanSettings
+from service.parallel_search import WORKER_PATH, parallel_search_settings
+from service.result_cache import ResultCache, ResultCacheSettings
+from controller.auxiliar.progress_stream import SearchCancelled, stream_progress
 from correlation_functions.correlation_statistics import CorrelationStatistics
 from correlation_functions.main_structure import CorrelationFunction
+from correlation_functions.implementations.implementations import Pcc
+
+def test_input_iterator_materialized_blocks() -> None:
+    metadata: RepositoryMetadata = RepositoryMetadata({STEP: 6 * 3600 * 10**9, TIME_VARIATION_DIM: "step",
+        TIME_INITIAL_DIM: "time", DATA_VARS: ["z"]})
+    steps = numpy.arange(2) * numpy.timedelta64(6, "h").astype("timedelta64[ns]")
+    #the files are given out of order and the second one has a single time instance
+    input: List[xarray.Dataset] = [
+        xarray.Dataset({"z": (["x"], numpy.full(4, 2.0))}, coords={"time": numpy.datetime64("1980-01-02", "ns"), 
+            "step": steps[0]}),
+        xarray.Dataset({"z": (["step","x"], numpy.arange(8.0).reshape(2,4))}, 
+            coords={"time": numpy.datetime64("1980-01-01", "ns"), "step": steps})
+    ]
+    input_iterator: InputIterator = InputIterator(input, metadata, ["z"], [10, 20])
+
+    block: xarray.DataArray = input_iterator.to_block("z")
+    assert block.dims == ("step", "x") and input_iterator.size == 3
+    assert input_iterator.get_time_intervals() == [0, 10, 20]
+    assert list(input_iterator.time_intervals) == [0, 10, 20]
+    for i, input_tuple in enumerate(input_iterator.iterate()):
+        assert numpy.array_equal(input_tuple[0]["z"].values, block.values[i])
+        assert numpy.shares_memory(input_tuple[0]["z"].values, block.values)
+    assert numpy.array_equal(block.values[2], numpy.full(4, 2.0))
 
 class TestPcc(CorrelationFunction):
     """Test correlation function
@@ -54,7 +86,7 @@ def test_simple_brute_force_search() -> None:
 
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z"]
-    res: Dict[str,ResultContainer] = service.execute_search(
+    res: Mapping[str,ResultContainer] = service.execute_search(
             {
                 "z":
                     ["./worker_node/testing_input_2/1980-01-03T06:00:00.000000000.nc", 
@@ -81,7 +113,7 @@ def test_simple_brute_force_search_with_two_vars() -> None:
 
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z","t"]
-    res: Dict[str,ResultContainer] = service.execute_search(
+    res: Mapping[str,ResultContainer] = service.execute_search(
         {
             "z":
                 ["./worker_node/testing_input_2/1980-01-03T06:00:00.000000000.nc", 
@@ -113,7 +145,7 @@ def test_simple_brute_force_search_with_two_vars_double_repo() -> None:
 
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z","t"]
-    res: Dict[str,ResultContainer] = service.execute_search(
+    res: Mapping[str,ResultContainer] = service.execute_search(
         {
             "z":
                 ["./worker_node/testing_input_2/1980-01-03T06:00:00.000000000.nc", 
@@ -144,7 +176,7 @@ def test_specific_timestamps_brute_force_search_two_vars() -> None:
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z","t"]
     request_params.ts_neighbour_gap = 1
-    res: Dict[str,ResultContainer] = service.execute_search_on_ts(iter(
+    res: Mapping[str,ResultContainer] = service.execute_search_on_ts(iter(
                 [
                     HeuristicResult('1980-01-01T06:00:00.000000000',1.0),
                     HeuristicResult('1980-01-09T12:00:00.000000000',1.0),
@@ -182,7 +214,7 @@ def test_specific_timestamps_brute_force_search_to_vars_two_repos() -> None:
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z","t"]
     request_params.ts_neighbour_gap = 1
-    res: Dict[str,ResultContainer] = service.execute_search_on_ts(iter(
+    res: Mapping[str,ResultContainer] = service.execute_search_on_ts(iter(
                 [
                     HeuristicResult('1980-01-01T06:00:00.000000000',1.0),
                     HeuristicResult('1980-01-09T12:00:00.000000000',1.0),
@@ -297,7 +329,7 @@ def test_brute_force_search_with_interval_distance() -> None:
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z"]
     request_params.input_step_difference = [10]
-    res: Dict[str,ResultContainer] = service.execute_search(
+    res: Mapping[str,ResultContainer] = service.execute_search(
             {
 
                 "z":
@@ -327,7 +359,7 @@ def test_brute_force_search_with_2_intervals_distance() -> None:
     request_params: RequestParameters = RequestParameters()
     request_params.search_data_var = ["z"]
     request_params.input_step_difference = [0,10,10]
-    res: Dict[str,ResultContainer] = service.execute_search(
+    res: Mapping[str,ResultContainer] = service.execute_search(
                 {
                     "z":
                         ["./worker_node/testing_input_2/1980-01-03T06:00:00.000000000.nc", 
@@ -344,4 +376,284 @@ def test_brute_force_search_with_2_intervals_distance() -> None:
     file.close()
 
     for key in res:
-        assert key in stored_res and stored_res[key] == res[key].value
\ No newline at end of file
+        assert key in stored_res and stored_res[key] == res[key].value
+def test_brute_force_search_batch_accumulation() -> None:
+    repository: RepositoryLayer = \
+        MonthYearRepository("./worker_node/testing_dataset","settings.yaml")
+    service: ServiceLayer = \
+        BruteForceService([repository])
+
+    request_params: RequestParameters = RequestParameters()
+    request_params.search_data_var = ["z","t"]
+    request_params.input_step_difference = [0,10,10]
+    request_params.search_hours = [0,6,18]
+    input_files: Dict[str, Any] = {
+        var: ["./worker_node/testing_input_2/1980-01-03T06:00:00.000000000.nc", 
+              "./worker_node/testing_input_2/1980-01-03T12:00:00.000000000.nc",
+              "./worker_node/testing_input_2/1980-01-03T18:00:00.000000000.nc",
+              "./worker_node/testing_input_2/1980-01-04T00:00:00.000000000.nc"]
+        for var in ["z","t"]
+    }
+    
+    #the "pcc" compares every file in a single block, while the test function compares one step at a time
+    res: Mapping[str,ResultContainer] = service.execute_search(input_files, request_params, Pcc("pcc"))[0]
+    stored_res: Mapping[str,ResultContainer] = service.execute_search(input_files, request_params, TestPcc("pcc"))[0]
+
+    assert len(res) == len(stored_res)
+    for key in stored_res:
+        assert key in res
+        assert res[key].sum_counter == stored_res[key].sum_counter
+        assert numpy.isclose(res[key].value, stored_res[key].value)
+
+class _CountingRepository(RepositoryLayer):
+    def __init__(self, num_files: int) -> None:
+        super().__init__("/dummy-folder", "settings.yaml")
+        self.num_files: int = num_files
+        self.num_scans: int = 0
+
+    def get_dataset(self) -> Iterator[Tuple[str, xarray.Dataset]]:
+        self.num_scans += 1
+        for file_index in range(self.num_files):
+            yield (str(file_index), xarray.Dataset())
+
+def test_shared_scan() -> None:
+    repositories: List[_CountingRepository] = [_CountingRepository(3), _CountingRepository(2)]
+    shared_scan: SharedScan = SharedScan(SharedScanSettings(0.2))
+    searched_files: Dict[int, List[str]] = {request: [] for request in range(3)}
+    def execute(request: int, request_repositories: List[RepositoryLayer]) -> None:
+        shared_scan.execute(request_repositories, 
+            lambda repository, file_path, dataset: searched_files[request].append(file_path))
+
+    #the three requests arrive within the window, so every repository is only iterated once
+    threads: List[threading.Thread] = [
+        threading.Thread(target=execute, args=(0, [repositories[0]])),
+        threading.Thread(target=execute, args=(1, [repositories[0], repositories[1]])),
+        threading.Thread(target=execute, args=(2, [repositories[1]]))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [repository.num_scans for repository in repositories] == [1, 1]
+    assert searched_files == {0: ["0", "1", "2"], 1: ["0", "1", "2", "0", "1"], 2: ["0", "1"]}
+
+    #the error of the search of a request is raised by its call
+    def failed_search(repository: RepositoryLayer, file_path: str, dataset: xarray.Dataset) -> None:
+        raise ValueError("Invalid file")
+    with pytest.raises(ValueError):
+        shared_scan.execute([repositories[1]], failed_search)
+
+def test_stream_progress() -> None:
+    def search(progress: ProgressCallback) -> int:
+        for scanned_files in range(1, 4):
+            time.sleep(0.1)
+            progress(SearchProgress(scanned_files, 3, {}))
+        return 42
+
+    #the latest snapshot of every interval is yielded, followed by the result of the search
+    snapshots = stream_progress(search, 0.15)
+    scanned: List[int] = []
+    try:
+        while True:
+            scanned.append(next(snapshots).scanned_files)
+    except StopIteration as finished:
+        assert finished.value == 42
+    assert 1 <= len(scanned) <= 3 and scanned == sorted(scanned)
+
+    #closing the stream stops the search at the next snapshot
+    stopped: threading.Event = threading.Event()
+    def endless_search(progress: ProgressCallback) -> None:
+        try:
+            while True:
+                time.sleep(0.05)
+                progress(SearchProgress(0, 0, {}))
+        except SearchCancelled:
+            stopped.set()
+    endless_snapshots = stream_progress(endless_search, 0.1)
+    next(endless_snapshots)
+    endless_snapshots.close()
+    assert stopped.wait(1)
+
+    with pytest.raises(ValueError):
+        next(stream_progress(search, 0))
+
+class _FileRepository(RepositoryLayer):
+    def __init__(self, dataset_path: str) -> None:
+        super().__init__(dataset_path, "settings.yaml")
+
+    def get_metadata(self) -> RepositoryMetadata:
+        return RepositoryMetadata({STEP: 6 * 3600 * 10**9, TIME_VARIATION_DIM: "step",
+            TIME_INITIAL_DIM: "time", DATA_VARS: ["z"]})
+
+    def get_dataset_file_paths(self) -> List[str]:
+        return [self._dataset_path + "data.nc"]
+
+def test_result_cache(tmp_path: Any) -> None:
+    dataset_path: str = str(tmp_path / "dataset")
+    os.makedirs(dataset_path)
+    for file_name in ["settings.yaml", "data.nc"]:
+        with open(os.path.join(dataset_path, file_name), "w") as f:
+            f.write("version 1")
+    input_paths: List[str] = []
+    for i, content in enumerate([b"input", b"input"]):
+        input_paths.append(str(tmp_path / ("input" + str(i) + ".nc")))
+        with open(input_paths[-1], "wb") as f:
+            f.write(content)
+    service: ServiceLayer = ServiceLayer([_FileRepository(dataset_path)])
+    cache: ResultCache = ResultCache(ResultCacheSettings(str(tmp_path / "cache"), 10**6))
+    request_parameters: RequestParameters = RequestParameters()
+    request_parameters.search_data_var = ["z"]
+
+    #the input files are compared by their content
+    key: str = cache.request_key(service, {"z": [input_paths[0]]}, request_parameters, "pcc", 5)
+    assert key == cache.request_key(service, {"z": [input_paths[1]]}, request_parameters, "pcc", 5)
+    assert key != cache.request_key(service, {"z": [input_paths[0]]}, request_parameters, "rmsd", 5)
+    request_parameters.search_hours = [6]
+    assert key != cache.request_key(service, {"z": [input_paths[0]]}, request_parameters, "pcc", 5)
+
+    assert cache.get(key) is None
+    cache.put(key, {"1980-01-01T06:00:00.000000000": ResultContainer(0.5, 2)}, 2)
+    cached: Any = cache.get(key)
+    assert cached[1] == 2 and list(cached[0]) == ["1980-01-01T06:00:00.000000000"]
+    assert cached[0]["1980-01-01T06:00:00.000000000"].value == 0.5
+
+    #a modified file of the repository changes the key
+    request_parameters.search_hours = None # type: ignore[assignment]
+    with open(os.path.join(dataset_path, "data.nc"), "w") as f:
+        f.write("version 2")
+    assert key != cache.request_key(service, {"z": [input_paths[0]]}, request_parameters, "pcc", 5)
+
+    #the least recently used results are removed when the size is exceeded
+    small_cache: ResultCache = ResultCache(ResultCacheSettings(str(tmp_path / "small_cache"), 1))
+    small_cache.put(key, {"1980-01-01T06:00:00.000000000": ResultContainer(0.5, 2)}, 2)
+    assert small_cache.get(key) is None
+
+def _create_two_month_repository(dataset_path: str) -> List[str]:
+    """Creates a repository with two monthly files of "z" and "t" and an input of three time instances,
+    taken from the last two steps of the first file and the first step of the second one
+
+    Returns:
+        List[str]: paths of the input files
+    """
+    rng: numpy.random.Generator = numpy.random.default_rng(0)
+    step: numpy.timedelta64 = numpy.timedelta64(6, "h").astype("timedelta64[ns]")
+    months: List[xarray.Dataset] = []
+    for month, num_days in [(1, 31), (2, 29)]:
+        steps = numpy.arange(1, num_days * 4 + 1) * step
+        months.append(xarray.Dataset({var: (("step", "latitude", "longitude"), 
+                rng.standard_normal((len(steps), 3, 4)).astype(numpy.float32) + 5000) for var in ["z", "t"]},
+            coords={"time": numpy.datetime64("1980-%02d-01T00:00" % month, "ns"), "step": steps,
+                "latitude": numpy.arange(3.0), "longitude": numpy.arange(4.0)}))
+        months[-1].to_netcdf(os.path.join(dataset_path, "ERA5-%d-1980.nc" % month))
+    with open(os.path.join(dataset_path, "settings.yaml"), "w") as f:
+        f.write('metadata:\n  step: 21600000000000\n  time-variation-dim: "step"\n  time-initial-dim: "time"\n'
+            '  data-vars:\n    - "z"\n    - "t"\nsettings:\n  - ERA5-1-1980.nc\n  - ERA5-2-1980.nc\n')
+    input_paths: List[str] = []
+    for i, input_step in enumerate([months[0].isel(step=-2), months[0].isel(step=-1), months[1].isel(step=0)]):
+        input_paths.append(os.path.join(dataset_path, "input" + str(i) + ".nc"))
+        input_step.to_netcdf(input_paths[-1])
+    return input_paths
+
+def test_batch_with_reversed_input_grid(tmp_path: Any) -> None:
+    input_paths: List[str] = _create_two_month_repository(str(tmp_path))
+    #the same input, stored with the latitudes in the reverse order
+    reversed_paths: List[str] = []
+    for input_path in input_paths:
+        reversed_paths.append(os.path.join(str(tmp_path), "reversed_" + os.path.basename(input_path)))
+        with xarray.open_dataset(input_path) as input_dataset:
+            input_dataset.isel(latitude=slice(None, None, -1)).to_netcdf(reversed_paths[-1])
+    request_parameters: RequestParameters = RequestParameters()
+    request_parameters.search_data_var = ["z", "t"]
+    request_parameters.search_hours = [18]
+    service: ServiceLayer = BruteForceService([MonthYearRepository(str(tmp_path), "settings.yaml")])
+
+    res: Mapping[str, ResultContainer] = service.execute_search({"z": input_paths, "t": input_paths}, 
+        request_parameters, Pcc("pcc"))[0]
+    reversed_res: Mapping[str, ResultContainer] = service.execute_search({"z": reversed_paths, "t": reversed_paths}, 
+        request_parameters, Pcc("pcc"))[0]
+
+    assert len(res) == len(reversed_res)
+    for ts in res:
+        assert reversed_res[ts].sum_counter == res[ts].sum_counter
+        assert reversed_res[ts].value == pytest.approx(res[ts].value, abs=1e-5)
+
+def test_top_n_with_two_vars_across_files(tmp_path: Any) -> None:
+    input_paths: List[str] = _create_two_month_repository(str(tmp_path))
+    request_parameters: RequestParameters = RequestParameters()
+    request_parameters.search_data_var = ["z", "t"]
+    corr_function: CorrelationFunction = Pcc("pcc")
+    file_paths: Dict[str, List[str]] = {"z": input_paths, "t": input_paths}
+
+    all_results: Mapping[str, ResultContainer] = BruteForceService([MonthYearRepository(str(tmp_path), "settings.yaml")])\
+        .execute_search(file_paths, request_parameters, corr_function)[0]
+    top_results: Mapping[str, ResultContainer] = BruteForceTopNService([MonthYearRepository(str(tmp_path), "settings.yaml")])\
+        .execute_search(file_paths, request_parameters, corr_function, 5)[0]
+
+    #a complete candidate has one value per input time instance and data variable
+    complete: Dict[str, float] = {ts: result.value for ts, result in all_results.items() if result.sum_counter == 6}
+    best: List[str] = sorted(complete, key=lambda ts: complete[ts], reverse=True)[:5]
+    #the input itself starts in the first file and ends in the second one
+    assert best[0] == "1980-01-31T18:00:00.000000000"
+    assert sorted(ts for ts, result in top_results.items() if result.sum_counter == 6) == sorted(best)
+    for ts in best:
+        assert top_results[ts].value == pytest.approx(complete[ts])
+    #the remaining results are the partial ones, with the same values as the full search
+    for ts, result in top_results.items():
+        if result.sum_counter != 6:
+            assert all_results[ts].sum_counter == result.sum_counter
+
+def test_top_n_on_ts_with_two_vars(tmp_path: Any) -> None:
+    input_paths: List[str] = _create_two_month_repository(str(tmp_path))
+    request_parameters: RequestParameters = RequestParameters()
+    request_parameters.search_data_var = ["z", "t"]
+    request_parameters.ts_neighbour_gap = 1
+    file_paths: Dict[str, List[str]] = {"z": input_paths, "t": input_paths}
+    #the last candidate is partial, since the input ends after the last step of the repository
+    timestamps: List[str] = ["1980-01-10T06:00:00.000000000", "1980-01-31T18:00:00.000000000", 
+        "1980-02-29T18:00:00.000000000"]
+
+    all_results: Mapping[str, ResultContainer] = BruteForceService([MonthYearRepository(str(tmp_path), "settings.yaml")])\
+        .execute_search_on_ts(iter([HeuristicResult(ts, 1.0) for ts in timestamps]), file_paths, 
+            request_parameters, Pcc("pcc"))[0]
+    top_results: Mapping[str, ResultContainer] = \
+        BruteForceTopNService([MonthYearRepository(str(tmp_path), "settings.yaml")]).execute_search_on_ts(
+            iter([HeuristicResult(ts, 1.0) for ts in timestamps]), file_paths, request_parameters, Pcc("pcc"), 2)[0]
+
+    #a complete candidate has one value per input time instance and data variable
+    complete: Dict[str, float] = {ts: result.value for ts, result in all_results.items() if result.sum_counter == 6}
+    best: List[str] = sorted(complete, key=lambda ts: complete[ts], reverse=True)[:2]
+    assert best[0] == "1980-01-31T18:00:00.000000000"
+    assert sorted(ts for ts, result in top_results.items() if result.sum_counter == 6) == sorted(best)
+    assert top_results["1980-02-29T18:00:00.000000000"].sum_counter == 4
+    #the remaining results are the partial ones
+    for ts, result in top_results.items():
+        if result.sum_counter != 6:
+            assert all_results[ts].sum_counter == result.sum_counter
+
+def test_parallel_top_n_with_two_vars(tmp_path: Any) -> None:
+    input_paths: List[str] = _create_two_month_repository(str(tmp_path))
+    request_parameters: RequestParameters = RequestParameters()
+    request_parameters.search_data_var = ["z", "t"]
+    file_paths: Dict[str, List[str]] = {"z": input_paths, "t": input_paths}
+
+    results: List[Dict[str, Tuple[float, int]]] = []
+    try:
+        for processes in [1, 2, 2]:
+            parallel_search_settings.processes = processes
+            top_results: Mapping[str, ResultContainer] = \
+                BruteForceTopNService([MonthYearRepository(str(tmp_path), "settings.yaml")])\
+                    .execute_search(file_paths, request_parameters, Pcc("pcc"), 5)[0]
+            results.append({ts: (result.value, result.sum_counter) for ts, result in top_results.items()})
+    finally:
+        parallel_search_settings.processes = 1
+
+    #the candidates split between the files are completed when the results of the processes are merged
+    assert results[0].keys() == results[1].keys()
+    for ts in results[0]:
+        assert results[1][ts][1] == results[0][ts][1]
+        assert results[1][ts][0] == pytest.approx(results[0][ts][0])
+    assert results[1]["1980-01-31T18:00:00.000000000"][1] == 6
+    assert results[2] == results[1]
+    #the forkserver is only configured by the first search
+    assert os.environ["PYTHONPATH"].split(os.pathsep).count(WORKER_PATH) == 1
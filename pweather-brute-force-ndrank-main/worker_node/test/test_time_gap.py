@@ -31,6 +31,23 @@ def test_dates_with_time_gap() -> None:
     assert container.is_gap(np.datetime64('2005-03-03T03:00'),["stm"],[2,0])
     
     
+def test_gap_mask() -> None:
+    container: TimeGapContainer = TimeGapContainer()
+    container.add_time_gap("hour", 4,"ALL")
+    container.add_time_gap("hour", 3,"sd")
+
+    timestamps = np.arange(np.datetime64('1969-12-31T00:00'), np.datetime64('1970-01-02T00:00'), 
+        np.timedelta64(1,'h')).astype("datetime64[ns]").reshape(2, 24)
+    for data_vars, search_hours in [(["sd"], None), (["stm"], None), (["stm","sd"], [2,3,5]), ([], None)]:
+        mask = container.gap_mask(timestamps, data_vars, search_hours)
+        assert mask.shape == (2, 24)
+        assert list(mask.ravel()) == [container.is_gap(ts, data_vars, search_hours) for ts in timestamps.ravel()]
+    assert list(np.nonzero(container.gap_mask(timestamps[0], ["sd"]))[0]) == [3, 4]
+
+    #the masks are calculated again after a new gap is added
+    container.add_time_gap("hour", 5,"sd")
+    assert container.is_gap(np.datetime64('2005-02-25T05:00'),["sd"])
+
 def test_dates_with_time_gap_with_invalid_args() -> None:
     container: TimeGapContainer = TimeGapContainer()
 
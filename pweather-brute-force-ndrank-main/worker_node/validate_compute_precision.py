@@ -0,0 +1,131 @@
+import getopt
+import pickle
+import sys
+from typing import BinaryIO, Dict, Final, List, Mapping, Optional, Tuple
+
+from correlation_functions.compute_precision import FLOAT32_PRECISION, FLOAT64_PRECISION, compute_precision
+from correlation_functions.implementations.implementations import Pcc
+from repository.implementations.month_year_repo import MonthYearRepository
+from service.data_types import ResultContainer
+from service.implementations.brute_force_service import BruteForceService
+from service.service_main_structure import RequestParameters
+
+"""Compares the top N rankings obtained with the single precision (float32) against the
+ones obtained with the double precision (float64) for the searches of the test fixtures 
+("test/*.bin"), reporting every date whose rank changed. The difference between the double
+precision results and the stored fixtures is also reported. Must be executed inside the 
+worker node folder:
+
+    python3 validate_compute_precision.py -n <size of the ranking> -d <path of the testing dataset>
+
+The exit code is 1 if any rank changed.
+"""
+
+TWO_INPUTS: Final = ["./testing_input_2/1980-01-03T06:00:00.000000000.nc",
+                     "./testing_input_2/1980-01-03T12:00:00.000000000.nc"]
+FOUR_INPUTS: Final = TWO_INPUTS + ["./testing_input_2/1980-01-03T18:00:00.000000000.nc",
+                                   "./testing_input_2/1980-01-04T00:00:00.000000000.nc"]
+
+#fixture file, searched data variables, input files and step difference between the inputs
+CASES: Final[List[Tuple[str, List[str], List[str], Optional[List[int]]]]] = [
+    ("./test/simple_search_res.bin", ["z"], TWO_INPUTS, None),
+    ("./test/two_var_search_res.bin", ["z", "t"], TWO_INPUTS, None),
+    ("./test/10_hour_search_res.bin", ["z"], FOUR_INPUTS, [10]),
+    ("./test/two_10_hour_search_res.bin", ["z"], FOUR_INPUTS, [0, 10, 10])
+]
+
+def search(dataset_path: str, data_vars: List[str], input_files: List[str], 
+    input_step_difference: Optional[List[int]], precision: str) -> Dict[str, float]:
+    """Executes the search of a test fixture with the PCC
+
+    Args:
+        dataset_path (str): path of the testing dataset
+        data_vars (List[str]): searched data variables
+        input_files (List[str]): input files (the same for every data variable)
+        input_step_difference (Optional[List[int]]): step difference between the inputs
+        precision (str): compute precision to be used
+
+    Returns:
+        Dict[str, float]: similarity value by date
+    """
+    compute_precision.mode = precision
+    request_params: RequestParameters = RequestParameters()
+    request_params.search_data_var = data_vars
+    if not input_step_difference is None:
+        request_params.input_step_difference = input_step_difference
+
+    service: BruteForceService = BruteForceService([MonthYearRepository(dataset_path, "settings.yaml")])
+    res: Mapping[str, ResultContainer] = service.execute_search(
+        {var: input_files for var in data_vars}, request_params, Pcc("pcc"))[0]
+    return {key: res[key].value for key in res}
+
+def max_difference(reference: Dict[str, float], candidate: Dict[str, float]) -> float:
+    return max([abs(reference[key] - candidate[key]) for key in reference if key in candidate], default=0.0)
+
+def top_n(values: Dict[str, float], n: int) -> List[str]:
+    """Returns the dates with the n highest similarity values
+
+    Args:
+        values (Dict[str, float]): similarity value by date
+        n (int): size of the ranking
+
+    Returns:
+        List[str]: dates ordered by rank
+    """
+    return sorted(values, key=lambda date: values[date], reverse=True)[:n]
+
+def compare_rankings(reference: Dict[str, float], candidate: Dict[str, float],
+    n: int) -> List[Tuple[str, int, Optional[int]]]:
+    """Compares the top n rankings of two results
+
+    Args:
+        reference (Dict[str, float]): reference similarity value by date
+        candidate (Dict[str, float]): similarity value by date to be validated
+        n (int): size of the ranking
+
+    Returns:
+        List[Tuple[str, int, Optional[int]]]: date, reference rank and candidate rank (None if the
+    date is not in the candidate ranking) of every date of the reference ranking whose rank changed
+    """
+    candidate_ranking: List[str] = top_n(candidate, n)
+    res: List[Tuple[str, int, Optional[int]]] = []
+    for rank, date in enumerate(top_n(reference, n)):
+        candidate_rank: Optional[int] = candidate_ranking.index(date) if date in candidate_ranking else None
+        if candidate_rank != rank:
+            res.append((date, rank, candidate_rank))
+    return res
+
+if __name__ == "__main__":
+    n: int = 20
+    dataset_path: str = "./testing_dataset"
+
+    opts, args = getopt.getopt(sys.argv[1:], "n:d:")
+    for opt in opts:
+        if opt[0] in ("-n"):
+            n = int(opt[1])
+        elif opt[0] in ("-d"):
+            dataset_path = opt[1]
+
+    total_changes: int = 0
+
+    for fixture_path, data_vars, input_files, input_step_difference in CASES:
+        file: BinaryIO = open(fixture_path, "rb")
+        fixture: Dict[str, float] = pickle.load(file)
+        file.close()
+
+        reference: Dict[str, float] = search(dataset_path, data_vars, input_files, input_step_difference, 
+            FLOAT64_PRECISION)
+        candidate: Dict[str, float] = search(dataset_path, data_vars, input_files, input_step_difference, 
+            FLOAT32_PRECISION)
+
+        changes: List[Tuple[str, int, Optional[int]]] = compare_rankings(reference, candidate, n)
+        total_changes += len(changes)
+
+        print(fixture_path + ": " + str(len(changes)) + " rank changes in the top " + str(n) +
+            ", maximum difference " + str(max_difference(reference, candidate)) + 
+            " (float64 difference to the fixture " + str(max_difference(fixture, reference)) + ")")
+        for date, reference_rank, candidate_rank in changes:
+            print("\t" + date + ": rank " + str(reference_rank) + " -> " +
+                ("outside of the ranking" if candidate_rank is None else "rank " + str(candidate_rank)))
+
+    sys.exit(0 if total_changes == 0 else 1)
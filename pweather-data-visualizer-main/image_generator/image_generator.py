@@ -6,6 +6,7 @@ from typing import Dict, Final, Tuple, Union
 import numpy as np
 import xarray, yaml
 from auxiliar.auxiliar import open_dataset_with_file_name, open_dataarray_with_file_name
+from auxiliar.climatology_cache import ClimatologyCache, climatology_cache
 from properties_processor.processor import SettingsResults
 
 import cartopy #type: ignore
@@ -21,21 +22,36 @@ class ParameterFileCollection:
     and facilitates indexing
     """
 
-    def __init__(self, path: str, file_name: str) -> None:
+    def __init__(self, path: str, file_name: str, replace_zeros: bool = False, 
+        cache: ClimatologyCache = climatology_cache) -> None:
         """Basic contructor. Opens the file and stores the required
         structures to index these files
 
         Args:
             path (str): path where all the files can be found
             file_name (str): name of the yaml file that indexes existing files
+            replace_zeros (bool): if zeros (and missing values) should be replaced by 10^(-10)
+            when the array is loaded. Used for the standard deviation to avoid divisions by zero
+            cache (ClimatologyCache): cache where the loaded arrays are kept. Defaults to the 
+            cache shared by the whole process
         """
         self._files: Dict[int,Dict[int,Dict[int,str]]] #the keys go in the following order: month,day,hour
         self._file_path: str = path
+        self._replace_zeros: bool = replace_zeros
+        self._cache: ClimatologyCache = cache
         with open(self._file_path + file_name, 'r') as f:
             self._files = yaml.safe_load(f)
 
+    def _load_array(self, file_path: str) -> xarray.DataArray:
+        with open_dataarray_with_file_name(file_path) as array:
+            array = array.load()
+        if self._replace_zeros:
+            array = array.where(array.values != 0).fillna(10**(-10))
+        return array
+
     def get_array(self, month: int, day: int, hour: int) -> xarray.DataArray:
-        """Indexes file that matches the given day
+        """Indexes file that matches the given day. The array is 
+        kept in the cache, so that the file is only read once
 
         Args:
             month (int): month required
@@ -43,9 +59,10 @@ class ParameterFileCollection:
             hour (int): hour required
 
         Returns:
-            str: path of the file
+            xarray.DataArray: array stored in the file
         """
-        return open_dataarray_with_file_name(self._file_path + self._files[month][day][hour])
+        file_path: str = self._file_path + self._files[month][day][hour]
+        return self._cache.get((file_path, self._replace_zeros), lambda: self._load_array(file_path))
 
 
 class ImageGenerator:
@@ -98,7 +115,7 @@ class ImageGenerator:
             if standard_deviation[-1] != "/":
                 standard_deviation += "/"
             self._standard_params = \
-                ParameterFileCollection(standard_deviation, STANDARD_DEVIATION_FILE_NAME)
+                ParameterFileCollection(standard_deviation, STANDARD_DEVIATION_FILE_NAME, replace_zeros=True)
 
     def generate(self) -> None:
         for date in self._props.wanted_dates:
@@ -118,7 +135,6 @@ class ImageGenerator:
                 if self._props.divide_standard_deviation:
                     std_da: xarray.DataArray = self._standard_params\
                                                         .get_array(date.month,date.day,date.hour).sel(variable=var)
-                    std_da = std_da.where(std_da.values != 0).fillna(10**(-10))
                     da = da / std_da
                 
                 da.plot(
@@ -70,6 +70,7 @@ GRIB_REDUCED_GAUSSIAN_TO_GRID: Final = "grib_reduced_gaussian_to_grid"
 NC_AVERAGE: Final = "nc-average"
 NC_STANDARD_DEVIATION: Final = "nc-standard-deviation"
 ANOMALY_REDUCER: Final = "anomaly-reducer"
+STANDARDIZED_ANOMALY_REDUCER: Final = "standardized-anomaly-reducer"
 DIMENSION_REDUCER: Final = "dimension-reducer"
 ZERO_REDUCER: Final = "zero-reducer"
 NETCDF_COMPRESSOR: Final = "netcdf-compressor"
@@ -139,6 +140,10 @@ reducer_dictionary[ANOMALY_REDUCER] = \
     anomaly_reducer(props[TEMP_DESTINATION_FOLDER], props[RESULTING_AVERAGE_FOLDER],
                          props[TIME_VARIATION_DIM], props[TIME_FIRST_DIM])
 
+reducer_dictionary[STANDARDIZED_ANOMALY_REDUCER] = \
+    anomaly_reducer(props[TEMP_DESTINATION_FOLDER], props[RESULTING_AVERAGE_FOLDER],
+                         props[TIME_VARIATION_DIM], props[TIME_FIRST_DIM], props[RESULTING_STANDARD_DEVIATION_FOLDER])
+
 reducer_dictionary[DIMENSION_REDUCER] = \
     dimension_reducer(props[TEMP_DESTINATION_FOLDER], props[DIMENSION_REDUCED])
 
@@ -329,25 +329,36 @@ class anomaly_reducer(resolution_reducer_interface):
     """Uses the files created by the year_average_reducer and converts a dataset
     with the original values to a dataset with anomaly values.
 
-    This is done by subtracting the original file by it's average
+    This is done by subtracting the original file by it's average. If the path for
+    the files created by the year_standard_deviation_reducer is provided, the anomaly
+    is also divided by the standard deviation (standardized anomaly)
 
     """
-    def __init__(self, temporary_folder: str, path_to_object_average: str, variation_dim: str, first_val_dim: str):
+    def __init__(self, temporary_folder: str, path_to_object_average: str, variation_dim: str, first_val_dim: str,
+        path_to_object_standard_deviation: Optional[str] = None):
         super().__init__(temporary_folder)
         if path_to_object_average[-1] != "/":
             path_to_object_average += "/"
+        if not path_to_object_standard_deviation is None and path_to_object_standard_deviation[-1] != "/":
+            path_to_object_standard_deviation += "/"
 
         self._file_path: str = path_to_object_average
+        self._standard_deviation_file_path: Optional[str] = path_to_object_standard_deviation
         self._variation_dim: str = variation_dim
         self._first_val_dim: str = first_val_dim
         self._is_file_created: bool = False
+        self._standard_deviation_container: Optional[Dict[int, Dict[int, Dict[int, str]]]] = None
 
     def _init_file(self) -> None:
-        """Function to open the yaml file with all path for the average data arrays"""
+        """Function to open the yaml file with all path for the average data arrays 
+        (and standard deviation data arrays, if used)"""
         if not self._is_file_created:
             self._is_file_created
             with open(self._file_path + "average.yaml","r") as handler:
                 self._container: Dict[int, Dict[int, Dict[int, str]]] = yaml.safe_load(handler)
+            if not self._standard_deviation_file_path is None:
+                with open(self._standard_deviation_file_path + "standard_deviation.yaml","r") as handler:
+                    self._standard_deviation_container = yaml.safe_load(handler)
 
     def reduce_resolution(self, source_file: str, file_name: str, previous_file: Optional[str] = None, 
         next_file: Optional[str] = None) -> Tuple[str, str]:
@@ -395,6 +406,16 @@ class anomaly_reducer(resolution_reducer_interface):
             average_dataset.close()
             average_array.close()
 
+            if not self._standard_deviation_container is None:
+                std_array: xarray.DataArray = \
+                    open_dataarray_with_file_name(self._standard_deviation_container[month][day][hour])
+                #same replacement done by the similarity functions, to avoid divisions by zero
+                std_dataset: xarray.Dataset = \
+                    std_array.where(std_array.values != 0).fillna(10**(-10)).to_dataset(dim="variable")
+                dataset[params] /= std_dataset
+                std_dataset.close()
+                std_array.close()
+
         logging.debug("creating copy and storing in netcdf format")
         file_descriptor, netcdf_file = tempfile.mkstemp(prefix=file_name.split(NC_EXTENSION)[0], 
                                         suffix=NC_EXTENSION,